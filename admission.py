@@ -0,0 +1,294 @@
+"""Admission control for expensive endpoints
+
+Each expensive pool (chat completions, image generation) has:
+
+* token buckets per client IP and per session, answered with 429 and
+  Retry-After once a client has spent its burst, and
+* a bounded concurrency pool, answered with 503 and Retry-After when every
+  slot stays busy for longer than ADMISSION_QUEUE_TIMEOUT.
+
+Pools are sized below the worker's thread count, so cheap endpoints such as
+/api/prices and /api/health always find a free thread. Limits are per worker
+process and come from the environment:
+
+    ADMISSION_CHAT_RATE / ADMISSION_CHAT_BURST      per session, per minute (30 / 10)
+    ADMISSION_IMAGE_RATE / ADMISSION_IMAGE_BURST    per session, per minute (6 / 3)
+    ADMISSION_IP_MULTIPLIER                         client IP allowance vs a session (4)
+    ADMISSION_LLM_CONCURRENCY                       concurrent chat requests (4)
+    ADMISSION_IMAGE_CONCURRENCY                     concurrent DALL-E calls (2)
+    ADMISSION_STREAM_CONCURRENCY                    open /api/prices/stream connections (16)
+    ADMISSION_QUEUE_TIMEOUT                         seconds to wait for a slot (0.5)
+    TRUSTED_PROXY_HOPS                              reverse proxies in front of the app (0)
+
+The client IP is the socket peer (request.remote_addr). Behind reverse
+proxies, app.py wraps the app in werkzeug's ProxyFix for TRUSTED_PROXY_HOPS
+hops, so only X-Forwarded-For entries added by our own proxies are believed;
+anything a client puts in the header itself is ignored. The IP bucket is
+always charged first. The session_id in the request body is chosen by the
+client, so its bucket only narrows the IP allowance further and new session
+ids never buy extra requests.
+
+Streams get their own pool with no queueing: once it is full, new clients
+get a 503 telling them to poll /api/prices instead. The shipped gunicorn
+config runs gevent workers, where an open stream costs a greenlet, so the
+stream limit defaults to 1000 per worker and GUNICORN_WORKER_CONNECTIONS
+leaves 100 more connections for other requests. Under gthread workers each
+stream holds a thread for as long as the client stays connected, so the
+limit defaults to 16 per worker (32 dashboards with two workers). Blocking
+C-level I/O that gevent cannot patch (yfinance's libcurl) goes through
+run_blocking, which hands it to gevent's native thread pool.
+"""
+import os
+import sys
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Response, jsonify, request
+
+from metrics import ADMISSION_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_CLIENTS = 10000
+
+
+def green_threads() -> bool:
+    """True under gevent's monkey patching, where a waiting request costs a greenlet rather than a thread"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def run_blocking(func: Callable, *args, **kwargs):
+    """Call func, in gevent's native thread pool when running on greenlets so other requests keep going"""
+    if not green_threads():
+        return func(*args, **kwargs)
+    import gevent
+
+    def call():
+        # Hand exceptions back to the caller; the pool would also print their traceback
+        try:
+            return True, func(*args, **kwargs)
+        except Exception as e:
+            return False, e
+
+    ok, result = gevent.get_hub().threadpool.apply(call)
+    if not ok:
+        raise result
+    return result
+
+
+def stream_concurrency() -> int:
+    return int(os.getenv("ADMISSION_STREAM_CONCURRENCY", 1000 if green_threads() else 16))
+
+
+def trusted_proxy_hops() -> int:
+    return int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+
+
+def worker_threads() -> int:
+    """Threads per gunicorn worker: room for the expensive pools, open streams and cheap requests"""
+    return int(os.getenv("GUNICORN_THREADS", 8 + stream_concurrency()))
+
+
+def worker_connections() -> int:
+    """Connections per gevent worker: open streams plus room for other requests"""
+    return int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100 + stream_concurrency()))
+
+
+class RateLimited(Exception):
+    def __init__(self, pool: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {pool}")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    def __init__(self, pool: str, retry_after: float):
+        super().__init__(f"{pool} capacity exhausted")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: float):
+        """Classic token bucket refilled continuously at rate_per_second up to burst"""
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take cost tokens; returns (admitted, seconds until enough tokens if not)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class ClientBuckets:
+    def __init__(self, rate_per_minute: float, burst: float, max_clients: int = MAX_TRACKED_CLIENTS):
+        """Token buckets keyed by client, least recently seen clients evicted first"""
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, client: str, cost: float = 1.0) -> Tuple[bool, float]:
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return bucket.try_acquire(cost)
+
+
+class ConcurrencyPool:
+    def __init__(self, name: str, limit: int, queue_timeout: float):
+        """Bounded slots for one kind of expensive work; re-entrant within a thread"""
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.avg_hold_seconds = 1.0
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for the duration of the block; raises Overloaded if none frees up in time"""
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            # Already holding a slot in this thread (e.g. chat route -> image generation)
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        if not self.try_acquire(self.queue_timeout):
+            raise Overloaded(self.name, self.avg_hold_seconds)
+        self._local.depth = 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            self.release(time.perf_counter() - start)
+
+    def try_acquire(self, timeout: float = 0) -> bool:
+        """Take a slot without a context manager, for work that outlives the view (streams)"""
+        acquired = self._semaphore.acquire(timeout=timeout) if timeout > 0 else self._semaphore.acquire(blocking=False)
+        if not acquired:
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self, held: float = None):
+        with self._lock:
+            self.in_flight -= 1
+            if held is not None:
+                self.avg_hold_seconds = 0.8 * self.avg_hold_seconds + 0.2 * held
+        self._semaphore.release()
+
+
+class AdmissionController:
+    def __init__(self):
+        """Rate limits and concurrency pools for the 'llm' and 'image' workloads"""
+        multiplier = float(os.getenv("ADMISSION_IP_MULTIPLIER", 4))
+        queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 0.5))
+        limits = {
+            'llm': (float(os.getenv("ADMISSION_CHAT_RATE", 30)), float(os.getenv("ADMISSION_CHAT_BURST", 10)),
+                    int(os.getenv("ADMISSION_LLM_CONCURRENCY", 4))),
+            'image': (float(os.getenv("ADMISSION_IMAGE_RATE", 6)), float(os.getenv("ADMISSION_IMAGE_BURST", 3)),
+                      int(os.getenv("ADMISSION_IMAGE_CONCURRENCY", 2)))
+        }
+        self.session_buckets = {name: ClientBuckets(rate, burst) for name, (rate, burst, _) in limits.items()}
+        self.ip_buckets = {name: ClientBuckets(rate * multiplier, burst * multiplier)
+                           for name, (rate, burst, _) in limits.items()}
+        self.pools = {name: ConcurrencyPool(name, size, queue_timeout) for name, (_, _, size) in limits.items()}
+        self.pools['stream'] = ConcurrencyPool('stream', stream_concurrency(), 0)
+
+        threads = worker_threads()
+        if sum(pool.limit for pool in self.pools.values()) >= threads:
+            logger.warning(f"Admission pools ({', '.join(f'{p.name}={p.limit}' for p in self.pools.values())}) "
+                           f"leave no spare thread out of {threads} for cheap endpoints")
+
+    def open_stream(self, pool: str = 'stream') -> Optional[Response]:
+        """Take a stream slot, or return the 503 to send instead; release it with close_stream"""
+        if self.pools[pool].try_acquire():
+            return None
+        return self.reject(Overloaded(pool, self.pools[pool].avg_hold_seconds), 503, 'overloaded',
+                           'Too many open streams, poll /api/prices instead')
+
+    def close_stream(self, pool: str = 'stream'):
+        self.pools[pool].release()
+
+    @staticmethod
+    def client_ip() -> str:
+        # Already the forwarded client address when ProxyFix trusts our proxies
+        return request.remote_addr or 'unknown'
+
+    @staticmethod
+    def session_key() -> Optional[str]:
+        data = request.get_json(silent=True) if request.is_json else None
+        if isinstance(data, dict) and data.get('session_id'):
+            return str(data['session_id'])
+        return None
+
+    def check_rate(self, pool: str):
+        """Charge the client IP bucket, then the session bucket; raises RateLimited when either is empty"""
+        admitted, retry_after = self.ip_buckets[pool].try_acquire(self.client_ip())
+        if not admitted:
+            raise RateLimited(pool, retry_after)
+        session_id = self.session_key()
+        if session_id:
+            admitted, retry_after = self.session_buckets[pool].try_acquire(session_id)
+            if not admitted:
+                raise RateLimited(pool, retry_after)
+
+    def admit(self, pool: str) -> Callable:
+        """Route decorator: rate-limit per client, then run inside the pool or shed with 429/503"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    self.check_rate(pool)
+                    with self.pools[pool].slot():
+                        return view(*args, **kwargs)
+                except RateLimited as e:
+                    return self.reject(e, 429, 'rate_limited', 'Too many requests, please slow down')
+                except Overloaded as e:
+                    return self.reject(e, 503, 'overloaded', 'Server is busy, please retry shortly')
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def reject(error, status: int, reason: str, message: str):
+        retry_after = max(1, math.ceil(error.retry_after))
+        ADMISSION_REJECTIONS.inc(pool=error.pool, reason=reason)
+        logger.warning(f"Rejected {request.path} ({error.pool}, {reason}), retry after {retry_after}s")
+        response = jsonify({'error': message, 'retry_after': retry_after})
+        response.status_code = status
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def stats(self) -> Dict:
+        return {name: {'limit': pool.limit, 'in_flight': pool.in_flight,
+                       'avg_hold_ms': round(pool.avg_hold_seconds * 1000, 1)}
+                for name, pool in self.pools.items()}
@@ -1,43 +1,98 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+# Imported first so the startup report also covers the imports below
+from startup import ensure_imported, lazy_import, memoized_property, startup_report
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import requests
-import json
 import re
-import pandas as pd
+import gc
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-import yfinance as yf
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import openai
 import os
 import uuid
+import time
 import sqlite3
+import threading
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 import traceback
 import logging
 import base64
-from io import BytesIO
-from PIL import Image
 from dotenv import load_dotenv
+from model_router import ModelRouter, keyword_pattern
+from pricing import KaratPricingEngine
+from price_stream import PriceBroadcaster
+from chart_service import ChartService, DEFAULT_POINTS
+from cache_backend import create_cache_backend
+import metrics
+from metrics import timed, record_error
+from log_config import configure_logging
+from static_assets import StaticAssets
+from admission import AdmissionController, Overloaded, run_blocking, trusted_proxy_hops
+from deadline import Deadline, DeadlineExceeded, upstream_timeout
+import chat_search
+import image_manifest
+from json_provider import FastJSONProvider, RawJSON, dumps as json_dumps, loads as json_loads
+
+# Heavy dependencies are imported on first use to keep worker cold start fast
+pd = lazy_import('pandas')
+yf = lazy_import('yfinance')
+openai = lazy_import('openai')
+startup_report.mark('imports')
 load_dotenv()
 
 
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES; see log_config.py)
+log_handler = configure_logging()
 logger = logging.getLogger(__name__)
+startup_report.mark('logging')
 
 app = Flask(__name__, static_folder="build", static_url_path="/")
+# orjson-backed jsonify/request.json with numpy/pandas support (see json_provider.py)
+app.json = FastJSONProvider(app)
 CORS(app)
+# Believe X-Forwarded-For only for the proxies we run (rate limits key on remote_addr)
+if trusted_proxy_hops():
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxy_hops(), x_proto=trusted_proxy_hops())
+
+# Per-client rate limits and bounded LLM/image pools (see admission.py)
+admission = AdmissionController()
+
+# Precompressed, ETag'd serving for build/ (see static_assets.py)
+static_assets = StaticAssets(app.static_folder)
 
 @app.route("/")
 def serve_react():
-    return send_from_directory(app.static_folder, "index.html")
+    return static_assets.serve("index.html")
+
+@app.endpoint("static")
+def serve_static(filename):
+    return static_assets.serve(filename)
 
 @app.errorhandler(404)
 def not_found(e):
-    return send_from_directory(app.static_folder, "index.html")
+    return static_assets.serve("index.html")
+
+# Enhanced image generation detection
+IMAGE_KEYWORDS_EN = [
+    'generate image', 'create image', 'make image', 'show me picture', 'create visual',
+    'draw', 'design', 'visualize', 'show me', 'create a picture', 'generate visual',
+    'make a design', 'create artwork', 'show design', 'picture of', 'image of'
+]
+
+IMAGE_KEYWORDS_AR = [
+    'صورة', 'رسم', 'اصنع صورة', 'أنشئ صورة', 'اعرض صورة', 'تصميم', 'رسمة',
+    'أظهر لي', 'اصنع تصميم', 'صمم', 'مثال بصري'
+]
+
+IMAGE_KEYWORDS = IMAGE_KEYWORDS_EN + IMAGE_KEYWORDS_AR
+CHART_KEYWORDS = ['chart', 'graph', 'رسم بياني', 'visual', 'trend', 'price chart', 'market chart']
+PRODUCT_KEYWORDS = ['product', 'price', 'buy', 'purchase', 'available', 'stock', 'منتج', 'سعر', 'شراء', 'متوفر']
+
+# Keyword routers are compiled at import so preloaded workers share them
+IMAGE_KEYWORD_PATTERN = keyword_pattern(IMAGE_KEYWORDS)
+CHART_KEYWORD_PATTERN = keyword_pattern(CHART_KEYWORDS)
+PRODUCT_KEYWORD_PATTERN = keyword_pattern(PRODUCT_KEYWORDS)
 
 class AdvancedGoldGPT:
     def __init__(self, api_key: str = None):
@@ -47,20 +102,37 @@ class AdvancedGoldGPT:
         # Metal Price API configuration
         self.openai_api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.metal_api_key = os.getenv("METAL_API_KEY")
+        self.metal_api_url = os.getenv("METAL_API_URL", "https://api.metalpriceapi.com/v1/latest")
         
         # CSV file path for products
         self.products_csv_path = "products_with_descriptions.csv"
         
-        # Set OpenAI client
-        self.openai_client = openai.OpenAI(api_key=self.openai_api_key)
+        # Cache shared by all workers on this host (GOLDGPT_CACHE_BACKEND=sqlite|memory)
+        self.cache = create_cache_backend()
+        self.market_data_ttl = float(os.getenv("MARKET_DATA_TTL", 60))
+        self.metal_api_ttl = float(os.getenv("METAL_API_TTL", 300))
+        self.fx_rate_ttl = float(os.getenv("FX_RATE_TTL", 3600))
+        
+        # Route each chat to a model tier based on intent and complexity
+        self.model_router = ModelRouter()
+        
+        # Request budgets (see deadline.py); market data and image generation inside
+        # a chat stop early enough to leave completion_reserve for the completion
+        self.chat_deadline = float(os.getenv("CHAT_DEADLINE_SECONDS", 60))
+        self.image_deadline = float(os.getenv("IMAGE_DEADLINE_SECONDS", 90))
+        self.completion_reserve = float(os.getenv("DEADLINE_COMPLETION_RESERVE", 10))
+        self.image_timeout = float(os.getenv("DALLE_TIMEOUT", 60))
+        
+        # Chat database schema is created on first connection
+        self._database_ready = False
+        self._database_lock = threading.Lock()
+        self._search_backfill = None
+        self._search_backfill_lock = threading.Lock()
         
         # Create images directory if it doesn't exist
         self.images_dir = "generated_images"
         os.makedirs(self.images_dir, exist_ok=True)
         
-        # Initialize database
-        self.init_database()
-        
         # Business information
         self.business_info = {
             "name": "Ayar-24 Kuwait",
@@ -101,9 +173,6 @@ class AdvancedGoldGPT:
             }
         }
         
-        # Load products from CSV
-        self.csv_products = self.load_csv_products()
-        
         # Enhanced image generation prompts for jewelry and precious metals
         self.jewelry_prompts = {
             "rings": "elegant gold ring with intricate details, luxury jewelry photography, professional lighting, white background",
@@ -116,6 +185,50 @@ class AdvancedGoldGPT:
             "silver_products": "pure silver bars and coins, precious metals photography, professional presentation"
         }
 
+    # Expensive components are built on first use (see startup.py) so importing
+    # the app stays cheap; each one shows up as a deferred startup phase.
+    @memoized_property
+    def openai_client(self):
+        """OpenAI client (per worker: its connection pool must not cross a fork)"""
+        return openai.OpenAI(api_key=self.openai_api_key)
+
+    @memoized_property
+    def async_openai_client(self):
+        """Async OpenAI client for hedged completions, used only on the router's event loop (per worker)"""
+        return openai.AsyncOpenAI(api_key=self.openai_api_key)
+
+    @memoized_property
+    def http_session(self) -> requests.Session:
+        """Keep-alive HTTP session for metal prices and image downloads (per worker)"""
+        return requests.Session()
+
+    @memoized_property
+    def csv_products(self) -> 'pd.DataFrame':
+        """Product catalog loaded from CSV"""
+        return self.load_csv_products()
+
+    @memoized_property
+    def product_search_index(self) -> 'pd.DataFrame':
+        """Lower-cased product name and model columns searched by search_csv_products"""
+        return pd.DataFrame({
+            'name': self.csv_products['Product Name'].str.lower(),
+            'model': self.csv_products['Model'].str.lower()
+        })
+
+    @memoized_property
+    def pricing_engine(self) -> KaratPricingEngine:
+        """Live karat quotes and catalog prices, repriced once per market tick"""
+        return KaratPricingEngine(
+            self.csv_products,
+            spot_provider=self.get_spot_price_usd,
+            fx_provider=self.get_usd_kwd_rate
+        )
+
+    @memoized_property
+    def chart_service(self) -> ChartService:
+        """Chart analytics over cached OHLC history"""
+        return ChartService(self.get_gold_history, cache=self.cache)
+
     def enhance_image_prompt(self, user_prompt: str) -> str:
         """Enhance user prompt for better jewelry and precious metals images"""
         try:
@@ -142,7 +255,7 @@ class AdvancedGoldGPT:
             logger.error(f"Error enhancing prompt: {str(e)}")
             return user_prompt
 
-    def generate_ai_image(self, prompt: str, filename: str = None) -> Dict:
+    def generate_ai_image(self, prompt: str, filename: str = None, deadline: Optional[Deadline] = None) -> Dict:
         """Generate AI image using DALL-E 3 with enhanced prompts"""
         try:
             # Enhance the prompt for better results
@@ -150,35 +263,44 @@ class AdvancedGoldGPT:
             
             logger.info(f"Generating image with prompt: {enhanced_prompt}")
             
-            # Generate image using DALL·E 3
-            response = self.openai_client.images.generate(
-                model="dall-e-3",
-                prompt=enhanced_prompt,
-                n=1,
-                size="1024x1024",
-                quality="standard",  # Can be "standard" or "hd"
-                style="vivid"        # Can be "vivid" or "natural"
-            )
-            
-            # Extract image URL
-            img_url = response.data[0].url
-            
-            # Generate filename if not provided
-            if not filename:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"goldgpt_image_{timestamp}.png"
-            elif not filename.endswith('.png'):
-                filename += '.png'
-            
-            # Full path for saving
-            filepath = os.path.join(self.images_dir, filename)
-            
-            # Download and save image
-            img_response = requests.get(img_url, timeout=30)
-            img_response.raise_for_status()
+            # Generate image using DALL·E 3 (bounded by the image pool, shared with /api/generate-image)
+            with admission.pools['image'].slot():
+                with timed('dalle_generation', upstream='openai'):
+                    image_client = self.openai_client
+                    if deadline is not None:
+                        image_client = image_client.with_options(
+                            timeout=deadline.timeout(self.image_timeout, 'dalle_generation'), max_retries=0)
+                    response = image_client.images.generate(
+                        model="dall-e-3",
+                        prompt=enhanced_prompt,
+                        n=1,
+                        size="1024x1024",
+                        quality="standard",  # Can be "standard" or "hd"
+                        style="vivid"        # Can be "vivid" or "natural"
+                    )
+                
+                # Extract image URL
+                img_url = response.data[0].url
+                
+                # Generate filename if not provided
+                if not filename:
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    filename = f"goldgpt_image_{timestamp}.png"
+                elif not filename.endswith('.png'):
+                    filename += '.png'
+                
+                # Full path for saving
+                filepath = os.path.join(self.images_dir, filename)
+                
+                # Download and save image
+                with timed('image_download', upstream='image_download'):
+                    img_response = self.http_session.get(
+                        img_url, timeout=upstream_timeout(30, 'image_download', deadline))
+                    img_response.raise_for_status()
             
             with open(filepath, "wb") as f:
                 f.write(img_response.content)
+            self.record_generated_image(filename, img_response.content, prompt, enhanced_prompt)
             
             # Convert image to base64 for immediate display
             with open(filepath, "rb") as f:
@@ -197,6 +319,21 @@ class AdvancedGoldGPT:
                 'message': f"Image generated successfully: '{filename}'"
             }
             
+        except DeadlineExceeded as e:
+            logger.warning(f"Image generation stopped: {str(e)}")
+            return {
+                'success': False,
+                'error': "Image generation timed out",
+                'message': "Image generation took too long, please try again"
+            }
+        except Overloaded as e:
+            logger.warning(f"Image generation shed: {str(e)}")
+            return {
+                'success': False,
+                'error': "Image generation is busy",
+                'message': "Image generation is busy right now, please try again shortly",
+                'retry_after': e.retry_after
+            }
         except requests.exceptions.RequestException as e:
             logger.error(f"Error downloading image: {str(e)}")
             return {
@@ -250,16 +387,61 @@ class AdvancedGoldGPT:
             ''')
             
             conn.commit()
+            
+            # Full-text search index over messages (see chat_search.py); a new or
+            # outdated index is backfilled off the request path
+            if not chat_search.install_schema(conn):
+                self.start_search_backfill()
+            
+            # Image manifest backing /api/images and /api/v2/images; the first run imports existing files
+            if image_manifest.install_schema(conn):
+                image_manifest.reconcile(conn, self.images_dir)
+            
             conn.close()
             logger.info("Database initialized successfully")
             
         except Exception as e:
+            # connect_db() retries on the next call rather than running without a schema
             logger.error(f"Error initializing database: {str(e)}")
+            raise
+
+    def start_search_backfill(self) -> threading.Thread:
+        """Build the chat search index on a background thread unless one is already running"""
+        with self._search_backfill_lock:
+            if self._search_backfill is None or not self._search_backfill.is_alive():
+                self._search_backfill = threading.Thread(target=self.build_search_index,
+                                                         name="chat-search-backfill", daemon=True)
+                self._search_backfill.start()
+            return self._search_backfill
 
+    def build_search_index(self) -> Optional[int]:
+        """Backfill the chat search index if it is new or outdated; search scans recent messages until then"""
+        try:
+            conn = self.connect_db()
+            try:
+                return chat_search.rebuild_index(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            record_error('sqlite')
+            logger.error(f"Error building chat search index: {str(e)}")
+            return None
+
+    def connect_db(self) -> sqlite3.Connection:
+        """Open a chat database connection, creating the schema on first use"""
+        if not self._database_ready:
+            with self._database_lock:
+                if not self._database_ready:
+                    with startup_report.phase('database'):
+                        self.init_database()
+                    self._database_ready = True
+        return sqlite3.connect('goldgpt_chats.db')
+
+    @timed('db_save_session')
     def save_chat_session(self, session_id: str, messages: list, title: str = None):
         """Save chat session to database"""
         try:
-            conn = sqlite3.connect('goldgpt_chats.db')
+            conn = self.connect_db()
             cursor = conn.cursor()
             
             if not title and messages:
@@ -276,24 +458,30 @@ class AdvancedGoldGPT:
             cursor.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
             
             # Insert new messages
+            indexed = []
             for message in messages:
                 cursor.execute('''
                     INSERT INTO messages (session_id, role, content, chart_data, image_data)
                     VALUES (?, ?, ?, ?, ?)
                 ''', (session_id, message['role'], message['content'], 
-                      json.dumps(message.get('chart')) if message.get('chart') else None,
-                      json.dumps(message.get('image')) if message.get('image') else None))
+                      json_dumps(message.get('chart')) if message.get('chart') else None,
+                      json_dumps(message.get('image')) if message.get('image') else None))
+                indexed.append((cursor.lastrowid, message['content'], message['role'], session_id))
+            
+            # Normalized copies for the search index, in the same transaction
+            chat_search.index_messages(conn, indexed)
             
             conn.commit()
             conn.close()
             
         except Exception as e:
+            record_error('sqlite')
             logger.error(f"Error saving chat session: {str(e)}")
 
     def load_chat_session(self, session_id: str):
         """Load chat session from database"""
         try:
-            conn = sqlite3.connect('goldgpt_chats.db')
+            conn = self.connect_db()
             cursor = conn.cursor()
             
             # Get session info
@@ -317,9 +505,9 @@ class AdvancedGoldGPT:
                     'content': row[1]
                 }
                 if row[2]:  # chart_data
-                    message['chart'] = json.loads(row[2])
+                    message['chart'] = json_loads(row[2])
                 if row[3]:  # image_data
-                    message['image'] = json.loads(row[3])
+                    message['image'] = json_loads(row[3])
                 messages.append(message)
             
             conn.close()
@@ -337,7 +525,7 @@ class AdvancedGoldGPT:
     def get_chat_history(self):
         """Get all chat sessions"""
         try:
-            conn = sqlite3.connect('goldgpt_chats.db')
+            conn = self.connect_db()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -358,10 +546,84 @@ class AdvancedGoldGPT:
             logger.error(f"Error getting chat history: {str(e)}")
             return {}
 
+    @timed('db_search_messages')
+    def search_chat_history(self, query: str, page: int = 1, page_size: int = chat_search.DEFAULT_PAGE_SIZE,
+                            role: str = None, session_id: str = None) -> Optional[Dict]:
+        """Full-text search over saved chat messages"""
+        try:
+            conn = self.connect_db()
+            try:
+                results = chat_search.search(conn, query, page, page_size, role=role, session_id=session_id)
+            finally:
+                conn.close()
+            if results['indexing']:
+                # Restarts a backfill that failed, e.g. because the database was locked
+                self.start_search_backfill()
+            return results
+        except Exception as e:
+            record_error('sqlite')
+            logger.error(f"Error searching chat history: {str(e)}")
+            return None
+
+    def record_generated_image(self, filename: str, data: bytes, prompt: str, enhanced_prompt: str):
+        """Add a saved image to the manifest; the reconciler catches anything missed here"""
+        try:
+            conn = self.connect_db()
+            try:
+                image_manifest.record_image(conn, filename, data, prompt, enhanced_prompt)
+            finally:
+                conn.close()
+        except Exception as e:
+            record_error('sqlite')
+            logger.error(f"Error recording image {filename} in manifest: {str(e)}")
+
+    @timed('db_list_images')
+    def list_images_after(self, limit: int = image_manifest.DEFAULT_PAGE_SIZE, cursor: str = None,
+                          **filters) -> Optional[Dict]:
+        """Cursor-paginated generated images from the manifest in the /api/images shape"""
+        try:
+            conn = self.connect_db()
+            try:
+                return image_manifest.list_images_after(conn, limit, cursor, **filters)
+            finally:
+                conn.close()
+        except ValueError:
+            # A malformed cursor is the caller's error, not the database's
+            raise
+        except Exception as e:
+            record_error('sqlite')
+            logger.error(f"Error listing images: {str(e)}")
+            return None
+
+    @timed('db_list_images')
+    def list_images(self, page: int = 1, page_size: int = image_manifest.DEFAULT_PAGE_SIZE, query: str = None,
+                    source: str = None, since: str = None, until: str = None) -> Optional[Dict]:
+        """Page of generated images from the manifest, newest first"""
+        try:
+            conn = self.connect_db()
+            try:
+                return image_manifest.list_images(conn, page, page_size, query=query, source=source,
+                                                  since=since, until=until)
+            finally:
+                conn.close()
+        except Exception as e:
+            record_error('sqlite')
+            logger.error(f"Error listing images: {str(e)}")
+            return None
+
+    @timed('image_manifest_reconcile')
+    def reconcile_images(self, force: bool = False) -> Dict:
+        """Sync the image manifest with files added or removed outside the app"""
+        conn = self.connect_db()
+        try:
+            return image_manifest.reconcile(conn, self.images_dir, force=force)
+        finally:
+            conn.close()
+
     def delete_chat_session(self, session_id: str):
         """Delete a chat session"""
         try:
-            conn = sqlite3.connect('goldgpt_chats.db')
+            conn = self.connect_db()
             cursor = conn.cursor()
             
             cursor.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
@@ -372,7 +634,7 @@ class AdvancedGoldGPT:
         except Exception as e:
             logger.error(f"Error deleting chat session: {str(e)}")
 
-    def load_csv_products(self) -> pd.DataFrame:
+    def load_csv_products(self) -> 'pd.DataFrame':
         """Load products from CSV file"""
         try:
             if os.path.exists(self.products_csv_path):
@@ -406,7 +668,22 @@ class AdvancedGoldGPT:
             logger.error(f"Error loading CSV products: {str(e)}")
             return pd.DataFrame()
 
+    def get_cached_market_data(self, key: str, fetch, ttl: float) -> Dict:
+        """Serve a market data fetch from the shared cache; failed fetches are not cached"""
+        result = {}
+        
+        def compute():
+            result.update(fetch())
+            return result if result.get('success') else None
+        
+        return self.cache.get_or_compute(key, compute, ttl) or result
+
     def get_metal_prices_api(self) -> Dict:
+        """Get metal prices from metalpriceapi.com via the shared cache"""
+        return self.get_cached_market_data("market:metal_prices", self.fetch_metal_prices_api, self.metal_api_ttl)
+
+    @timed('metalpriceapi')
+    def fetch_metal_prices_api(self) -> Dict:
         """Fetch metal prices from metalpriceapi.com"""
         try:
             params = {
@@ -415,7 +692,8 @@ class AdvancedGoldGPT:
                 "currencies": "XAU,XAG,XPT,XPD"
             }
             
-            response = requests.get(self.metal_api_url, params=params, timeout=10)
+            response = self.http_session.get(self.metal_api_url, params=params,
+                                             timeout=upstream_timeout(10, 'metalpriceapi'))
             response.raise_for_status()
             
             data = response.json()
@@ -461,15 +739,19 @@ class AdvancedGoldGPT:
                     "base": data.get("base", "USD")
                 }
             else:
+                record_error('metalpriceapi')
                 return {"success": False, "error": "API returned success=False"}
                 
         except requests.exceptions.RequestException as e:
+            record_error('metalpriceapi')
             logger.error(f"Metal API request failed: {str(e)}")
             return {"success": False, "error": f"Request failed: {str(e)}"}
         except Exception as e:
+            record_error('metalpriceapi')
             logger.error(f"Metal API unexpected error: {str(e)}")
             return {"success": False, "error": f"Unexpected error: {str(e)}"}
 
+    @timed('product_search')
     def search_csv_products(self, query: str) -> List[Dict]:
         """Search for products in CSV data"""
         if self.csv_products.empty:
@@ -478,23 +760,13 @@ class AdvancedGoldGPT:
         try:
             query_lower = query.lower()
             
+            index = self.product_search_index
             mask = (
-                self.csv_products['Product Name'].str.lower().str.contains(query_lower, na=False) |
-                self.csv_products['Model'].str.lower().str.contains(query_lower, na=False)
+                index['name'].str.contains(query_lower, na=False) |
+                index['model'].str.contains(query_lower, na=False)
             )
             
-            matching_products = self.csv_products[mask]
-            
-            products_list = []
-            for _, row in matching_products.iterrows():
-                products_list.append({
-                    'product_name': row['Product Name'],
-                    'model': row['Model'],
-                    'price': row['Price'],
-                    'quantity': row['Quantity']
-                })
-            
-            return products_list
+            return self.pricing_engine.catalog_products(mask.to_numpy().nonzero()[0].tolist())
             
         except Exception as e:
             logger.error(f"Error searching products: {str(e)}")
@@ -506,19 +778,15 @@ class AdvancedGoldGPT:
             return []
         
         try:
-            products_list = []
-            for _, row in self.csv_products.iterrows():
-                products_list.append({
-                    'product_name': row['Product Name'],
-                    'model': row['Model'],
-                    'price': row['Price'],
-                    'quantity': row['Quantity']
-                })
-            return products_list
+            return self.pricing_engine.catalog_products()
         except Exception as e:
             logger.error(f"Error getting all products: {str(e)}")
             return []
 
+    def get_all_csv_products_json(self) -> RawJSON:
+        """Get the full /api/products body, serialized once per pricing tick"""
+        return self.pricing_engine.catalog_json()
+
     def detect_language(self, text: str) -> str:
         """Detect if text is Arabic or English"""
         try:
@@ -530,10 +798,17 @@ class AdvancedGoldGPT:
             return 'en'
 
     def get_gold_price(self) -> Dict:
+        """Get current gold price data via the shared cache"""
+        return self.get_cached_market_data("market:gold_price", self.fetch_gold_price, self.market_data_ttl)
+
+    @timed('yfinance_quote')
+    def fetch_gold_price(self) -> Dict:
         """Fetch current gold price data"""
+        # Raises DeadlineExceeded out of here, so callers fall back instead of counting an upstream error
+        timeout = upstream_timeout(10, 'yfinance_quote')
         try:
             gold_ticker = yf.Ticker("GC=F")
-            gold_data = gold_ticker.history(period="2d")
+            gold_data = run_blocking(gold_ticker.history, period="2d", timeout=timeout)
             
             if not gold_data.empty:
                 current_price = gold_data['Close'].iloc[-1]
@@ -554,25 +829,50 @@ class AdvancedGoldGPT:
                 return {'success': False, 'error': 'No data available'}
                 
         except Exception as e:
+            record_error('yfinance')
             logger.error(f"Error getting gold price: {str(e)}")
             return {'success': False, 'error': str(e)}
 
+    def get_spot_price_usd(self) -> Optional[float]:
+        """Get the gold spot price in USD/oz for the pricing engine"""
+        price_data = self.get_gold_price()
+        return price_data['price'] if price_data.get('success') else None
+
+    def get_usd_kwd_rate(self) -> Optional[float]:
+        """Get the USD to KWD exchange rate via the shared cache"""
+        return self.cache.get_or_compute("market:usd_kwd", self.fetch_usd_kwd_rate, self.fx_rate_ttl)
+
+    @timed('yfinance_fx')
+    def fetch_usd_kwd_rate(self) -> Optional[float]:
+        """Fetch the USD to KWD exchange rate"""
+        timeout = upstream_timeout(10, 'yfinance_fx')
+        try:
+            fx_data = run_blocking(yf.Ticker("KWD=X").history, period="5d", timeout=timeout)
+            if not fx_data.empty:
+                return float(fx_data['Close'].iloc[-1])
+            return None
+        except Exception as e:
+            record_error('yfinance')
+            logger.error(f"Error getting USD/KWD rate: {str(e)}")
+            return None
+
     def get_kuwait_gold_prices(self) -> Dict:
         """Get Kuwait-specific gold prices"""
         try:
-            kuwait_prices = {
-                "24k_kwd": 33.78,
-                "22k_kwd": 31.01,
-                "21k_kwd": 29.56,
-                "18k_kwd": 25.34,
-                "currency": "KWD",
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            return {"success": True, **kuwait_prices}
+            return self.pricing_engine.kuwait_prices()
         except Exception as e:
             logger.error(f"Error getting Kuwait prices: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    def get_price_snapshot(self) -> Dict:
+        """Fetch gold, Kuwait and metal prices in one pass"""
+        return {
+            'gold': self.get_gold_price(),
+            'kuwait': self.get_kuwait_gold_prices(),
+            'metals': self.get_metal_prices_api()
+        }
+
+    @timed('market_context')
     def get_market_context(self) -> str:
         """Get current market context for AI"""
         try:
@@ -584,7 +884,7 @@ class AdvancedGoldGPT:
             Current Market Data:
             - Global Gold Price: ${price_data.get('price', 'N/A')}/oz
             - Daily Change: {price_data.get('change', 'N/A')} ({price_data.get('change_pct', 'N/A')}%)
-            - Kuwait Gold Prices: 24K={kuwait_prices.get('24k_kwd', 'N/A')} KWD/g, 22K={kuwait_prices.get('22k_kwd', 'N/A')} KWD/g, 18K={kuwait_prices.get('18k_kwd', 'N/A')} KWD/g
+            - Kuwait Gold Prices: 24K={kuwait_prices.get('24k_kwd', 'N/A')} KWD/g, 22K={kuwait_prices.get('22k_kwd', 'N/A')} KWD/g, 21K={kuwait_prices.get('21k_kwd', 'N/A')} KWD/g, 18K={kuwait_prices.get('18k_kwd', 'N/A')} KWD/g
             - Market Status: Kuwait gold market showed 142% growth in 2021 and continues strong performance
             """
             
@@ -598,26 +898,31 @@ class AdvancedGoldGPT:
             logger.error(f"Error getting market context: {str(e)}")
             return "Market data temporarily unavailable."
 
+    def format_product_price(self, product: Dict) -> str:
+        """Format a catalog product price for the LLM context"""
+        if product.get('live_price_kwd') is not None:
+            return f"{product['live_price_kwd']:.3f} KWD (metal {product['metal_value_kwd']:.3f} + premium {product['price']:.3f})"
+        return f"{product['price']:.3f} KWD"
+
     def get_products_context(self, user_message: str) -> str:
         """Get products context based on user message"""
         try:
             products_context = ""
             
-            product_keywords = ['product', 'price', 'buy', 'purchase', 'available', 'stock', 'منتج', 'سعر', 'شراء', 'متوفر']
-            if any(keyword in user_message.lower() for keyword in product_keywords):
+            if PRODUCT_KEYWORD_PATTERN.search(user_message.lower()):
                 search_results = self.search_csv_products(user_message)
                 
                 if search_results:
                     products_context = "\n\nAvailable Products (matching your query):\n"
                     for product in search_results:
-                        products_context += f"- {product['product_name']}: ${product['price']:.4f}, Quantity: {product['quantity']}\n"
+                        products_context += f"- {product['product_name']}: {self.format_product_price(product)}, Quantity: {product['quantity']}\n"
                         products_context += f"  Model: {product['model']}\n"
                 else:
                     all_products = self.get_all_csv_products()
                     if all_products:
                         products_context = "\n\nOur Available Products:\n"
                         for product in all_products[:5]:
-                            products_context += f"- {product['product_name']}: ${product['price']:.4f}, Quantity: {product['quantity']}\n"
+                            products_context += f"- {product['product_name']}: {self.format_product_price(product)}, Quantity: {product['quantity']}\n"
                             products_context += f"  Model: {product['model']}\n"
             
             return products_context
@@ -625,42 +930,35 @@ class AdvancedGoldGPT:
             logger.error(f"Error getting products context: {str(e)}")
             return ""
 
-    def generate_chart_data(self) -> Optional[Dict]:
+    @timed('yfinance_history', upstream='yfinance')
+    def get_gold_history(self, period: str, interval: str) -> 'pd.DataFrame':
+        """Fetch gold OHLC history for the chart service"""
+        return run_blocking(yf.Ticker("GC=F").history, period=period, interval=interval,
+                            timeout=upstream_timeout(10, 'yfinance_history'))
+
+    def generate_chart_data(self, period: str = '1mo', interval: str = '1d', indicators: str = '') -> Optional[Dict]:
         """Generate chart data for frontend"""
         try:
-            ticker = yf.Ticker("GC=F")
-            data = ticker.history(period="1mo")
-            
-            if data.empty:
-                return None
-            
-            chart_data = {
-                'x': [date.strftime('%Y-%m-%d') for date in data.index],
-                'y': data['Close'].tolist(),
-                'type': 'line',
-                'title': 'Gold Price - Last 30 Days',
-                'xaxis_title': 'Date',
-                'yaxis_title': 'Price (USD/oz)'
-            }
-            
-            return chart_data
-            
+            return self.chart_service.get_chart(period, interval, indicators)
         except Exception as e:
             logger.error(f"Error generating chart data: {str(e)}")
             return None
 
-    def call_openai_api(self, user_message: str, language: str) -> str:
+    def call_openai_api(self, user_message: str, language: str, deadline: Optional[Deadline] = None) -> str:
         """Call OpenAI API with optimized context"""
+        deadline = deadline or Deadline(self.chat_deadline)
         try:
-            market_context = self.get_market_context()
-            products_context = self.get_products_context(user_message)
+            # Market data is fetched under a deadline that leaves time for the completion
+            with deadline.reserve(self.completion_reserve).activate():
+                market_context = self.get_market_context()
+                products_context = self.get_products_context(user_message)
+                all_products = self.get_all_csv_products()
             
-            all_products = self.get_all_csv_products()
             product_catalog = ""
             if all_products:
                 product_catalog = "\n\nTOP PRODUCTS:\n"
                 for product in all_products[:3]:
-                    product_catalog += f"- {product['product_name']}: ${product['price']:.2f} (Stock: {product['quantity']})\n"
+                    product_catalog += f"- {product['product_name']}: {self.format_product_price(product)} (Stock: {product['quantity']})\n"
             
             system_prompt = f"""
             You are GoldGPT, AI precious metals expert for Ayar-24 Kuwait.
@@ -740,52 +1038,50 @@ class AdvancedGoldGPT:
             IMPORTANT: Do not add footer information (phone, email, website) to every response. Only include it when contextually relevant or when user asks for contact information.
             """
             
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
+            decision = self.model_router.route(user_message)
+            logger.info(f"Routing chat to tier '{decision['tier']}' ({decision['model']}, intent={decision['intent']})")
+            
+            response = self.model_router.complete(
+                self.openai_client,
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_message}
                 ],
-                max_tokens=2000,
-                temperature=0.5
+                decision,
+                temperature=0.5,
+                deadline=deadline,
+                hedge_client=self.async_openai_client if self.model_router.hedge_enabled else None
             )
             
             return response.choices[0].message.content
             
+        except DeadlineExceeded as e:
+            logger.warning(f"OpenAI call skipped: {str(e)}")
+            return "I'm sorry, this is taking longer than expected. Please try again in a moment."
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             return f"I apologize, but I'm having trouble processing your request right now. Please try again in a moment, or contact our experts directly for assistance."
         
-    def generate_response(self, user_message: str) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+    def generate_response(self, user_message: str, deadline: Optional[Deadline] = None) -> Tuple[str, Optional[Dict], Optional[Dict]]:
         """Generate response using OpenAI API - Enhanced with better image generation detection"""
+        deadline = deadline or Deadline(self.chat_deadline)
+        # Everything before the completion has to leave it completion_reserve seconds
+        context_deadline = deadline.reserve(self.completion_reserve)
         try:
             language = self.detect_language(user_message)
             
-            # Enhanced image generation detection
-            image_keywords_en = [
-                'generate image', 'create image', 'make image', 'show me picture', 'create visual', 
-                'draw', 'design', 'visualize', 'show me', 'create a picture', 'generate visual',
-                'make a design', 'create artwork', 'show design', 'picture of', 'image of'
-            ]
-            
-            image_keywords_ar = [
-                'صورة', 'رسم', 'اصنع صورة', 'أنشئ صورة', 'اعرض صورة', 'تصميم', 'رسمة',
-                'أظهر لي', 'اصنع تصميم', 'صمم', 'مثال بصري'
-            ]
-            
-            all_image_keywords = image_keywords_en + image_keywords_ar
             image_data = None
             
             # Check if user wants to generate an image
             user_message_lower = user_message.lower()
-            wants_image = any(keyword in user_message_lower for keyword in all_image_keywords)
+            wants_image = IMAGE_KEYWORD_PATTERN.search(user_message_lower) is not None
             
             if wants_image:
                 # Extract image prompt from user message
                 image_prompt = user_message
                 
                 # Remove common image generation keywords to get clean prompt
-                for keyword in all_image_keywords:
+                for keyword in IMAGE_KEYWORDS:
                     if keyword in user_message_lower:
                         # Remove the keyword but keep the rest
                         image_prompt = re.sub(re.escape(keyword), '', image_prompt, flags=re.IGNORECASE).strip()
@@ -800,7 +1096,7 @@ class AdvancedGoldGPT:
                 
                 # Generate the image
                 logger.info(f"Generating image with extracted prompt: {image_prompt}")
-                image_result = self.generate_ai_image(image_prompt)
+                image_result = self.generate_ai_image(image_prompt, deadline=context_deadline)
                 
                 if image_result['success']:
                     image_data = {
@@ -816,12 +1112,12 @@ class AdvancedGoldGPT:
             
             # Generate chart if requested
             chart_data = None
-            chart_keywords = ['chart', 'graph', 'رسم بياني', 'visual', 'trend', 'price chart', 'market chart']
-            if any(word in user_message_lower for word in chart_keywords):
-                chart_data = self.generate_chart_data()
+            if CHART_KEYWORD_PATTERN.search(user_message_lower):
+                with context_deadline.activate():
+                    chart_data = self.generate_chart_data()
             
             # Get AI response
-            response = self.call_openai_api(user_message, language)
+            response = self.call_openai_api(user_message, language, deadline)
             
             return response, chart_data, image_data
             
@@ -829,24 +1125,125 @@ class AdvancedGoldGPT:
             logger.error(f"Error in generate_response: {str(e)}")
             return "I apologize for the technical difficulty. Please try again.", None, None
 
-# Initialize GoldGPT instance
+# Initialize GoldGPT instance (client, catalog and engines are built on first use)
 goldgpt = AdvancedGoldGPT()
+startup_report.mark('goldgpt')
+
+# One upstream price poll loop per process, shared by /api/prices and the SSE stream
+price_broadcaster = PriceBroadcaster(goldgpt.get_price_snapshot, cache=goldgpt.cache)
+
+# Periodic image manifest reconciliation, one worker per interval via the shared cache
+image_reconciler = image_manifest.ManifestReconciler(goldgpt.reconcile_images, cache=goldgpt.cache)
+
+def collect_runtime_metrics():
+    """Cache and price stream samples gathered at scrape time"""
+    cache_stats = goldgpt.cache.stats()
+    backend = {'backend': cache_stats['backend']}
+    samples = [
+        ('goldgpt_cache_requests_total', 'counter', 'Cache lookups by result', {**backend, 'result': 'hit'}, cache_stats['hits']),
+        ('goldgpt_cache_requests_total', 'counter', 'Cache lookups by result', {**backend, 'result': 'miss'}, cache_stats['misses']),
+        ('goldgpt_cache_computes_total', 'counter', 'Cache misses that ran the compute function', backend, cache_stats['computes']),
+        ('goldgpt_cache_hit_ratio', 'gauge', 'Cache hit ratio in this worker', backend, cache_stats['hit_ratio'] or 0.0),
+        ('goldgpt_price_stream_subscribers', 'gauge', 'Open price stream connections', {}, price_broadcaster.subscriber_count())
+    ]
+    for name, pool in admission.stats().items():
+        samples.append(('goldgpt_admission_in_flight', 'gauge', 'Requests holding an admission pool slot',
+                        {'pool': name}, pool['in_flight']))
+        samples.append(('goldgpt_admission_pool_limit', 'gauge', 'Admission pool size', {'pool': name}, pool['limit']))
+    for phase in startup_report.phases():
+        samples.append(('goldgpt_startup_phase_seconds', 'gauge', 'Time spent in each startup phase',
+                        {'phase': phase['phase'], 'deferred': str(phase['deferred']).lower()}, phase['seconds']))
+    return samples
+
+metrics.registry.register_collector(collect_runtime_metrics)
+
+def preload_shared_state():
+    """Build read-only state once in the gunicorn master so forked workers share it copy-on-write"""
+    with startup_report.phase('preload'):
+        ensure_imported(pd, yf, openai)
+        goldgpt.connect_db().close()
+        # Finish a search index backfill here, before the workers fork and start serving
+        goldgpt.start_search_backfill().join()
+        for component in ('product_search_index', 'pricing_engine', 'chart_service'):
+            getattr(goldgpt, component)
+        static_assets.prepare()
+    # Move everything built so far into the permanent generation; otherwise GC
+    # passes in the workers touch these objects and un-share their pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded shared state: {len(goldgpt.csv_products)} catalog products")
+
+def prepare_fork():
+    """Close the master's cache connections and flush its log queue before a worker is forked"""
+    # The master's metrics (preload stages) are reported from its own snapshot
+    metrics.registry.write_snapshot()
+    goldgpt.cache.close()
+    # Writes out records queued so far; the next record restarts the listener
+    log_handler.stop_listener()
+
+def reset_after_fork():
+    """Drop per-process resources inherited from the master so each worker opens its own"""
+    del goldgpt.openai_client
+    del goldgpt.http_session
+    del goldgpt.async_openai_client
+    del goldgpt.model_router.hedge_loop
+    # The cache reconnects on first use; the log listener restarted with a fresh queue at fork
+    goldgpt.cache.close()
+    metrics.registry.reset()
+
+def warm_up(timeout: float = None) -> bool:
+    """Prime the price snapshot, FX rate and default chart caches before serving traffic"""
+    timeout = float(os.getenv("WARMUP_TIMEOUT", 20)) if timeout is None else timeout
+    
+    def prime():
+        try:
+            with startup_report.phase('warmup'):
+                price_broadcaster.snapshot()
+                goldgpt.generate_chart_data()
+        except Exception as e:
+            logger.error(f"Error warming up market data: {str(e)}")
+    
+    start = time.perf_counter()
+    worker = threading.Thread(target=prime, name="goldgpt-warmup", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        logger.warning(f"Warmup still running after {timeout}s; serving with cold caches")
+        return False
+    logger.info(f"Warmup finished in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return True
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_DURATION.observe(time.perf_counter() - start, route=route, method=request.method,
+                                      status=str(response.status_code))
+    return response
 
 # API Routes
 @app.route('/api/chat', methods=['POST'])
+@admission.admit('llm')
 def chat():
+    # Budget for the whole pipeline, passed down to every upstream call
+    deadline = Deadline(goldgpt.chat_deadline)
     try:
         data = request.json
-        logger.info(f"Received chat request: {data}")
         
         user_message = data.get('message', '')
         session_id = data.get('session_id', str(uuid.uuid4()))
+        logger.info(f"Received chat request: session={session_id} chars={len(user_message)}")
         
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
         
         # Generate response with error handling
-        response, chart_data, image_data = goldgpt.generate_response(user_message)
+        response, chart_data, image_data = goldgpt.generate_response(user_message, deadline)
         
         result = {
             'response': response,
@@ -869,8 +1266,10 @@ def chat():
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @app.route('/api/generate-image', methods=['POST'])
+@admission.admit('image')
 def generate_image_endpoint():
     """Dedicated endpoint for image generation"""
+    deadline = Deadline(goldgpt.image_deadline)
     try:
         data = request.json
         prompt = data.get('prompt', '')
@@ -879,7 +1278,7 @@ def generate_image_endpoint():
         if not prompt:
             return jsonify({'error': 'Prompt is required'}), 400
         
-        result = goldgpt.generate_ai_image(prompt, filename)
+        result = goldgpt.generate_ai_image(prompt, filename, deadline=deadline)
         
         if result['success']:
             return jsonify({
@@ -914,24 +1313,58 @@ def serve_image(filename):
         logger.error(f"Error serving image: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def image_list_filters():
+    """q/source/since/until arguments shared by the image list endpoints; raises ValueError"""
+    source = request.args.get('source')
+    if source and source not in image_manifest.SOURCES:
+        raise ValueError(f"source must be one of {', '.join(image_manifest.SOURCES)}")
+    filters = {'query': request.args.get('q', '').strip() or None, 'source': source}
+    for name in ('since', 'until'):
+        value = request.args.get(name)
+        if value:
+            try:
+                filters[name] = image_manifest.parse_time_bound(value)
+            except ValueError:
+                raise ValueError(f'{name} must be an ISO 8601 date or timestamp')
+    return filters
+
 @app.route('/api/images', methods=['GET'])
 def list_generated_images():
-    """List all generated images"""
+    """Generated images, newest first, at most limit per response; pass next_cursor back as cursor"""
     try:
-        images = []
-        if os.path.exists(goldgpt.images_dir):
-            for filename in os.listdir(goldgpt.images_dir):
-                if filename.endswith(('.png', '.jpg', '.jpeg')):
-                    filepath = os.path.join(goldgpt.images_dir, filename)
-                    stat = os.stat(filepath)
-                    images.append({
-                        'filename': filename,
-                        'size': stat.st_size,
-                        'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        'url': f'/api/images/{filename}'
-                    })
+        try:
+            filters = image_list_filters()
+            images = goldgpt.list_images_after(
+                limit=request.args.get('limit', image_manifest.DEFAULT_PAGE_SIZE, type=int),
+                cursor=request.args.get('cursor') or None,
+                **filters
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if images is None:
+            return jsonify({'error': 'Image list is temporarily unavailable'}), 500
+        return jsonify(images)
+    except Exception as e:
+        logger.error(f"Error listing images: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v2/images', methods=['GET'])
+def list_generated_images_v2():
+    """Paginated list of generated images, filterable by prompt words, source and creation time"""
+    try:
+        try:
+            filters = image_list_filters()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({'images': images})
+        images = goldgpt.list_images(
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', image_manifest.DEFAULT_PAGE_SIZE, type=int),
+            **filters
+        )
+        if images is None:
+            return jsonify({'error': 'Image list is temporarily unavailable'}), 500
+        return jsonify(images)
     except Exception as e:
         logger.error(f"Error listing images: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -945,6 +1378,28 @@ def get_chat_history():
         logger.error(f"Error in get_chat_history: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/search', methods=['GET'])
+def search_chat_messages():
+    """Ranked, highlighted, paginated search over saved chat messages"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Query parameter q is required'}), 400
+        
+        results = goldgpt.search_chat_history(
+            query,
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', chat_search.DEFAULT_PAGE_SIZE, type=int),
+            role=request.args.get('role'),
+            session_id=request.args.get('session_id')
+        )
+        if results is None:
+            return jsonify({'error': 'Search is temporarily unavailable'}), 500
+        return jsonify(results)
+    except Exception as e:
+        logger.error(f"Error in search_chat_messages: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/chat/session/<session_id>', methods=['GET'])
 def get_chat_session(session_id):
     try:
@@ -982,33 +1437,98 @@ def delete_chat_session(session_id):
 @app.route('/api/prices', methods=['GET'])
 def get_prices():
     try:
-        gold_price = goldgpt.get_gold_price()
-        kuwait_prices = goldgpt.get_kuwait_gold_prices()
-        metal_prices = goldgpt.get_metal_prices_api()
-        
-        return jsonify({
-            'gold': gold_price,
-            'kuwait': kuwait_prices,
-            'metals': metal_prices
-        })
+        return jsonify(price_broadcaster.snapshot_json())
     except Exception as e:
         logger.error(f"Error in get_prices: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/prices/stream', methods=['GET'])
+def stream_prices():
+    """Server-sent events stream of changed price quotes"""
+    # Each open stream holds a greenlet (a thread under gthread workers) until the client leaves, so they are capped per worker
+    rejected = admission.open_stream()
+    if rejected is not None:
+        return rejected
+    response = Response(
+        stream_with_context(price_broadcaster.stream()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(admission.close_stream)
+    return response
+
+@app.route('/api/chart', methods=['GET'])
+def get_chart():
+    """Gold price chart with optional indicators, downsampled to a target point count"""
+    try:
+        chart_data = goldgpt.chart_service.get_chart_json(
+            request.args.get('range', '1mo'),
+            request.args.get('interval', '1d'),
+            request.args.get('indicators', ''),
+            request.args.get('points', DEFAULT_POINTS, type=int)
+        )
+        if chart_data:
+            return jsonify(chart_data)
+        else:
+            return jsonify({'error': 'No chart data available'}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in get_chart: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
         query = request.args.get('query', '')
         if query:
-            products = goldgpt.search_csv_products(query)
-        else:
-            products = goldgpt.get_all_csv_products()
+            return jsonify({'products': goldgpt.search_csv_products(query)})
         
-        return jsonify({'products': products})
+        return jsonify(goldgpt.get_all_csv_products_json())
     except Exception as e:
         logger.error(f"Error in get_products: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/routing', methods=['GET'])
+def get_routing_stats():
+    """Per-tier latency and cost statistics for model routing"""
+    try:
+        return jsonify({'tiers': goldgpt.model_router.stats()})
+    except Exception as e:
+        logger.error(f"Error in get_routing_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss statistics for the shared cache in this worker"""
+    try:
+        return jsonify(goldgpt.cache.stats())
+    except Exception as e:
+        logger.error(f"Error in get_cache_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics, summed over every worker when METRICS_MULTIPROC_DIR is set"""
+    try:
+        return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        logger.error(f"Error in get_metrics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/startup', methods=['GET'])
+def get_startup_report():
+    """Startup time by phase for this worker, including deferred initialization"""
+    try:
+        return jsonify(startup_report.report())
+    except Exception as e:
+        logger.error(f"Error in get_startup_report: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     try:
@@ -1031,6 +1551,10 @@ def internal_error(error):
     logger.error(f"Internal server error: {str(error)}")
     return jsonify({'error': 'Internal server error'}), 500
 
+startup_report.mark('routes')
+startup_report.ready()
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))  # Render sets PORT env var
+    image_reconciler.start()
     app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
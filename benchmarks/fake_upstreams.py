@@ -0,0 +1,226 @@
+"""Local stand-ins for OpenAI, DALL-E image URLs, metalpriceapi and yfinance
+
+The HTTP fakes run on one ThreadingHTTPServer and mimic the response shapes
+GoldGPT reads. yfinance has no configurable endpoint, so FakeTicker replaces
+yfinance.Ticker in the benchmark process. Every upstream gets a latency model
+(lognormal around a median) and an error rate.
+"""
+import json
+import math
+import sys
+import time
+import zlib
+import random
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class LatencyModel:
+    def __init__(self, median_ms: float = 0.0, jitter: float = 0.25, error_rate: float = 0.0):
+        """Lognormal latency around median_ms; jitter is the sigma of the underlying normal"""
+        self.median_ms = median_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def sample_seconds(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms / 1000 * math.exp(random.gauss(0, self.jitter))
+
+    def wait(self) -> bool:
+        """Sleep for one latency sample; returns True when this call should fail"""
+        time.sleep(self.sample_seconds())
+        return random.random() < self.error_rate
+
+
+def make_png(width: int = 64, height: int = 64) -> bytes:
+    """Build a small solid gold PNG without PIL"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + bytes((212, 175, 55)) * width
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(row * height)) +
+            chunk(b'IEND', b''))
+
+
+FAKE_PNG = make_png()
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    server_version = "FakeUpstream/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _fail(self, upstream: str):
+        self._count(f"{upstream}_errors")
+        self._send_json(500, {'error': {'message': f'injected {upstream} failure', 'type': 'server_error'}})
+
+    def _count(self, upstream: str):
+        with self.server.counts_lock:
+            self.server.counts[upstream] = self.server.counts.get(upstream, 0) + 1
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path.endswith('/chat/completions'):
+            self._count('openai')
+            if self.server.latency['openai'].wait():
+                return self._fail('openai')
+            max_tokens = payload.get('max_tokens') or 256
+            completion_tokens = min(max_tokens, 180)
+            prompt_tokens = sum(len(str(m.get('content', ''))) for m in payload.get('messages', [])) // 4
+            return self._send_json(200, {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': 'Gold is trading steadily today. ' * 20}
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens
+                }
+            })
+        if self.path.endswith('/images/generations'):
+            self._count('dalle')
+            if self.server.latency['dalle'].wait():
+                return self._fail('dalle')
+            host, port = self.server.server_address[:2]
+            return self._send_json(200, {
+                'created': int(time.time()),
+                'data': [{'url': f"http://{host}:{port}/images/fake-{random.randint(0, 1 << 30)}.png"}]
+            })
+        self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_GET(self):
+        if self.path.startswith('/images/'):
+            self._count('image')
+            if self.server.latency['image'].wait():
+                return self._fail('image')
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(FAKE_PNG)))
+            self.end_headers()
+            self.wfile.write(FAKE_PNG)
+            return
+        if self.path.startswith('/metalprice/latest'):
+            self._count('metalprice')
+            if self.server.latency['metalprice'].wait():
+                return self._fail('metalprice')
+            return self._send_json(200, {
+                'success': True,
+                'base': 'USD',
+                'timestamp': int(time.time()),
+                'rates': {'XAU': 1 / 2400.0, 'XAG': 1 / 29.5, 'XPT': 1 / 980.0, 'XPD': 1 / 1010.0}
+            })
+        self._send_json(404, {'error': {'message': 'not found'}})
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose (cancelled hedges, deadlines); don't print tracebacks for that
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeUpstreamServer:
+    def __init__(self, latency: Dict[str, LatencyModel], host: str = '127.0.0.1', port: int = 0):
+        """HTTP fakes for openai, dalle, image and metalprice upstreams"""
+        self.httpd = QuietHTTPServer((host, port), FakeUpstreamHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.counts = {}
+        self.httpd.counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return dict(self.httpd.counts)
+
+    def start(self) -> 'FakeUpstreamServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+PERIOD_DAYS = {'1d': 1, '2d': 2, '5d': 5, '1mo': 30, '3mo': 90, '6mo': 180, '1y': 365,
+               '2y': 730, '5y': 1825, '10y': 3650, 'max': 9000}
+INTERVAL_FREQ = {'1h': 'h', '1d': 'D', '1wk': 'W', '1mo': 'MS'}
+
+
+class FakeTicker:
+    """Drop-in for yfinance.Ticker returning a synthetic random-walk OHLC history"""
+    latency = LatencyModel()
+    calls = 0
+    calls_lock = threading.Lock()
+
+    def __init__(self, symbol: str, *args, **kwargs):
+        self.symbol = symbol
+
+    def history(self, period: str = '1mo', interval: str = '1d', **kwargs) -> pd.DataFrame:
+        with FakeTicker.calls_lock:
+            FakeTicker.calls += 1
+        if FakeTicker.latency.wait():
+            raise RuntimeError(f"injected yfinance failure for {self.symbol}")
+
+        days = PERIOD_DAYS.get(period, 30)
+        index = pd.date_range(end=pd.Timestamp.now().normalize(), periods=max(2, days * (24 if interval == '1h' else 1)),
+                              freq='h' if interval == '1h' else 'D')
+        if interval in ('1wk', '1mo'):
+            index = pd.date_range(end=index[-1], start=index[0], freq=INTERVAL_FREQ[interval])
+        base = 0.3075 if self.symbol == 'KWD=X' else 2400.0
+        close = base * np.exp(np.cumsum(np.random.normal(0, 0.004, len(index))))
+        return pd.DataFrame({
+            'Open': close * 0.999,
+            'High': close * 1.004,
+            'Low': close * 0.996,
+            'Close': close,
+            'Volume': np.random.randint(1000, 5000, len(index))
+        }, index=index)
+
+
+def install_fake_yfinance(latency: Optional[LatencyModel] = None):
+    """Replace yfinance.Ticker in this process with FakeTicker"""
+    import yfinance
+    if latency is not None:
+        FakeTicker.latency = latency
+    yfinance.Ticker = FakeTicker
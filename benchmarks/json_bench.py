@@ -0,0 +1,158 @@
+"""JSON serialization benchmark for large chart and product payloads
+
+Compares Flask's default provider (stdlib json, sorted keys, ASCII escaping)
+with FastJSONProvider on orjson and on its stdlib fallback, and with serving a
+cached RawJSON body. The default provider can't encode numpy values, so it is
+timed on a payload converted to builtins beforehand and the conversion
+(to_builtin) is reported as its own case. Payloads mirror /api/chart (full-resolution history with
+indicators) and /api/products (catalog rows as they come out of iterrows()).
+
+    python benchmarks/json_bench.py --history-points 5000 --products 2000 --output json_bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import json_provider  # noqa: E402
+from chart_service import compute_indicators, parse_indicators, to_wire  # noqa: E402
+from json_provider import FastJSONProvider, RawJSON  # noqa: E402
+
+
+def history_payload(points: int) -> Dict:
+    """A /api/chart body at full resolution with sma/ema/rsi/bb indicators"""
+    index = pd.date_range(end=pd.Timestamp('2025-01-01'), periods=points, freq='h')
+    close = pd.Series(2400 * np.exp(np.cumsum(np.random.normal(0, 0.004, points))), index=index)
+    indicators = compute_indicators(close, parse_indicators('sma20,ema50,rsi14,bb20'))
+    return {
+        'x': index.strftime('%Y-%m-%d %H:%M').tolist(),
+        'y': to_wire(close.to_numpy()),
+        'type': 'line',
+        'title': 'Gold Price - benchmark',
+        'source_points': points,
+        'points': points,
+        'indicators': {name: to_wire(series.to_numpy()) for name, series in indicators.items()}
+    }
+
+
+def products_payload(count: int) -> Dict:
+    """A /api/products body whose values are numpy scalars, as produced by iterrows()"""
+    catalog = pd.read_csv(os.path.join(REPO_ROOT, 'products_with_descriptions.csv'))
+    catalog = pd.concat([catalog] * (count // len(catalog) + 1), ignore_index=True).head(count)
+    products = []
+    for _, row in catalog.iterrows():
+        products.append({
+            'product_name': row['Product Name'],
+            'model': row['Model'],
+            'price': row['Price'],
+            'quantity': row['Quantity'],
+            'live_price_kwd': np.float64(row['Price']) * 1.01
+        })
+    return {'products': products}
+
+
+def to_builtin(obj):
+    """What callers have to do before the default provider can encode numpy values"""
+    if isinstance(obj, dict):
+        return {k: to_builtin(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [to_builtin(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def measure(func: Callable[[], bytes], min_seconds: float) -> Dict:
+    """Repeat func for at least min_seconds and report per-call latency"""
+    func()
+    timings: List[float] = []
+    size = 0
+    deadline = time.perf_counter() + min_seconds
+    while time.perf_counter() < deadline or len(timings) < 5:
+        start = time.perf_counter()
+        size = len(func())
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'runs': len(timings),
+        'bytes': size,
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'min_ms': round(timings[0] * 1000, 3),
+        'ops_per_s': round(len(timings) / sum(timings), 1)
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON response serialization")
+    parser.add_argument('--history-points', type=int, default=5000)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--min-seconds', type=float, default=1.0, help="time spent per measurement")
+    parser.add_argument('--output', default='-', help="result file, or - for stdout")
+    args = parser.parse_args(argv)
+
+    np.random.seed(7)
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    orjson_module = json_provider.orjson
+
+    def stdlib_fallback(payload):
+        json_provider.orjson = None
+        try:
+            return json_provider.dumps_bytes(payload)
+        finally:
+            json_provider.orjson = orjson_module
+
+    results = {}
+    with app.app_context():
+        for name, payload in (('history', history_payload(args.history_points)),
+                              ('products', products_payload(args.products))):
+            cached = RawJSON(json_provider.dumps_bytes(payload))
+            builtin = to_builtin(payload)
+            cases = {
+                'flask_default': lambda b=builtin: default_provider.response(b).get_data(),
+                'fast_provider_builtin': lambda b=builtin: fast_provider.response(b).get_data(),
+                'fast_provider': lambda p=payload: fast_provider.response(p).get_data(),
+                'fast_provider_stdlib': lambda p=payload: stdlib_fallback(p),
+                'cached_raw_json': lambda c=cached: fast_provider.response(c).get_data()
+            }
+            if orjson_module is None:
+                cases.pop('fast_provider_stdlib')
+            results[name] = {case: measure(func, args.min_seconds) for case, func in cases.items()}
+            baseline = results[name]['flask_default']['p50_ms']
+            for case in results[name].values():
+                case['speedup'] = round(baseline / case['p50_ms'], 1) if case['p50_ms'] else None
+            # Extra cost callers of the default provider pay per response; not a serializer
+            conversion = measure(lambda p=payload: to_builtin(p), args.min_seconds)
+            conversion.pop('bytes')
+            results[name]['to_builtin'] = conversion
+
+    output = json.dumps({
+        'config': {'history_points': args.history_points, 'products': args.products},
+        'environment': {
+            'python': platform.python_version(),
+            'orjson': getattr(orjson_module, '__version__', None)
+        },
+        'results': results
+    }, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""Offline load test for the GoldGPT API
+
+Runs the Flask app in-process against local fake upstreams (see
+fake_upstreams.py), drives the API at a fixed concurrency and prints
+p50/p95/p99 latency and throughput per endpoint as JSON.
+
+    python benchmarks/load_test.py --scenario mixed --concurrency 16 --requests 2000 \\
+        --latency openai=800,dalle=3000,image=150,metalprice=120,yfinance=200 \\
+        --error-rate openai=0.01 --output results.json
+
+Pass --baseline with a previous result file to fail (exit 1) when p95 latency
+or the error rate of any endpoint regressed past the given thresholds.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import uuid
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstreams import FakeTicker, FakeUpstreamServer, LatencyModel, install_fake_yfinance  # noqa: E402
+
+UPSTREAMS = ('openai', 'dalle', 'image', 'metalprice', 'yfinance')
+DEFAULT_LATENCY_MS = {'openai': 800, 'dalle': 3000, 'image': 150, 'metalprice': 120, 'yfinance': 200}
+
+CHAT_MESSAGES = [
+    "hello",
+    "What is the gold price today?",
+    "Do you have 10 gram bars available to buy?",
+    "Explain how gold performed historically during inflation and compare bars vs coins for a long term portfolio",
+    "مرحبا",
+    "كم سعر الذهب عيار 21 اليوم؟",
+    "show me a gold price chart",
+]
+IMAGE_MESSAGE = "generate image of an elegant gold necklace"
+PRODUCT_QUERIES = ['', 'kg', 'gram', 'Bangle', 'Purity 999.9', 'كيلو']
+
+# Request mix per scenario: (operation, weight)
+SCENARIOS = {
+    'mixed': [('chat', 20), ('chat_image', 1), ('prices', 35), ('products', 25), ('sessions', 19)],
+    'chat': [('chat', 1)],
+    'image': [('chat_image', 1)],
+    'prices': [('prices', 1)],
+    'products': [('products', 1)],
+    'sessions': [('sessions', 1)],
+}
+
+
+def parse_upstream_values(spec: str, defaults: Dict[str, float] = None) -> Dict[str, float]:
+    """Parse "openai=800,yfinance=200" into a dict"""
+    values = dict(defaults or {})
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, value = item.split('=', 1)
+        name = name.strip()
+        if name not in UPSTREAMS:
+            raise argparse.ArgumentTypeError(f"Unknown upstream '{name}', expected one of {', '.join(UPSTREAMS)}")
+        values[name] = float(value)
+    return values
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples: List[Tuple[str, int, float]], elapsed: float) -> Dict:
+    """Latency percentiles (ms), error counts and throughput per endpoint and overall"""
+    groups = {}
+    for endpoint, status, latency in samples:
+        groups.setdefault(endpoint, []).append((status, latency))
+    groups['_all'] = [(status, latency) for _, status, latency in samples]
+
+    result = {}
+    for endpoint, items in sorted(groups.items()):
+        latencies = sorted(latency for _, latency in items)
+        statuses = {}
+        for status, _ in items:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(1 for status, _ in items if status == 0 or status >= 500)
+        result[endpoint] = {
+            'requests': len(items),
+            'errors': errors,
+            'error_rate': round(errors / len(items), 4) if items else 0.0,
+            'statuses': statuses,
+            'throughput_rps': round(len(items) / elapsed, 2) if elapsed else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+        }
+    return result
+
+
+def compare_to_baseline(endpoints: Dict, baseline: Dict, max_p95_regression: float,
+                        max_error_rate_increase: float) -> List[str]:
+    """Endpoints whose p95 or error rate regressed past the thresholds, as readable lines"""
+    regressions = []
+    for endpoint, current in sorted(endpoints.items()):
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if previous is None:
+            continue
+        allowed_p95 = previous['p95_ms'] * (1 + max_p95_regression)
+        if current['p95_ms'] > allowed_p95:
+            regressions.append(f"{endpoint}: p95 {current['p95_ms']}ms > {round(allowed_p95, 2)}ms "
+                               f"(baseline {previous['p95_ms']}ms)")
+        allowed_errors = previous['error_rate'] + max_error_rate_increase
+        if current['error_rate'] > allowed_errors:
+            regressions.append(f"{endpoint}: error rate {current['error_rate']} > {round(allowed_errors, 4)} "
+                               f"(baseline {previous['error_rate']})")
+    return regressions
+
+
+class LoadDriver:
+    def __init__(self, base_url: str, scenario: str):
+        import requests
+        self.requests = requests
+        self.base_url = base_url
+        self.operations = [name for name, _ in SCENARIOS[scenario]]
+        self.weights = [weight for _, weight in SCENARIOS[scenario]]
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.requests.Session()
+        return session
+
+    def _call(self, endpoint: str, method: str, path: str, **kwargs) -> Tuple[str, int, float]:
+        start = time.perf_counter()
+        try:
+            response = self._session().request(method, self.base_url + path, timeout=120, **kwargs)
+            status = response.status_code
+            response.content
+        except self.requests.RequestException:
+            status = 0
+        return endpoint, status, time.perf_counter() - start
+
+    def run_one(self) -> List[Tuple[str, int, float]]:
+        operation = random.choices(self.operations, self.weights)[0]
+        if operation == 'chat':
+            return [self._call('/api/chat', 'POST', '/api/chat', json={
+                'message': random.choice(CHAT_MESSAGES), 'session_id': str(uuid.uuid4())})]
+        if operation == 'chat_image':
+            return [self._call('/api/chat[image]', 'POST', '/api/chat', json={
+                'message': IMAGE_MESSAGE, 'session_id': str(uuid.uuid4())})]
+        if operation == 'prices':
+            return [self._call('/api/prices', 'GET', '/api/prices')]
+        if operation == 'products':
+            query = random.choice(PRODUCT_QUERIES)
+            return [self._call('/api/products', 'GET', '/api/products', params={'query': query} if query else None)]
+        # sessions: save -> load -> list -> delete, the way the UI uses them
+        session_id = str(uuid.uuid4())
+        messages = [
+            {'role': 'user', 'content': random.choice(CHAT_MESSAGES)},
+            {'role': 'assistant', 'content': 'Gold is trading steadily today. ' * 30}
+        ]
+        return [
+            self._call('/api/chat/session[save]', 'POST', f'/api/chat/session/{session_id}', json={'messages': messages}),
+            self._call('/api/chat/session[load]', 'GET', f'/api/chat/session/{session_id}'),
+            self._call('/api/chat/history', 'GET', '/api/chat/history'),
+            self._call('/api/chat/session[delete]', 'DELETE', f'/api/chat/session/{session_id}')
+        ]
+
+
+def run_load(driver: LoadDriver, concurrency: int, total_requests: int, duration: float) -> Tuple[List, float]:
+    """Run operations from `concurrency` threads until the request count or duration is reached"""
+    samples = []
+    samples_lock = threading.Lock()
+    remaining = [total_requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            else:
+                with samples_lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            results = driver.run_one()
+            with samples_lock:
+                samples.extend(results)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - start
+
+
+def start_app_server(workdir: str):
+    """Import the app inside workdir and serve it from a threaded WSGI server"""
+    from werkzeug.serving import make_server
+
+    os.chdir(workdir)
+    import app as goldgpt_app
+    # werkzeug defaults its own logger to INFO; keep per-request access lines out of the run
+    logging.getLogger('werkzeug').setLevel(logging.getLogger().level)
+
+    server = make_server('127.0.0.1', 0, goldgpt_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="goldgpt-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline GoldGPT load test against fake upstreams")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help="operations to run (ignored with --duration)")
+    parser.add_argument('--duration', type=float, default=0, help="run for this many seconds instead of --requests")
+    parser.add_argument('--warmup', type=int, default=20, help="operations to run before measuring")
+    parser.add_argument('--latency', default='', help="median upstream latency in ms, e.g. openai=800,yfinance=200")
+    parser.add_argument('--jitter', type=float, default=0.25, help="lognormal sigma applied to every upstream")
+    parser.add_argument('--error-rate', default='', help="upstream error rates, e.g. openai=0.01,metalprice=0.05")
+    parser.add_argument('--cache-backend', choices=('memory', 'sqlite'), default='sqlite')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default='-', help="result file, or - for stdout")
+    parser.add_argument('--baseline', default=None, help="previous result file to check for regressions")
+    parser.add_argument('--max-p95-regression', type=float, default=0.2,
+                        help="allowed relative p95 increase over the baseline (0.2 = +20%%)")
+    parser.add_argument('--max-error-rate-increase', type=float, default=0.01,
+                        help="allowed absolute error rate increase over the baseline")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    latency_ms = parse_upstream_values(args.latency, DEFAULT_LATENCY_MS)
+    error_rates = parse_upstream_values(args.error_rate)
+    models = {name: LatencyModel(latency_ms.get(name, 0), args.jitter, error_rates.get(name, 0.0)) for name in UPSTREAMS}
+
+    fakes = FakeUpstreamServer(models).start()
+    install_fake_yfinance(models['yfinance'])
+
+    workdir = tempfile.mkdtemp(prefix='goldgpt-bench-')
+    shutil.copy(os.path.join(REPO_ROOT, 'products_with_descriptions.csv'), workdir)
+    os.environ.update({
+        'OPENAI_API_KEY': 'sk-benchmark',
+        'OPENAI_BASE_URL': f"{fakes.base_url}/v1",
+        'METAL_API_KEY': 'benchmark',
+        'METAL_API_URL': f"{fakes.base_url}/metalprice/latest",
+        'GOLDGPT_CACHE_BACKEND': args.cache_backend,
+        'GOLDGPT_CACHE_PATH': os.path.join(workdir, 'goldgpt_cache.db'),
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'CRITICAL')
+    })
+    # Every simulated client shares one IP; keep per-IP rate limits out of the way
+    # (per-session limits and the concurrency pools still apply)
+    os.environ.setdefault('ADMISSION_IP_MULTIPLIER', '1000000')
+
+    server = None
+    result = None
+    try:
+        server, base_url = start_app_server(workdir)
+        driver = LoadDriver(base_url, args.scenario)
+        if args.warmup:
+            run_load(driver, args.concurrency, args.warmup, 0)
+
+        fakes.httpd.counts.clear()
+        FakeTicker.calls = 0
+        samples, elapsed = run_load(driver, args.concurrency, args.requests, args.duration)
+
+        result = {
+            'config': {
+                'scenario': args.scenario,
+                'concurrency': args.concurrency,
+                'requests': args.requests if not args.duration else None,
+                'duration_s': args.duration or None,
+                'latency_ms': latency_ms,
+                'jitter': args.jitter,
+                'error_rate': error_rates,
+                'cache_backend': args.cache_backend
+            },
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count()
+            },
+            'elapsed_s': round(elapsed, 3),
+            'upstream_calls': {**fakes.counts, 'yfinance': FakeTicker.calls},
+            'endpoints': summarize(samples, elapsed)
+        }
+    except Exception as e:
+        print(f"Load test failed: {type(e).__name__}: {str(e)}", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.shutdown()
+        fakes.stop()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if result is None:
+        return 2
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+    if baseline is not None:
+        regressions = compare_to_baseline(result['endpoints'], baseline, args.max_p95_regression,
+                                          args.max_error_rate_increase)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Chat history search benchmark
+
+Fills a scratch SQLite database with synthetic Arabic and English chat
+messages, times the one-time FTS backfill and indexed inserts,
+then measures /api/chat/search queries (chat_search.search) of varying
+selectivity.
+
+    python benchmarks/search_bench.py --messages 1000000 --output search_bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import platform
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import chat_search  # noqa: E402
+
+ENGLISH_WORDS = (
+    'gold silver platinum price today karat bar coin ring necklace bracelet invest market ounce gram '
+    'kuwait dinar buy sell premium spot chart trend rally dip storage certificate purity hallmark '
+    'the a is of and to in for on with what how much should i my your about'
+).split()
+ARABIC_WORDS = (
+    'الذهب ذهب والذهب سعر أسعار الفضة البلاتين اليوم عيار سبيكة سبائك عملة خاتم قلادة سوار استثمار '
+    'السوق أونصة غرام الكويت دينار شراء بيع مرتفع منخفض التخزين شهادة النقاء في من على ما هو كم هل'
+).split()
+# Only in a handful of messages, to measure selective queries
+RARE_WORDS = ['palladium', 'rhodium', 'البلاديوم']
+
+SCHEMA = '''
+    CREATE TABLE chat_sessions (id TEXT PRIMARY KEY, title TEXT NOT NULL,
+                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL,
+                           content TEXT NOT NULL, chart_data TEXT, image_data TEXT,
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+'''
+
+
+def synthetic_message(rng: random.Random) -> str:
+    vocabulary = ARABIC_WORDS if rng.random() < 0.5 else ENGLISH_WORDS
+    words = [rng.choice(vocabulary) for _ in range(rng.randint(8, 80))]
+    if rng.random() < 0.0005:
+        words.insert(rng.randrange(len(words)), rng.choice(RARE_WORDS))
+    return ' '.join(words)
+
+
+def populate(conn: sqlite3.Connection, count: int, rng: random.Random):
+    """count messages in sessions of 10, inserted before the search schema exists"""
+    conn.executescript(SCHEMA)
+    sessions = [(f"session-{n}", f"Chat {n}") for n in range(count // 10 + 1)]
+    conn.executemany('INSERT INTO chat_sessions (id, title) VALUES (?, ?)', sessions)
+    conn.executemany(
+        'INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)',
+        ((f"session-{n // 10}", 'user' if n % 2 == 0 else 'assistant', synthetic_message(rng)) for n in range(count))
+    )
+    conn.commit()
+
+
+def measure(func, repeat: int) -> Dict:
+    timings: List[float] = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'hits_on_page': len(result['results']),
+        'has_more': result['has_more'],
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 2),
+        'max_ms': round(timings[-1] * 1000, 2)
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark chat history full-text search")
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--inserts', type=int, default=5000, help="messages inserted and indexed one at a time")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='-', help="result file, or - for stdout")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'search_bench.db')
+        conn = sqlite3.connect(path)
+
+        start = time.perf_counter()
+        populate(conn, args.messages, rng)
+        results['populate_seconds'] = round(time.perf_counter() - start, 2)
+
+        start = time.perf_counter()
+        chat_search.install_schema(conn)
+        chat_search.rebuild_index(conn)
+        results['backfill_seconds'] = round(time.perf_counter() - start, 2)
+
+        start = time.perf_counter()
+        for _ in range(args.inserts):
+            content = synthetic_message(rng)
+            cursor = conn.execute('INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)',
+                                  ('session-0', 'user', content))
+            chat_search.index_messages(conn, [(cursor.lastrowid, content, 'user', 'session-0')])
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        results['indexed_inserts_per_s'] = round(args.inserts / elapsed) if elapsed else None
+
+        queries = {
+            'rare_term': {'query': 'palladium'},
+            'rare_arabic': {'query': 'البلاديوم'},
+            'two_terms': {'query': 'gold price'},
+            'arabic_article_variants': {'query': 'سعر الذهب'},
+            'prefix': {'query': 'certif'},
+            'common_term_deep_page': {'query': 'gold', 'page': 50},
+            'session_filter': {'query': 'gold', 'session_id': 'session-42'},
+            'role_filter': {'query': 'kuwait dinar', 'role': 'user'}
+        }
+        results['queries'] = {
+            name: measure(lambda q=query: chat_search.search(conn, **q), args.repeat)
+            for name, query in queries.items()
+        }
+        results['database_mb'] = round(os.path.getsize(path) / 1e6, 1)
+        conn.close()
+
+    output = json.dumps({
+        'config': {'messages': args.messages, 'inserts': args.inserts, 'repeat': args.repeat},
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version},
+        'results': results
+    }, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
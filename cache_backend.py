@@ -0,0 +1,404 @@
+"""Pluggable cache backends shared by GoldGPT components
+
+MemoryCache is per process. SQLiteCache stores entries in a local SQLite file
+so every gunicorn worker on the host shares one warm cache, including an
+atomic get-or-compute that lets only one process refresh an expired key.
+
+SQLiteCache values are stored as JSON (plus pre-serialized RawJSON bodies
+and OHLC DataFrames), never as pickles, so whoever can write the cache file
+can't make a worker execute code by planting an entry.
+"""
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+from deadline import active_deadline, exceeded
+from json_provider import RawJSON, dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+
+_MISSING = object()
+
+# Stage reported when a request's deadline runs out while it waits on someone else's compute
+CACHE_WAIT_STAGE = 'cache_wait'
+
+# First byte of a stored value: how the rest is encoded
+_JSON, _RAW_JSON, _FRAME = b'j', b'r', b'f'
+
+
+def encode_value(value: Any) -> bytes:
+    """Serialize a cache value; raises TypeError for values that can't be stored"""
+    if isinstance(value, RawJSON):
+        return _RAW_JSON + value.body
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(value, pd.DataFrame):
+        return _FRAME + dumps_bytes(_frame_to_dict(value, pd))
+    return _JSON + dumps_bytes(value)
+
+
+def decode_value(data: bytes) -> Any:
+    data = bytes(data)
+    tag, body = data[:1], data[1:]
+    if tag == _JSON:
+        return loads(body)
+    if tag == _RAW_JSON:
+        return RawJSON(body)
+    if tag == _FRAME:
+        import pandas as pd
+        return _frame_from_dict(loads(body), pd)
+    raise ValueError(f"Unknown cache value encoding {tag!r}")
+
+
+def _frame_to_dict(frame, pd) -> Dict:
+    index = frame.index
+    if isinstance(index, pd.DatetimeIndex):
+        encoded_index = {'kind': 'datetime', 'ticks': index.asi8.tolist(), 'unit': getattr(index, 'unit', 'ns'),
+                         'tz': str(index.tz) if index.tz else None}
+    else:
+        encoded_index = {'kind': 'values', 'values': index.tolist()}
+    return {
+        'index': encoded_index,
+        'index_name': index.name,
+        'columns': [str(column) for column in frame.columns],
+        'dtypes': [str(dtype) for dtype in frame.dtypes],
+        'data': [frame[column].tolist() for column in frame.columns]
+    }
+
+
+def _frame_from_dict(encoded: Dict, pd):
+    index = encoded['index']
+    if index['kind'] == 'datetime':
+        values = pd.to_datetime(index['ticks'], unit=index['unit'], utc=index['tz'] is not None)
+        if hasattr(values, 'as_unit'):
+            values = values.as_unit(index['unit'])
+        values = values.tz_convert(index['tz']) if index['tz'] else values
+    else:
+        values = index['values']
+    index = pd.Index(values, name=encoded['index_name'])
+    return pd.DataFrame({
+        column: pd.Series(data, index=index, dtype=None if dtype == 'object' else dtype)
+        for column, dtype, data in zip(encoded['columns'], encoded['dtypes'], encoded['data'])
+    }, index=index)
+
+
+class CacheBackend:
+    """Cache interface: TTL'd get/set, atomic get-or-compute and hit/miss statistics
+
+    Values are only cached when they are not None, so a failed upstream
+    fetch that returns None is retried on the next call.
+    """
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "computes": 0, "compute_waits": 0}
+        # Held only while someone computes or waits on the key, then dropped
+        self._key_locks = weakref.WeakValueDictionary()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        """Release process resources; the cache stays usable and reopens them on demand"""
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: float) -> Any:
+        """Return the cached value or compute it once, even under concurrent callers"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._key_locked(key):
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self._count("compute_waits")
+                return value
+            return self._compute_and_set(key, compute, ttl)
+
+    def _compute_and_set(self, key: str, compute: Callable[[], Any], ttl: float) -> Any:
+        self._count("computes")
+        value = compute()
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+    def _lookup(self, key: str) -> Any:
+        """Read without touching hit/miss statistics"""
+        raise NotImplementedError
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._stats_lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def _key_locked(self, key: str):
+        """Hold the key's lock; under an active deadline, raise DeadlineExceeded rather than wait past it"""
+        lock = self._key_lock(key)
+        deadline = active_deadline()
+        if deadline is None:
+            lock.acquire()
+        elif not lock.acquire(timeout=deadline.timeout(threading.TIMEOUT_MAX, CACHE_WAIT_STAGE)):
+            raise exceeded(CACHE_WAIT_STAGE)
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict:
+        """Get hit/miss statistics for this process"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats["backend"] = type(self).__name__
+        return stats
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self):
+        """In-process cache; entries are not shared between workers"""
+        super().__init__()
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _lookup(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return _MISSING
+            return entry[1]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            self._count("misses")
+            return default
+        self._count("hits")
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+        self._count("sets")
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(CacheBackend):
+    def __init__(self, path: str, lock_timeout: float = 30.0, poll_interval: float = 0.05):
+        """Cache stored in a SQLite file shared by every process on the host"""
+        super().__init__()
+        self.path = path
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._sets_since_purge = 0
+        self._owner_pid = None
+        self._owner_id = None
+
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_leases (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread and per process (connections must not cross a fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Only close() touches a connection from another thread
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            with self._connections_lock:
+                # Connections inherited over a fork belong to the parent; forget them without closing
+                self._connections = [(pid, c) for pid, c in self._connections if pid == os.getpid()]
+                self._connections.append((os.getpid(), conn))
+        return conn
+
+    def close(self):
+        """Close every connection this process opened, e.g. in a preloading master before it forks"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for pid, conn in connections:
+            if pid == os.getpid():
+                conn.close()
+
+    @property
+    def _owner(self) -> str:
+        """Lease owner id, unique per process (a preloaded master's id must not leak into its workers)"""
+        if self._owner_pid != os.getpid():
+            self._owner_id = f"{os.getpid()}-{uuid.uuid4().hex}"
+            self._owner_pid = os.getpid()
+        return self._owner_id
+
+    def _lookup(self, key: str) -> Any:
+        row = self._connection().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        if row is None:
+            return _MISSING
+        try:
+            return decode_value(row[0])
+        except Exception as e:
+            logger.error(f"Error decoding cache entry {key}: {str(e)}")
+            return _MISSING
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self._lookup(key)
+        except sqlite3.Error as e:
+            logger.error(f"Error reading cache entry {key}: {str(e)}")
+            value = _MISSING
+        if value is _MISSING:
+            self._count("misses")
+            return default
+        self._count("hits")
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        try:
+            self._write(key, value, ttl)
+            self._count("sets")
+        except (sqlite3.Error, TypeError) as e:
+            logger.error(f"Error writing cache entry {key}: {str(e)}")
+
+    def _write(self, key: str, value: Any, ttl: float):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, sqlite3.Binary(encode_value(value)), time.time() + ttl)
+        )
+        self._sets_since_purge += 1
+        if self._sets_since_purge >= 100:
+            self._sets_since_purge = 0
+            conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),))
+        conn.commit()
+
+    def delete(self, key: str):
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_entries')
+        conn.execute('DELETE FROM cache_leases')
+        conn.commit()
+
+    def _acquire_lease(self, key: str) -> bool:
+        """Take the cross-process compute lease for a key unless another live owner holds it"""
+        now = time.time()
+        conn = self._connection()
+        cursor = conn.execute('''
+            INSERT INTO cache_leases (key, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE cache_leases.expires_at <= ?
+        ''', (key, self._owner, now + self.lock_timeout, now))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key: str):
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_leases WHERE key = ? AND owner = ?', (key, self._owner))
+        conn.commit()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: float) -> Any:
+        """Return the cached value or compute it in exactly one process while the others wait"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._key_locked(key):
+            try:
+                return self._compute_with_lease(key, compute, ttl)
+            except sqlite3.Error as e:
+                logger.error(f"Cache lease error on {key}, computing locally: {str(e)}")
+                return self._compute_and_set(key, compute, ttl)
+
+    def _compute_with_lease(self, key: str, compute: Callable[[], Any], ttl: float) -> Any:
+        wait_until = time.monotonic() + self.lock_timeout
+        request_deadline = active_deadline()
+        bounded_by_request = request_deadline is not None and request_deadline.expires_at < wait_until
+        if bounded_by_request:
+            wait_until = request_deadline.expires_at
+        while True:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self._count("compute_waits")
+                return value
+            if self._acquire_lease(key):
+                try:
+                    value = self._lookup(key)
+                    if value is not _MISSING:
+                        return value
+                    return self._compute_and_set(key, compute, ttl)
+                finally:
+                    self._release_lease(key)
+            if time.monotonic() >= wait_until:
+                if bounded_by_request:
+                    raise exceeded(CACHE_WAIT_STAGE)
+                logger.warning(f"Timed out waiting for cache lease on {key}, computing locally")
+                return self._compute_and_set(key, compute, ttl)
+            time.sleep(min(self.poll_interval, max(0.0, wait_until - time.monotonic())))
+
+
+def create_cache_backend(kind: str = None, path: str = None) -> CacheBackend:
+    """Create the configured cache backend (GOLDGPT_CACHE_BACKEND=sqlite|memory)"""
+    kind = (kind or os.getenv("GOLDGPT_CACHE_BACKEND", "sqlite")).lower()
+    if kind == "memory":
+        return MemoryCache()
+    if kind == "sqlite":
+        path = path or os.getenv("GOLDGPT_CACHE_PATH", "goldgpt_cache.db")
+        try:
+            return SQLiteCache(path)
+        except Exception as e:
+            logger.error(f"Error opening SQLite cache at {path}, falling back to memory: {str(e)}")
+            return MemoryCache()
+    raise ValueError(f"Unknown cache backend: {kind}")
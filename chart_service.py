@@ -0,0 +1,251 @@
+"""Server-side gold chart analytics: configurable ranges, LTTB downsampling and cached indicators"""
+import os
+import re
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from startup import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+from cache_backend import CacheBackend, MemoryCache
+from json_provider import RawJSON, dumps
+
+logger = logging.getLogger(__name__)
+
+
+RANGE_LABELS = {
+    '5d': 'Last 5 Days',
+    '1mo': 'Last 30 Days',
+    '3mo': 'Last 3 Months',
+    '6mo': 'Last 6 Months',
+    '1y': 'Last Year',
+    '2y': 'Last 2 Years',
+    '5y': 'Last 5 Years',
+    '10y': 'Last 10 Years',
+    'max': 'All Time'
+}
+INTERVALS = ('1h', '1d', '1wk', '1mo')
+INTRADAY_RANGES = ('5d', '1mo', '3mo', '6mo', '1y', '2y')  # yfinance only keeps ~730 days of hourly data
+
+INDICATOR_PATTERN = re.compile(r'^(sma|ema|rsi|bb)(\d{1,3})?$')
+INDICATOR_DEFAULT_WINDOWS = {'sma': 20, 'ema': 20, 'rsi': 14, 'bb': 20}
+# Only the usual windows are offered, so clients can't mint a cache entry per window
+INDICATOR_WINDOWS = {
+    'sma': (5, 10, 20, 50, 100, 200),
+    'ema': (9, 12, 20, 26, 50, 100, 200),
+    'rsi': (7, 14, 21),
+    'bb': (10, 20, 50)
+}
+MAX_INDICATORS = 6
+BOLLINGER_STD = 2.0
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+# Requested point counts are rounded up to one of these before caching
+POINT_BUCKETS = (50, 100, 250, 500, 1000, 2000, MAX_POINTS)
+
+
+def parse_indicators(spec: str) -> Tuple[Tuple[str, int], ...]:
+    """Parse "sma20,ema50,rsi,bb20" into sorted (kind, window) pairs"""
+    indicators = set()
+    for token in (spec or '').lower().split(','):
+        token = token.strip()
+        if not token:
+            continue
+        match = INDICATOR_PATTERN.match(token)
+        if not match:
+            raise ValueError(f"Unknown indicator: {token}")
+        kind = match.group(1)
+        window = int(match.group(2)) if match.group(2) else INDICATOR_DEFAULT_WINDOWS[kind]
+        if window not in INDICATOR_WINDOWS[kind]:
+            raise ValueError(f"Unsupported {kind} window {window}, use one of "
+                             f"{', '.join(str(w) for w in INDICATOR_WINDOWS[kind])}")
+        indicators.add((kind, window))
+    if len(indicators) > MAX_INDICATORS:
+        raise ValueError(f"At most {MAX_INDICATORS} indicators per chart")
+    return tuple(sorted(indicators))
+
+
+def snap_points(points: int) -> int:
+    """Round a requested point count up to the nearest cached bucket"""
+    return next(bucket for bucket in POINT_BUCKETS if bucket >= points)
+
+
+def lttb_indices(x: 'np.ndarray', y: 'np.ndarray', threshold: int) -> 'np.ndarray':
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points"""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    bucket_edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = bucket_edges[i], bucket_edges[i + 1]
+        next_start, next_end = bucket_edges[i + 1], bucket_edges[i + 2] if i + 2 < len(bucket_edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        ax, ay = x[selected], y[selected]
+        areas = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        selected = start + int(np.argmax(areas)) if end > start else start
+        indices[i + 1] = selected
+
+    return indices
+
+
+def compute_indicators(close: 'pd.Series', indicators: Tuple[Tuple[str, int], ...]) -> Dict[str, 'pd.Series']:
+    """Compute moving averages, RSI and Bollinger bands over the full close series"""
+    result = {}
+    for kind, window in indicators:
+        if kind == 'sma':
+            result[f"sma{window}"] = close.rolling(window).mean()
+        elif kind == 'ema':
+            result[f"ema{window}"] = close.ewm(span=window, adjust=False).mean()
+        elif kind == 'rsi':
+            delta = close.diff()
+            gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+            loss = (-delta.clip(upper=0)).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+            rs = gain / loss.replace(0, np.nan)
+            rsi = 100 - 100 / (1 + rs)
+            result[f"rsi{window}"] = rsi.where(loss != 0, 100.0).where(gain.notna())
+        elif kind == 'bb':
+            middle = close.rolling(window).mean()
+            std = close.rolling(window).std()
+            result[f"bb{window}_upper"] = middle + BOLLINGER_STD * std
+            result[f"bb{window}_middle"] = middle
+            result[f"bb{window}_lower"] = middle - BOLLINGER_STD * std
+    return result
+
+
+def to_wire(values: 'np.ndarray') -> List[Optional[float]]:
+    """Round to 2 decimals and replace NaN with None for JSON"""
+    rounded = np.round(values.astype(float), 2)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+
+class ChartService:
+    def __init__(self, history_provider: Callable[[str, str], 'pd.DataFrame'], cache: CacheBackend = None,
+                 data_ttl: float = None, intraday_ttl: float = None):
+        """Initialize chart service around an OHLC history provider (range, interval) -> DataFrame"""
+        self.history_provider = history_provider
+        self.cache = cache or MemoryCache()
+        self.data_ttl = data_ttl if data_ttl is not None else float(os.getenv("CHART_DATA_TTL", 3600))
+        self.intraday_ttl = intraday_ttl if intraday_ttl is not None else float(os.getenv("CHART_INTRADAY_TTL", 300))
+
+    def validate(self, period: str, interval: str, points: int) -> int:
+        """Validate a chart request, raising ValueError on bad parameters; returns the bucketed point count"""
+        if period not in RANGE_LABELS:
+            raise ValueError(f"Unsupported range: {period}")
+        if interval not in INTERVALS:
+            raise ValueError(f"Unsupported interval: {interval}")
+        if interval == '1h' and period not in INTRADAY_RANGES:
+            raise ValueError("Interval 1h is only available for ranges up to 2y")
+        if not 3 <= points <= MAX_POINTS:
+            raise ValueError(f"points must be between 3 and {MAX_POINTS}")
+        return snap_points(points)
+
+    def _ttl(self, interval: str) -> float:
+        return self.intraday_ttl if interval == '1h' else self.data_ttl
+
+    def get_history(self, period: str, interval: str) -> Optional['pd.DataFrame']:
+        """Get the OHLC series for a range/interval, cached per interval TTL"""
+        def load():
+            data = self.history_provider(period, interval)
+            if data is None or data.empty:
+                return None
+            return data[['Open', 'High', 'Low', 'Close']].dropna(subset=['Close'])
+        return self.cache.get_or_compute(f"chart:history:{period}:{interval}", load, self._ttl(interval))
+
+    def get_chart(self, period: str = '1mo', interval: str = '1d', indicators: str = '',
+                  points: int = DEFAULT_POINTS) -> Optional[Dict]:
+        """Get a downsampled chart with indicators
+
+        The price series is cached per (range, interval, point bucket) and each
+        indicator separately, so the number of cache entries stays bounded by
+        the whitelisted windows whatever combination clients ask for.
+        """
+        points = self.validate(period, interval, points)
+        indicator_set = parse_indicators(indicators)
+        chart_data = self._get_series(period, interval, points)
+        if chart_data is None:
+            return None
+        if indicator_set:
+            chart_data = {**chart_data, 'indicators': {}}
+            for indicator in indicator_set:
+                chart_data['indicators'].update(self._get_indicator(period, interval, points, indicator) or {})
+        return chart_data
+
+    def get_chart_json(self, period: str = '1mo', interval: str = '1d', indicators: str = '',
+                       points: int = DEFAULT_POINTS) -> Optional[RawJSON]:
+        """Get the same chart as get_chart, pre-serialized for the /api/chart response body"""
+        points = self.validate(period, interval, points)
+        if parse_indicators(indicators):
+            # Assembled from cached parts; only the plain series is cached whole
+            chart_data = self.get_chart(period, interval, indicators, points)
+            return RawJSON(dumps(chart_data)) if chart_data else None
+
+        def encode():
+            chart_data = self._get_series(period, interval, points)
+            return RawJSON(dumps(chart_data)) if chart_data else None
+        return self.cache.get_or_compute(f"chart:json:{period}:{interval}:{points}", encode, self._ttl(interval))
+
+    def _get_sample(self, period: str, interval: str, points: int) -> Optional[List[int]]:
+        """Row positions kept by LTTB for this range, interval and point bucket"""
+        def sample():
+            history = self.get_history(period, interval)
+            if history is None or history.empty:
+                return None
+            close = history['Close']
+            timestamps = history.index.asi8 if isinstance(history.index, pd.DatetimeIndex) else np.arange(len(close))
+            return lttb_indices(timestamps.astype(float), close.to_numpy(dtype=float), points).tolist()
+        return self.cache.get_or_compute(f"chart:sample:{period}:{interval}:{points}", sample, self._ttl(interval))
+
+    def _get_series(self, period: str, interval: str, points: int) -> Optional[Dict]:
+        return self.cache.get_or_compute(f"chart:data:{period}:{interval}:{points}",
+                                         lambda: self._build_series(period, interval, points), self._ttl(interval))
+
+    def _get_indicator(self, period: str, interval: str, points: int,
+                       indicator: Tuple[str, int]) -> Optional[Dict[str, List]]:
+        kind, window = indicator
+        return self.cache.get_or_compute(f"chart:indicator:{period}:{interval}:{points}:{kind}{window}",
+                                         lambda: self._build_indicator(period, interval, points, indicator),
+                                         self._ttl(interval))
+
+    def _build_series(self, period: str, interval: str, points: int) -> Optional[Dict]:
+        history = self.get_history(period, interval)
+        keep = self._get_sample(period, interval, points)
+        if history is None or history.empty or keep is None:
+            return None
+
+        close = history['Close']
+        date_format = '%Y-%m-%d %H:%M' if interval == '1h' else '%Y-%m-%d'
+        return {
+            'x': history.index[keep].strftime(date_format).tolist(),
+            'y': to_wire(close.to_numpy()[keep]),
+            'type': 'line',
+            'title': f"Gold Price - {RANGE_LABELS[period]}",
+            'xaxis_title': 'Date',
+            'yaxis_title': 'Price (USD/oz)',
+            'range': period,
+            'interval': interval,
+            'source_points': len(close),
+            'points': len(keep)
+        }
+
+    def _build_indicator(self, period: str, interval: str, points: int,
+                         indicator: Tuple[str, int]) -> Optional[Dict[str, List]]:
+        """One indicator (several series for Bollinger bands) over the full history, at the sampled rows"""
+        history = self.get_history(period, interval)
+        keep = self._get_sample(period, interval, points)
+        if history is None or history.empty or keep is None:
+            return None
+        return {name: to_wire(series.to_numpy()[keep])
+                for name, series in compute_indicators(history['Close'], (indicator,)).items()}
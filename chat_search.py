@@ -0,0 +1,453 @@
+"""Full-text search over chat history with SQLite FTS5
+
+FTS5's tokenizers don't know Arabic, so messages are indexed through a
+normalized copy of their text:
+
+* tashkeel, Quranic marks and tatweel are dropped,
+* alef, yeh, teh marbuta and hamza-carrier variants are unified,
+* Persian keheh/yeh and Arabic-Indic digits are mapped to their usual forms,
+* the definite article (with a leading و/ف/ب/ك, or as لل) is stripped,
+  so "الذهب", "والذهب" and "ذهب" all match one another.
+
+Queries are normalized the same way. Snippets are cut from the original
+message: normalization only drops or replaces single characters, so every
+character of the indexed text maps back to a position in the original.
+
+The normalized copy lives in messages_search, written in Python by
+index_messages() in the same transaction as the messages themselves.
+messages_fts is an external-content index over messages_search, kept in
+sync by triggers that only use built-in SQL, so any connection (the
+sqlite3 shell, a script) can write to messages: deleting or editing a
+message drops it from messages_search, and messages inserted without
+index_messages() are picked up by the next rebuild.
+
+A new index, or one whose SEARCH_INDEX_VERSION is out of date (e.g. after
+changing the normalization), is backfilled by rebuild_index() outside the
+request path: in the gunicorn master before it forks, or on a background
+thread. Until search_meta records the current version, search() scans the
+SEARCH_SCAN_LIMIT most recent messages unranked instead of querying the
+index. `python chat_search.py rebuild` rebuilds it by hand.
+"""
+import os
+import re
+import sys
+import html
+import sqlite3
+import logging
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_VERSION = '2'
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MAX_QUERY_TERMS = 8
+SNIPPET_CHARS = 160
+
+# bm25 has to score every hit before the first page can be returned, about a
+# second for a term found in half of a million messages. Queries with more
+# than SEARCH_RANK_WINDOW hits are listed newest first instead.
+RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", 5000))
+
+# Messages scanned (newest first) while the index is being backfilled
+SCAN_LIMIT = int(os.getenv("SEARCH_SCAN_LIMIT", 2000))
+
+# Only the message text counts towards relevance, not the role/session_id filter columns
+RANK_EXPRESSION = 'bm25(messages_fts, 1.0, 0.0, 0.0)'
+
+# Characters dropped from indexed text: Arabic tashkeel and Quranic annotation marks, tatweel
+DROPPED_CHARS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+
+CHAR_MAP = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',  # alef with hamza/madda/wasla
+    'ى': 'ي', 'ی': 'ي', 'ئ': 'ي',  # alef maqsura, Persian yeh, yeh with hamza
+    'ة': 'ه',  # teh marbuta
+    'ؤ': 'و',  # waw with hamza
+    'ک': 'ك',  # Persian keheh
+}
+CHAR_MAP.update({chr(0x0660 + digit): str(digit) for digit in range(10)})  # Arabic-Indic digits
+CHAR_MAP.update({chr(0x06f0 + digit): str(digit) for digit in range(10)})  # Extended Arabic-Indic digits
+
+# Definite article, optionally after a conjunction/preposition, when at least
+# three letters remain ("لل" is ل + ال; "الله" is left alone)
+ARTICLE_PATTERN = re.compile(r'(?<!\w)(?:[وفبك]?ال|لل)(?=\w{3})')
+ARTICLE_PREFIX = re.compile(r'(?:[وفبك]?ال|لل)')
+
+# str.translate() table doing the per-character part of normalize_with_positions() in C
+TRANSLATION = {ord(char): mapped for char, mapped in CHAR_MAP.items()}
+TRANSLATION.update({code: None for code in range(0x0600, 0x0700) if DROPPED_CHARS.match(chr(code))})
+
+# A token as the unicode61 tokenizer sees it: a run of letters and digits
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def normalize_with_positions(text: str) -> Tuple[str, List[int]]:
+    """Normalize text for indexing; positions[i] is the index in text of normalized character i"""
+    chars, positions = [], []
+    for index, char in enumerate(text):
+        if DROPPED_CHARS.match(char):
+            continue
+        chars.append(CHAR_MAP.get(char, char))
+        positions.append(index)
+    normalized = ''.join(chars)
+
+    articles = [match.span() for match in ARTICLE_PATTERN.finditer(normalized)]
+    if articles:
+        kept_chars, kept_positions, previous = [], [], 0
+        for start, end in articles:
+            kept_chars.append(normalized[previous:start])
+            kept_positions.extend(positions[previous:start])
+            previous = end
+        kept_chars.append(normalized[previous:])
+        kept_positions.extend(positions[previous:])
+        normalized, positions = ''.join(kept_chars), kept_positions
+    return normalized, positions
+
+
+def normalize(text: Optional[str]) -> str:
+    """Normalized text as stored in messages_fts (same result as normalize_with_positions, faster)"""
+    if not text:
+        return ''
+    return ARTICLE_PATTERN.sub('', text.translate(TRANSLATION))
+
+
+def index_version(conn: sqlite3.Connection) -> Optional[str]:
+    try:
+        row = conn.execute("SELECT value FROM search_meta WHERE key = 'index_version'").fetchone()
+    except sqlite3.OperationalError:
+        # search_meta doesn't exist yet
+        return None
+    return row[0] if row else None
+
+
+def drop_legacy_index(conn: sqlite3.Connection):
+    """Drop the version 1 index, whose triggers called goldgpt_normalize() on every write to messages"""
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'messages_search_content'").fetchone()
+    if legacy is None:
+        return
+    logger.info("Dropping the chat search index that depended on goldgpt_normalize()")
+    conn.executescript('''
+        DROP TRIGGER IF EXISTS messages_fts_insert;
+        DROP TRIGGER IF EXISTS messages_fts_delete;
+        DROP TRIGGER IF EXISTS messages_fts_update;
+        DROP TABLE IF EXISTS messages_fts;
+        DROP VIEW IF EXISTS messages_search_content;
+    ''')
+
+
+def install_schema(conn: sqlite3.Connection) -> bool:
+    """Create the search table, its FTS index and sync triggers
+
+    Returns True if the index is current, False if it still needs a
+    rebuild_index() backfill (new or outdated index).
+    """
+    drop_legacy_index(conn)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS messages_search (
+            id INTEGER PRIMARY KEY,
+            body TEXT NOT NULL,
+            role TEXT NOT NULL,
+            session_id TEXT NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            body, role, session_id,
+            content='messages_search', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        );
+        CREATE TRIGGER IF NOT EXISTS messages_search_fts_insert AFTER INSERT ON messages_search BEGIN
+            INSERT INTO messages_fts (rowid, body, role, session_id)
+            VALUES (new.id, new.body, new.role, new.session_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS messages_search_fts_delete AFTER DELETE ON messages_search BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, body, role, session_id)
+            VALUES ('delete', old.id, old.body, old.role, old.session_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS messages_search_fts_update AFTER UPDATE ON messages_search BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, body, role, session_id)
+            VALUES ('delete', old.id, old.body, old.role, old.session_id);
+            INSERT INTO messages_fts (rowid, body, role, session_id)
+            VALUES (new.id, new.body, new.role, new.session_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS messages_search_unindex_deleted AFTER DELETE ON messages BEGIN
+            DELETE FROM messages_search WHERE id = old.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS messages_search_unindex_updated
+        AFTER UPDATE OF content, role, session_id ON messages BEGIN
+            DELETE FROM messages_search WHERE id = old.id;
+        END;
+        CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    ''')
+    return index_version(conn) == SEARCH_INDEX_VERSION
+
+
+def index_messages(conn: sqlite3.Connection, rows: Iterable[Tuple[int, str, str, str]]):
+    """Add (id, content, role, session_id) messages to the search index, in the caller's transaction"""
+    conn.executemany('''
+        INSERT INTO messages_search (id, body, role, session_id) VALUES (?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET body = excluded.body, role = excluded.role, session_id = excluded.session_id
+    ''', ((message_id, normalize(content), role, session_id) for message_id, content, role, session_id in rows))
+
+
+def rebuild_index(conn: sqlite3.Connection, force: bool = False) -> Optional[int]:
+    """Re-index every message (the backfill); returns the number indexed, or None if it was already current
+
+    Failing to get the write lock raises sqlite3.OperationalError and leaves
+    the index as it was, so the caller can retry.
+    """
+    cursor = conn.cursor()
+    # Take the write lock first so concurrently starting workers rebuild only once
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        # Whoever held the lock before us may just have finished the same rebuild
+        version = index_version(conn)
+        if version == SEARCH_INDEX_VERSION and not force:
+            conn.rollback()
+            return None
+        cursor.execute('SELECT COUNT(*) FROM messages')
+        count = cursor.fetchone()[0]
+        logger.info(f"Building chat search index for {count} messages "
+                    f"(version {version or 'none'} -> {SEARCH_INDEX_VERSION})")
+        # The delete trigger removes each row from messages_fts with the body it was indexed with
+        cursor.execute('DELETE FROM messages_search')
+        # A separate cursor, so the inserts don't reset the one being read
+        index_messages(conn, conn.execute('SELECT id, content, role, session_id FROM messages'))
+        cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('optimize')")
+        cursor.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('index_version', ?)",
+                       (SEARCH_INDEX_VERSION,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Chat search index built for {count} messages")
+    return count
+
+
+def quote_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fold(token: str) -> str:
+    """Case and Latin diacritic folding, as done by the unicode61 tokenizer"""
+    decomposed = unicodedata.normalize('NFD', token.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def query_terms(query: str) -> List[List[Tuple[str, bool]]]:
+    """Normalized query terms, each a list of (term, is_prefix) alternatives; all terms are required
+
+    The last term is matched as a prefix. A half-typed word keeps its article
+    ("الذه" is too short to strip), so its stem is tried as well.
+    """
+    terms = TOKEN_PATTERN.findall(normalize(query))[:MAX_QUERY_TERMS]
+    groups = [[(term, False)] for term in terms]
+    if terms and len(terms[-1]) >= 2:
+        groups[-1] = [(terms[-1], True)]
+        stem = ARTICLE_PREFIX.match(terms[-1])
+        if stem and len(terms[-1]) > stem.end() + 1:
+            groups[-1].append((terms[-1][stem.end():], True))
+    return groups
+
+
+def build_match_query(groups: List[List[Tuple[str, bool]]], role: str = None,
+                      session_id: str = None) -> Optional[str]:
+    """FTS5 MATCH expression for query_terms(), optionally limited to a role and session"""
+    if not groups:
+        return None
+    parts = []
+    for group in groups:
+        phrases = [quote_phrase(term) + ('*' if prefix else '') for term, prefix in group]
+        parts.append(phrases[0] if len(phrases) == 1 else '(' + ' OR '.join(phrases) + ')')
+    expression = 'body : (' + ' AND '.join(parts) + ')'
+    if role:
+        expression += f' AND role : {quote_phrase(role)}'
+    if session_id:
+        expression += f' AND session_id : {quote_phrase(session_id)}'
+    return expression
+
+
+def _in_word(char: str) -> bool:
+    return char.isalnum() or DROPPED_CHARS.match(char) is not None
+
+
+def make_snippet(content: str, groups: List[List[Tuple[str, bool]]], width: int = SNIPPET_CHARS) -> str:
+    """HTML-escaped excerpt of the original message around the first hit, hits wrapped in <mark>
+
+    Highlighting happens here rather than with FTS5's highlight(), which
+    re-runs the whole MATCH for every row it is asked about.
+    """
+    alternatives = [(fold(term), prefix) for group in groups for term, prefix in group]
+    normalized, positions = normalize_with_positions(content)
+    spans = []
+    for match in TOKEN_PATTERN.finditer(normalized):
+        token = fold(match.group())
+        if not any(token.startswith(term) if prefix else token == term for term, prefix in alternatives):
+            continue
+        # Map back to the original and widen to whole words (article, tashkeel)
+        start, end = positions[match.start()], positions[match.end() - 1] + 1
+        while start > 0 and _in_word(content[start - 1]):
+            start -= 1
+        while end < len(content) and _in_word(content[end]):
+            end += 1
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+        else:
+            spans.append((start, end))
+
+    first = spans[0][0] if spans else 0
+    window_start = max(0, first - width // 3)
+    if window_start:
+        space = content.rfind(' ', 0, window_start + 1)
+        window_start = space + 1 if space >= 0 and window_start - space < 20 else window_start
+    window_end = min(len(content), window_start + width)
+    if window_end < len(content):
+        space = content.find(' ', window_end)
+        window_end = space if 0 <= space - window_end < 20 else window_end
+
+    parts, cursor = [], window_start
+    for start, end in spans:
+        start, end = max(start, window_start), min(end, window_end)
+        if start >= end:
+            continue
+        parts.append(html.escape(content[cursor:start]))
+        parts.append('<mark>' + html.escape(content[start:end]) + '</mark>')
+        cursor = end
+    parts.append(html.escape(content[cursor:window_end]))
+    snippet = ''.join(parts).strip()
+    return ('…' if window_start > 0 else '') + snippet + ('…' if window_end < len(content) else '')
+
+
+def matches(content: str, groups: List[List[Tuple[str, bool]]]) -> bool:
+    """Whether a message contains every query term, the way the index would match it"""
+    tokens = {fold(token) for token in TOKEN_PATTERN.findall(normalize(content))}
+
+    def found(term: str, prefix: bool) -> bool:
+        term = fold(term)
+        return any(token.startswith(term) for token in tokens) if prefix else term in tokens
+    return all(any(found(term, prefix) for term, prefix in group) for group in groups)
+
+
+def scan_recent(conn: sqlite3.Connection, groups: List[List[Tuple[str, bool]]], result: Dict,
+                role: str = None, session_id: str = None) -> Dict:
+    """Unranked hits among the SCAN_LIMIT newest messages, for while the index is being backfilled"""
+    conditions, params = [], []
+    if role:
+        conditions.append('m.role = ?')
+        params.append(role)
+    if session_id:
+        conditions.append('m.session_id = ?')
+        params.append(session_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    rows = conn.execute(f'''
+        SELECT m.id, m.session_id, m.role, m.content, m.created_at, s.title
+        FROM messages m LEFT JOIN chat_sessions s ON s.id = m.session_id
+        {where} ORDER BY m.id DESC LIMIT ?
+    ''', params + [SCAN_LIMIT]).fetchall()
+
+    hits = [row for row in rows if matches(row[3], groups)]
+    offset = (result['page'] - 1) * result['page_size']
+    page_hits = hits[offset:offset + result['page_size']]
+    result.update(order='recent', indexing=True, has_more=len(hits) > offset + len(page_hits))
+    result['results'] = [{
+        'message_id': row[0],
+        'session_id': row[1],
+        'title': row[5],
+        'role': row[2],
+        'snippet': make_snippet(row[3], groups),
+        'timestamp': row[4],
+        'score': None
+    } for row in page_hits]
+    return result
+
+
+def search(conn: sqlite3.Connection, query: str, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE,
+           role: str = None, session_id: str = None) -> Dict:
+    """Ranked, highlighted, paginated message hits for a query
+
+    While the index is being backfilled ('indexing' is True) the hits are
+    unranked and only cover recent messages.
+    """
+    page = max(1, page)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    result = {'query': query, 'page': page, 'page_size': page_size, 'order': 'relevance',
+              'indexing': False, 'has_more': False, 'results': []}
+    groups = query_terms(query)
+    expression = build_match_query(groups, role, session_id)
+    if expression is None:
+        return result
+    if index_version(conn) != SEARCH_INDEX_VERSION:
+        return scan_recent(conn, groups, result, role, session_id)
+
+    cursor = conn.cursor()
+    offset = (page - 1) * page_size
+    # Walking the doclist newest first is cheap and tells whether ranking is affordable
+    cursor.execute('''
+        SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?
+        ORDER BY rowid DESC LIMIT ?
+    ''', (expression, RANK_WINDOW + 1))
+    recent = [row[0] for row in cursor.fetchall()]
+
+    # One extra row tells whether there is a next page without counting every hit
+    if len(recent) > RANK_WINDOW:
+        result['order'] = 'recent'
+        if offset + page_size < len(recent):
+            ids = recent[offset:offset + page_size + 1]
+        else:
+            cursor.execute('''
+                SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?
+                ORDER BY rowid DESC LIMIT ? OFFSET ?
+            ''', (expression, page_size + 1, offset))
+            ids = [row[0] for row in cursor.fetchall()]
+        hits = [(message_id, None) for message_id in ids]
+    elif offset < len(recent):
+        cursor.execute(f'''
+            SELECT rowid, {RANK_EXPRESSION} AS score
+            FROM messages_fts WHERE messages_fts MATCH ?
+            ORDER BY score LIMIT ? OFFSET ?
+        ''', (expression, page_size + 1, offset))
+        hits = cursor.fetchall()
+    else:
+        hits = []
+    result['has_more'] = len(hits) > page_size
+    hits = hits[:page_size]
+    if not hits:
+        return result
+
+    ids = [hit[0] for hit in hits]
+    placeholders = ','.join('?' * len(ids))
+    cursor.execute(f'''
+        SELECT m.id, m.session_id, m.role, m.content, m.created_at, s.title
+        FROM messages m LEFT JOIN chat_sessions s ON s.id = m.session_id
+        WHERE m.id IN ({placeholders})
+    ''', ids)
+    rows = {row[0]: row for row in cursor.fetchall()}
+
+    for message_id, score in hits:
+        row = rows.get(message_id)
+        if row is None:
+            continue
+        result['results'].append({
+            'message_id': message_id,
+            'session_id': row[1],
+            'title': row[5],
+            'role': row[2],
+            'snippet': make_snippet(row[3], groups),
+            'timestamp': row[4],
+            'score': round(-score, 4) if score is not None else None
+        })
+    return result
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("usage: python chat_search.py rebuild [database]")
+        sys.exit(1)
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'goldgpt_chats.db'
+    connection = sqlite3.connect(db_path)
+    install_schema(connection)
+    count = rebuild_index(connection, force=True)
+    print(f"Indexed {count} messages in {db_path}")
+    connection.close()
@@ -0,0 +1,93 @@
+"""Per-request deadlines for upstream calls
+
+A Deadline is created by the HTTP handler (CHAT_DEADLINE_SECONDS,
+IMAGE_DEADLINE_SECONDS) and passed down explicitly to generate_response,
+the completion router and image generation. Every upstream call asks for
+its timeout with upstream_timeout(cap, stage), which returns the smaller of
+the call's usual timeout and what is left of the budget, and raises
+DeadlineExceeded instead of starting a call that cannot finish in time.
+
+Market data fetches sit behind the shared cache and the pricing engine's
+provider callbacks, so they can't take an argument; generate_response
+activates its deadline for the current context and upstream_timeout picks
+it up from there. Background threads (price polling, warmup) have no active
+deadline and keep their usual timeouts. Callers waiting on the shared cache
+for another request's fetch also give up when the active deadline runs out.
+"""
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from metrics import DEADLINE_EXCEEDED
+
+# Not worth starting an upstream call with less time than this
+MIN_UPSTREAM_TIMEOUT = 0.1
+
+_active_deadline = contextvars.ContextVar('goldgpt_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded before {stage}")
+        self.stage = stage
+
+
+def exceeded(stage: str) -> DeadlineExceeded:
+    """Count a blown budget and return the exception to raise"""
+    DEADLINE_EXCEEDED.inc(stage=stage)
+    return DeadlineExceeded(stage)
+
+
+class Deadline:
+    def __init__(self, seconds: float, expires_at: float = None):
+        """Budget of seconds from now (or an absolute time.monotonic() expiry)"""
+        self.seconds = seconds
+        self.expires_at = expires_at if expires_at is not None else time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def reserve(self, seconds: float) -> 'Deadline':
+        """A deadline that expires `seconds` earlier, leaving that much for a later stage"""
+        return Deadline(max(0.0, self.seconds - seconds), self.expires_at - seconds)
+
+    def timeout(self, cap: float, stage: str) -> float:
+        """Timeout for one upstream call: cap, shortened to the remaining budget"""
+        remaining = self.remaining()
+        if remaining < MIN_UPSTREAM_TIMEOUT:
+            raise exceeded(stage)
+        return min(cap, remaining)
+
+    @contextmanager
+    def activate(self):
+        """Make this the deadline seen by upstream_timeout() in the current context"""
+        token = _active_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _active_deadline.reset(token)
+
+
+def active_deadline() -> Optional[Deadline]:
+    return _active_deadline.get()
+
+
+@contextmanager
+def detached():
+    """Run a block without the active deadline, e.g. a shared refresh that one request happens to trigger"""
+    token = _active_deadline.set(None)
+    try:
+        yield
+    finally:
+        _active_deadline.reset(token)
+
+
+def upstream_timeout(cap: float, stage: str, deadline: Optional[Deadline] = None) -> float:
+    """Timeout for an upstream call under the given or active deadline, or cap without one"""
+    deadline = deadline or _active_deadline.get()
+    return deadline.timeout(cap, stage) if deadline is not None else cap
@@ -0,0 +1,79 @@
+"""Gunicorn settings for GoldGPT
+
+The app is preloaded in the master: the product catalog, its search index,
+the pricing engine and the compiled keyword routers are built once and shared
+copy-on-write by every worker. The master closes its cache connections and
+flushes its log queue before each fork; per-process resources (OpenAI client,
+HTTP session, SQLite connections) are created after the fork, and each worker
+primes the market data caches and starts the image manifest reconciler
+before it accepts traffic.
+
+Metrics are summed over the workers through snapshot files in
+METRICS_MULTIPROC_DIR (see metrics.py), so any worker can answer a scrape.
+
+Workers are gevent by default, so an open /api/prices/stream connection
+costs a greenlet rather than a thread: each worker takes up to
+ADMISSION_STREAM_CONCURRENCY (1000) streams plus 100 other connections.
+GUNICORN_WORKER_CLASS=gthread runs threads instead, with 16 streams and
+8 other requests per worker (see admission.py).
+"""
+import os
+import tempfile
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+if worker_class == "gevent":
+    # Before anything imports socket, ssl or threading: the app is preloaded in this process
+    from gevent import monkey
+    monkey.patch_all()
+
+import admission
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_connections = admission.worker_connections()
+threads = admission.worker_threads()
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() != "false"
+os.environ.setdefault("METRICS_MULTIPROC_DIR",
+                      os.path.join(tempfile.gettempdir(), f"goldgpt-metrics-{os.getenv('PORT', '5000')}"))
+
+
+def on_starting(server):
+    from metrics import registry
+    registry.clear_multiprocess_dir()
+
+
+def when_ready(server):
+    if preload_app:
+        import app
+        app.preload_shared_state()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        import app
+        app.prepare_fork()
+
+
+def post_fork(server, worker):
+    import app
+    app.reset_after_fork()
+
+
+def post_worker_init(worker):
+    import app
+    app.warm_up()
+    app.image_reconciler.start()
+    app.metrics.registry.start_flusher()
+
+
+def worker_exit(server, worker):
+    from metrics import registry
+    registry.write_snapshot()
+
+
+def child_exit(server, worker):
+    from metrics import registry
+    registry.mark_process_dead(worker.pid)
@@ -0,0 +1,414 @@
+"""Manifest of generated images backing /api/images and /api/v2/images
+
+Every image saved by generate_ai_image() is recorded in the image_manifest
+table (in the chat database) with its prompt, enhanced prompt, file size,
+pixel dimensions and creation time, so listing images is an indexed query
+instead of a listdir plus a stat per file. /api/images keeps its original
+item shape but returns at most MAX_PAGE_SIZE images per response, paging
+with an opaque (created_at, filename) cursor (list_images_after).
+
+Text filters go through image_manifest_fts, an FTS5 index over the prompts
+and filename kept in sync by triggers; every word of the query is matched
+as a word prefix ("neck" finds "necklace"). created_at is local time
+without an offset, so since/until bounds are converted to local time before
+they are compared (parse_time_bound).
+
+Files copied into or deleted from generated_images/ behind the app's back
+are picked up by reconcile(): it lists the directory once, stats only names
+the manifest doesn't know (recorded with source 'external'), and drops rows
+whose file is gone. A directory whose mtime hasn't changed since the last
+pass is skipped without listing it. Replacing an existing file in place
+keeps its old row; run with force to re-read everything.
+
+The reconciliation runs once when the table is created (importing images
+generated before the manifest existed), every IMAGE_RECONCILE_SECONDS in
+one worker at a time (ManifestReconciler), and on demand:
+
+    python image_manifest.py reconcile [database] [images_dir]
+"""
+import io
+import os
+import base64
+import binascii
+import sys
+import re
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from startup import lazy_import
+
+Image = lazy_import('PIL.Image')
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+SOURCES = ('generated', 'external')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_QUERY_TERMS = 8
+MANIFEST_COLUMNS = 'filename, prompt, enhanced_prompt, size_bytes, width, height, created_at, source'
+
+# A word as the unicode61 tokenizer sees it; filenames split on '_' and '.'
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def install_schema(conn: sqlite3.Connection) -> bool:
+    """Create the manifest tables; returns True if they did not exist yet"""
+    created = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'image_manifest'").fetchone() is None
+    if not created:
+        migrate_to_integer_ids(conn)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS image_manifest (
+            id INTEGER PRIMARY KEY,
+            filename TEXT NOT NULL UNIQUE,
+            prompt TEXT,
+            enhanced_prompt TEXT,
+            size_bytes INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            created_at TEXT NOT NULL,
+            source TEXT NOT NULL DEFAULT 'generated'
+        );
+        CREATE INDEX IF NOT EXISTS idx_image_manifest_created ON image_manifest (created_at);
+        CREATE TABLE IF NOT EXISTS image_manifest_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    ''')
+    install_search_index(conn)
+    return created
+
+
+def migrate_to_integer_ids(conn: sqlite3.Connection):
+    """Give manifests keyed by filename an explicit id, the FTS index's content_rowid
+
+    The implicit rowid of a table with a TEXT primary key may be renumbered
+    by VACUUM, which would leave the external-content index pointing at the
+    wrong rows. The index is dropped here and rebuilt by install_search_index.
+    """
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(image_manifest)')]
+    if 'id' in columns:
+        return
+    logger.info("Migrating image manifest to integer ids")
+    conn.executescript(f'''
+        BEGIN IMMEDIATE;
+        DROP TRIGGER IF EXISTS image_manifest_fts_insert;
+        DROP TRIGGER IF EXISTS image_manifest_fts_delete;
+        DROP TRIGGER IF EXISTS image_manifest_fts_update;
+        DROP TABLE IF EXISTS image_manifest_fts;
+        DROP INDEX IF EXISTS idx_image_manifest_created;
+        ALTER TABLE image_manifest RENAME TO image_manifest_migrating;
+        CREATE TABLE image_manifest (
+            id INTEGER PRIMARY KEY,
+            filename TEXT NOT NULL UNIQUE,
+            prompt TEXT,
+            enhanced_prompt TEXT,
+            size_bytes INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            created_at TEXT NOT NULL,
+            source TEXT NOT NULL DEFAULT 'generated'
+        );
+        INSERT INTO image_manifest ({MANIFEST_COLUMNS})
+            SELECT {MANIFEST_COLUMNS} FROM image_manifest_migrating ORDER BY created_at, filename;
+        DROP TABLE image_manifest_migrating;
+        COMMIT;
+    ''')
+
+
+def install_search_index(conn: sqlite3.Connection):
+    """Create the prompt/filename FTS index and its triggers, indexing existing rows the first time"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'image_manifest_fts'").fetchone() is not None
+    conn.executescript('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS image_manifest_fts USING fts5(
+            filename, prompt, enhanced_prompt,
+            content='image_manifest', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        );
+        CREATE TRIGGER IF NOT EXISTS image_manifest_fts_insert AFTER INSERT ON image_manifest BEGIN
+            INSERT INTO image_manifest_fts (rowid, filename, prompt, enhanced_prompt)
+            VALUES (new.id, new.filename, new.prompt, new.enhanced_prompt);
+        END;
+        CREATE TRIGGER IF NOT EXISTS image_manifest_fts_delete AFTER DELETE ON image_manifest BEGIN
+            INSERT INTO image_manifest_fts (image_manifest_fts, rowid, filename, prompt, enhanced_prompt)
+            VALUES ('delete', old.id, old.filename, old.prompt, old.enhanced_prompt);
+        END;
+        CREATE TRIGGER IF NOT EXISTS image_manifest_fts_update AFTER UPDATE ON image_manifest BEGIN
+            INSERT INTO image_manifest_fts (image_manifest_fts, rowid, filename, prompt, enhanced_prompt)
+            VALUES ('delete', old.id, old.filename, old.prompt, old.enhanced_prompt);
+            INSERT INTO image_manifest_fts (rowid, filename, prompt, enhanced_prompt)
+            VALUES (new.id, new.filename, new.prompt, new.enhanced_prompt);
+        END;
+    ''')
+    if not exists:
+        # Manifests created before the index existed
+        conn.execute("INSERT INTO image_manifest_fts (image_manifest_fts) VALUES ('rebuild')")
+        conn.commit()
+
+
+def image_dimensions(source) -> Tuple[Optional[int], Optional[int]]:
+    """(width, height) from image bytes or a path; only the header is read"""
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+            return img.size
+    except Exception as e:
+        logger.warning(f"Could not read image dimensions: {str(e)}")
+        return None, None
+
+
+def record_image(conn: sqlite3.Connection, filename: str, data: bytes, prompt: str = None,
+                 enhanced_prompt: str = None, created_at: str = None):
+    """Add or replace the manifest row for an image the app just wrote"""
+    width, height = image_dimensions(data)
+    # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete doesn't fire the FTS delete trigger
+    conn.execute('''
+        INSERT INTO image_manifest
+            (filename, prompt, enhanced_prompt, size_bytes, width, height, created_at, source)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 'generated')
+        ON CONFLICT (filename) DO UPDATE SET
+            prompt = excluded.prompt, enhanced_prompt = excluded.enhanced_prompt,
+            size_bytes = excluded.size_bytes, width = excluded.width, height = excluded.height,
+            created_at = excluded.created_at, source = excluded.source
+    ''', (filename, prompt, enhanced_prompt, len(data), width, height, created_at or datetime.now().isoformat()))
+    conn.commit()
+
+
+def to_wire(row) -> Dict:
+    filename, prompt, enhanced_prompt, size_bytes, width, height, created_at, source = row
+    return {
+        'filename': filename,
+        'size': size_bytes,
+        'width': width,
+        'height': height,
+        'created': created_at,
+        'prompt': prompt,
+        'enhanced_prompt': enhanced_prompt,
+        'source': source,
+        'url': f'/api/images/{filename}'
+    }
+
+
+def to_legacy_wire(row) -> Dict:
+    """The fields /api/images returned before the manifest existed"""
+    filename, size_bytes, created_at = row
+    return {'filename': filename, 'size': size_bytes, 'created': created_at, 'url': f'/api/images/{filename}'}
+
+
+def parse_time_bound(value: str) -> str:
+    """An ISO 8601 date or timestamp as a naive local time string comparable with created_at
+
+    Timestamps with an offset (or a trailing Z) are converted to local time;
+    ones without an offset are taken as local time already. Raises ValueError.
+    """
+    value = value.strip()
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+
+def match_expression(query: str) -> Optional[str]:
+    """FTS5 MATCH expression requiring every word of the query as a word prefix"""
+    terms = TOKEN_PATTERN.findall(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' AND '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+def encode_cursor(created_at: str, filename: str) -> str:
+    """Opaque /api/images cursor pointing just past the given row"""
+    return base64.urlsafe_b64encode(f"{created_at}\n{filename}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(created_at, filename) from an encode_cursor() string; raises ValueError"""
+    try:
+        created_at, filename = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('\n', 1)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('malformed cursor')
+    return created_at, filename
+
+
+def filter_conditions(query: str = None, source: str = None, since: str = None,
+                      until: str = None) -> Tuple[List[str], List]:
+    """SQL conditions and parameters for the prompt/filename, source and [since, until) filters"""
+    conditions, params = [], []
+    expression = match_expression(query) if query else None
+    if expression:
+        conditions.append('id IN (SELECT rowid FROM image_manifest_fts WHERE image_manifest_fts MATCH ?)')
+        params.append(expression)
+    if source:
+        conditions.append('source = ?')
+        params.append(source)
+    if since:
+        conditions.append('created_at >= ?')
+        params.append(since)
+    if until:
+        conditions.append('created_at < ?')
+        params.append(until)
+    return conditions, params
+
+
+def list_images_after(conn: sqlite3.Connection, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None,
+                      query: str = None, source: str = None, since: str = None, until: str = None) -> Dict:
+    """Newest first images in the legacy /api/images shape, continuing from a cursor
+
+    Keyset pagination on (created_at, filename), so deep pages cost the same
+    as the first; next_cursor is None on the last page. since and until as
+    for list_images. Raises ValueError for a malformed cursor.
+    """
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    conditions, params = filter_conditions(query, source, since, until)
+    if cursor:
+        conditions.append('(created_at, filename) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    rows = conn.execute(f'''
+        SELECT filename, size_bytes, created_at FROM image_manifest {where}
+        ORDER BY created_at DESC, filename DESC
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+    last = rows[limit - 1] if len(rows) > limit else None
+    return {
+        'images': [to_legacy_wire(row) for row in rows[:limit]],
+        'next_cursor': encode_cursor(last[2], last[0]) if last else None
+    }
+
+
+def list_images(conn: sqlite3.Connection, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE, query: str = None,
+                source: str = None, since: str = None, until: str = None) -> Dict:
+    """Newest first page of images, filtered by prompt/filename words, source and [since, until)
+
+    since and until must already be in created_at's format (see parse_time_bound).
+    """
+    page = max(1, page)
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    conditions, params = filter_conditions(query, source, since, until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    # One extra row tells us whether there is a next page without a COUNT(*)
+    rows = conn.execute(f'''
+        SELECT filename, prompt, enhanced_prompt, size_bytes, width, height, created_at, source
+        FROM image_manifest {where}
+        ORDER BY created_at DESC, filename DESC
+        LIMIT ? OFFSET ?
+    ''', params + [page_size + 1, (page - 1) * page_size]).fetchall()
+    return {
+        'images': [to_wire(row) for row in rows[:page_size]],
+        'page': page,
+        'page_size': page_size,
+        'has_more': len(rows) > page_size
+    }
+
+
+def reconcile(conn: sqlite3.Connection, images_dir: str, force: bool = False) -> Dict:
+    """Bring the manifest in line with the files in images_dir; returns what changed"""
+    changes = {'added': 0, 'removed': 0, 'skipped': False}
+    if not os.path.isdir(images_dir):
+        return changes
+
+    dir_mtime = str(os.stat(images_dir).st_mtime_ns)
+    row = conn.execute("SELECT value FROM image_manifest_meta WHERE key = 'dir_mtime_ns'").fetchone()
+    if not force and row is not None and row[0] == dir_mtime:
+        changes['skipped'] = True
+        return changes
+
+    known = {name for (name,) in conn.execute('SELECT filename FROM image_manifest')}
+    added = []
+    on_disk = set()
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                continue
+            on_disk.add(entry.name)
+            if entry.name in known and not force:
+                continue
+            stat = entry.stat()
+            width, height = image_dimensions(entry.path)
+            added.append((entry.name, stat.st_size, width, height,
+                          datetime.fromtimestamp(stat.st_ctime).isoformat()))
+    removed = known - on_disk
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Rows written by the app since we listed known already have their file on disk
+        conn.executemany('''
+            INSERT INTO image_manifest (filename, size_bytes, width, height, created_at, source)
+            VALUES (?, ?, ?, ?, ?, 'external')
+            ON CONFLICT (filename) DO UPDATE SET
+                size_bytes = excluded.size_bytes, width = excluded.width, height = excluded.height
+        ''', added)
+        conn.executemany('DELETE FROM image_manifest WHERE filename = ?', ((name,) for name in removed))
+        conn.execute("INSERT OR REPLACE INTO image_manifest_meta (key, value) VALUES ('dir_mtime_ns', ?)",
+                     (dir_mtime,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    changes['added'] = len([name for name, *_ in added if name not in known])
+    changes['removed'] = len(removed)
+    if changes['added'] or changes['removed']:
+        logger.info(f"Image manifest reconciled: {changes['added']} added, {changes['removed']} removed")
+    return changes
+
+
+class ManifestReconciler:
+    def __init__(self, reconcile: Callable[[], Dict], cache=None, interval: float = None):
+        """Background loop running reconcile every interval seconds (0 disables it)"""
+        self.reconcile = reconcile
+        self.cache = cache
+        self.interval = interval if interval is not None else float(os.getenv("IMAGE_RECONCILE_SECONDS", 900))
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.interval <= 0 or self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="image-manifest-reconciler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            self._thread = None
+
+    def run_once(self) -> Optional[Dict]:
+        """Reconcile now, or return the recent result if another worker sharing the cache just did"""
+        if self.cache is None:
+            return self.reconcile()
+        return self.cache.get_or_compute("images:reconcile", self.reconcile, self.interval)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error reconciling image manifest: {str(e)}")
+            self._stop.wait(self.interval)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'reconcile':
+        print("usage: python image_manifest.py reconcile [database] [images_dir]")
+        sys.exit(1)
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'goldgpt_chats.db'
+    images_dir = sys.argv[3] if len(sys.argv) > 3 else 'generated_images'
+    connection = sqlite3.connect(db_path)
+    install_schema(connection)
+    changes = reconcile(connection, images_dir, force=True)
+    count = connection.execute('SELECT COUNT(*) FROM image_manifest').fetchone()[0]
+    print(f"Reconciled {images_dir}: {changes['added']} added, {changes['removed']} removed, {count} images")
+    connection.close()
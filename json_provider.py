@@ -0,0 +1,136 @@
+"""JSON serialization for API responses and stored chat data
+
+Uses orjson when it is installed and the stdlib json module otherwise, with
+the same type handling either way: numpy scalars and arrays, pandas
+timestamps, series and missing values are converted natively, and RawJSON
+wraps bodies that were serialized once and cached so they are written out
+without being encoded again.
+"""
+import sys
+import json
+import uuid
+import dataclasses
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional, Union
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RawJSON:
+    __slots__ = ('body',)
+
+    def __init__(self, body: Union[bytes, str]):
+        """A pre-serialized JSON document, emitted as-is"""
+        self.body = body if isinstance(body, bytes) else body.encode('utf-8')
+
+    def __getstate__(self):
+        return self.body
+
+    def __setstate__(self, body):
+        self.body = body
+
+
+def default(obj: Any) -> Any:
+    """Convert values the JSON encoders don't handle natively"""
+    if isinstance(obj, RawJSON):
+        return loads(obj.body)
+    # Only look at numpy/pandas if something already imported them
+    np = sys.modules.get('numpy')
+    if np is not None:
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+    pd = sys.modules.get('pandas')
+    if pd is not None:
+        if obj is pd.NaT or obj is pd.NA:
+            return None
+        if isinstance(obj, pd.Timestamp):
+            return obj.isoformat()
+        if isinstance(obj, (pd.Series, pd.Index)):
+            return obj.tolist()
+        if isinstance(obj, pd.DataFrame):
+            return obj.to_dict(orient='records')
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    ORJSON_FRAGMENT = getattr(orjson, 'Fragment', None)
+
+    def _orjson_default(obj: Any) -> Any:
+        if isinstance(obj, RawJSON) and ORJSON_FRAGMENT is not None:
+            return ORJSON_FRAGMENT(obj.body)
+        return default(obj)
+
+
+def dumps_bytes(obj: Any, sort_keys: bool = False, indent: Optional[int] = None) -> bytes:
+    """Serialize to UTF-8 JSON bytes"""
+    if isinstance(obj, RawJSON):
+        return obj.body
+    if orjson is not None:
+        option = ORJSON_OPTIONS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_orjson_default, option=option)
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib handles those
+            pass
+    return json.dumps(obj, default=default, ensure_ascii=False, sort_keys=sort_keys, indent=indent,
+                      separators=None if indent else (',', ':')).encode('utf-8')
+
+
+def dumps(obj: Any, sort_keys: bool = False, indent: Optional[int] = None) -> str:
+    """Serialize to a JSON string (e.g. for SQLite TEXT columns)"""
+    return dumps_bytes(obj, sort_keys, indent).decode('utf-8')
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON text or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Keep insertion order instead of sorting every response body
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys), indent=kwargs.get('indent'))
+
+    def loads(self, s: Union[bytes, str], **kwargs) -> Any:
+        return loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        """Like jsonify, but writes the encoder's bytes straight into the response"""
+        if args and kwargs:
+            raise TypeError("app.json.response() takes either args or kwargs, not both")
+        if kwargs:
+            obj = kwargs
+        elif len(args) == 1:
+            obj = args[0]
+        else:
+            obj = args or None
+        indent = 2 if self.compact is False or (self.compact is None and self._app.debug) else None
+        return self._app.response_class(dumps_bytes(obj, self.sort_keys, indent), mimetype=self.mimetype)
@@ -0,0 +1,210 @@
+"""Structured JSON logging with an async queue handler, redaction and per-route sampling
+
+Request threads only filter and enqueue records; formatting, redaction and
+I/O happen on a background listener thread. Around every fork (gunicorn's
+preloaded master forking workers) the listener is stopped, and the child
+gets a fresh queue and its own listener, so it never inherits a queue whose
+lock was held mid-fork or one that no thread drains. Configuration comes
+from the environment:
+
+    LOG_LEVEL            root level (default INFO)
+    LOG_FORMAT           json or text (default json)
+    LOG_MAX_FIELD_CHARS  truncate messages and string fields (default 1000)
+    LOG_SAMPLE_RATES     per-route sampling of DEBUG/INFO records,
+                         e.g. "/api/prices=0.01,/api/chat=0.2"
+    LOG_QUEUE_SIZE       records buffered before new ones are dropped (default 10000)
+"""
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict
+
+# Attributes every LogRecord has; anything else was passed via extra=
+STANDARD_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+SENSITIVE_KEYS = re.compile(r'(api_?key|authorization|password|secret|token|base64|image_data)', re.IGNORECASE)
+SECRET_PATTERN = re.compile(r'(sk-[A-Za-z0-9_\-]{8})[A-Za-z0-9_\-]+')
+BASE64_PATTERN = re.compile(r'[A-Za-z0-9+/=]{256,}')
+
+NOISY_LOGGERS = ('urllib3', 'yfinance', 'httpx', 'httpx2', 'httpcore', 'openai', 'peewee', 'PIL')
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "route=rate,route=rate" into a dict"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        route, rate = item.rsplit('=', 1)
+        try:
+            rates[route.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def redact(value, max_chars: int):
+    """Truncate long strings, mask secrets and collapse base64 blobs, recursing into containers"""
+    if isinstance(value, str):
+        value = BASE64_PATTERN.sub(lambda m: f"<base64 {len(m.group(0))} chars>", value)
+        value = SECRET_PATTERN.sub(r'\1***', value)
+        if len(value) > max_chars:
+            value = f"{value[:max_chars]}... <truncated {len(value) - max_chars} chars>"
+        return value
+    if isinstance(value, dict):
+        return {k: '<redacted>' if SENSITIVE_KEYS.search(str(k)) else redact(v, max_chars) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v, max_chars) for v in value[:50]]
+    return value
+
+
+class RouteSamplingFilter(logging.Filter):
+    def __init__(self, sample_rates: Dict[str, float]):
+        """Tag records with the current Flask route and sample DEBUG/INFO records per route"""
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        route = None
+        try:
+            from flask import has_request_context, request
+            if has_request_context():
+                route = request.url_rule.rule if request.url_rule else request.path
+        except Exception:
+            pass
+        record.route = route
+        if route is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.sample_rates.get(route)
+        return rate is None or random.random() < rate
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue, target: logging.Handler):
+        """Queue handler that never blocks the caller and restarts its listener after a fork"""
+        super().__init__(log_queue)
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._restart_after_fork = False
+
+    def start_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self._listener.start()
+        self._listener_pid = os.getpid()
+
+    def stop_listener(self):
+        """Flush queued records and stop the listener thread"""
+        if self._listener is not None and self._listener_pid == os.getpid():
+            try:
+                self._listener.stop()
+            except queue.Full:
+                # No room for the stop sentinel; the daemon thread dies with the process
+                pass
+            self._listener = None
+            self._listener_pid = None
+
+    def before_fork(self):
+        self._restart_after_fork = self._listener_pid == os.getpid()
+        self.stop_listener()
+
+    def after_fork_in_parent(self):
+        if self._restart_after_fork:
+            self.start_listener()
+
+    def after_fork_in_child(self):
+        # The inherited queue's mutex may have been held by another thread when we forked
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self._listener = None
+        self._listener_pid = None
+        self.dropped = 0
+        self.start_listener()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args here (cheap) and leave formatting/redaction to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._listener_pid != os.getpid():
+            self.start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_chars: int):
+        """One JSON object per line with extra= fields, redacted and truncated"""
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': redact(record.getMessage(), self.max_chars),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key in STANDARD_RECORD_ATTRS or key in entry or value is None:
+                continue
+            entry[key] = '<redacted>' if SENSITIVE_KEYS.search(key) else redact(value, self.max_chars)
+        if record.exc_info:
+            entry['exception'] = redact(self.formatException(record.exc_info), self.max_chars * 8)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RedactingTextFormatter(logging.Formatter):
+    def __init__(self, max_chars: int):
+        """Plain text format with the same redaction as the JSON formatter"""
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.msg = redact(record.getMessage(), self.max_chars)
+        record.args = None
+        return super().format(record)
+
+
+def configure_logging() -> AsyncQueueHandler:
+    """Install the async structured logging pipeline on the root logger"""
+    level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    max_chars = int(os.getenv("LOG_MAX_FIELD_CHARS", 1000))
+    log_format = os.getenv("LOG_FORMAT", "json").lower()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter(max_chars) if log_format == "json" else RedactingTextFormatter(max_chars))
+
+    handler = AsyncQueueHandler(queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000))), stream_handler)
+    handler.addFilter(RouteSamplingFilter(parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    if level > logging.DEBUG:
+        for name in NOISY_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    handler.start_listener()
+    atexit.register(handler.stop_listener)
+    os.register_at_fork(before=handler.before_fork, after_in_parent=handler.after_fork_in_parent,
+                        after_in_child=handler.after_fork_in_child)
+    return handler
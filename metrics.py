@@ -0,0 +1,331 @@
+"""Low-overhead in-process metrics with Prometheus text exposition
+
+Counters and histograms live in each process. Under gunicorn every worker
+has its own, so with METRICS_MULTIPROC_DIR set (gunicorn.conf.py sets it)
+each worker writes a snapshot to <dir>/<pid>.json every
+METRICS_FLUSH_SECONDS, on exit and when it is scraped, and /api/metrics
+serves the sum over all snapshots: whichever worker answers the scrape,
+counters keep growing. Snapshots of exited workers keep counting; their
+gauges are dropped (mark_process_dead). Gauges from collectors are per
+worker and carry a pid label. Without the directory the scrape reports the
+answering process only.
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache hits up to slow LLM/DALL-E calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _write_atomically(path: str, snapshot: Dict):
+    # Per-thread temp file: the flusher and a scrape may write the same snapshot at once
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temp_path, path)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], float]]) -> Dict[Tuple[str, ...], float]:
+        merged = {}
+        for values in snapshots:
+            for key, value in values.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def render(self, values: Dict[Tuple[str, ...], float] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        if values is None:
+            values = self.snapshot()
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {key: [list(s[0]), s[1], s[2]] for key, s in self._series.items()}
+
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], list]]) -> Dict[Tuple[str, ...], list]:
+        merged = {}
+        for series in snapshots:
+            for key, (counts, total, count) in series.items():
+                if len(counts) != len(self.buckets) + 1:
+                    continue
+                target = merged.setdefault(key, [[0] * len(counts), 0.0, 0])
+                target[0] = [a + b for a, b in zip(target[0], counts)]
+                target[1] += total
+                target[2] += count
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def render(self, series: Dict[Tuple[str, ...], list] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            series = self.snapshot()
+        for key, (counts, total, count) in series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, multiprocess_dir: str = None):
+        self._metrics = []
+        self._collectors = []
+        self._multiprocess_dir = multiprocess_dir
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, str, str, Dict, float]]]):
+        """Register a callback returning (name, type, help, labels, value) samples at scrape time"""
+        self._collectors.append(collector)
+
+    @property
+    def multiprocess_dir(self) -> Optional[str]:
+        return self._multiprocess_dir or os.getenv('METRICS_MULTIPROC_DIR') or None
+
+    def collect(self) -> List[Tuple[str, str, str, Dict, float]]:
+        samples = []
+        for collector in self._collectors:
+            samples.extend(collector())
+        return samples
+
+    def write_snapshot(self, pid: int = None):
+        """Write this process's metrics to the multiprocess directory, if one is configured"""
+        directory = self.multiprocess_dir
+        if not directory:
+            return
+        pid = os.getpid() if pid is None else pid
+        snapshot = {
+            'metrics': {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+                        for metric in self._metrics},
+            'collected': [[name, metric_type, documentation, labels, value]
+                          for name, metric_type, documentation, labels, value in self.collect()]
+        }
+        os.makedirs(directory, exist_ok=True)
+        _write_atomically(os.path.join(directory, f"{pid}.json"), snapshot)
+
+    def read_snapshots(self) -> Dict[str, Dict]:
+        """Snapshots in the multiprocess directory by pid"""
+        snapshots = {}
+        directory = self.multiprocess_dir
+        for name in sorted(os.listdir(directory)) if directory and os.path.isdir(directory) else ():
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshots[name[:-len('.json')]] = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics snapshot {name}: {str(e)}")
+        return snapshots
+
+    def mark_process_dead(self, pid: int):
+        """Drop the gauges of an exited worker; its counters and histograms keep counting"""
+        directory = self.multiprocess_dir
+        path = os.path.join(directory, f"{pid}.json") if directory else None
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        snapshot['collected'] = [sample for sample in snapshot.get('collected', []) if sample[1] == 'counter']
+        _write_atomically(path, snapshot)
+
+    def clear_multiprocess_dir(self):
+        """Remove snapshots left by a previous run; call in the gunicorn master before forking"""
+        directory = self.multiprocess_dir
+        if not directory or not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.endswith(('.json', '.tmp')):
+                os.remove(os.path.join(directory, name))
+
+    def reset(self):
+        """Forget values inherited from the master, which reports its own snapshot"""
+        for metric in self._metrics:
+            metric.reset()
+
+    def start_flusher(self, interval: float = None) -> Optional[threading.Thread]:
+        """Write this process's snapshot every interval seconds from a daemon thread"""
+        if not self.multiprocess_dir:
+            return None
+        interval = float(os.getenv('METRICS_FLUSH_SECONDS', 5)) if interval is None else interval
+
+        def flush():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot()
+                except Exception as e:
+                    logger.warning(f"Error writing metrics snapshot: {str(e)}")
+
+        flusher = threading.Thread(target=flush, name="metrics-flusher", daemon=True)
+        flusher.start()
+        return flusher
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text exposition format"""
+        if not self.multiprocess_dir:
+            return self._render_lines(
+                [(metric, metric.snapshot()) for metric in self._metrics], self.collect())
+
+        self.write_snapshot()
+        snapshots = self.read_snapshots()
+        merged = []
+        for metric in self._metrics:
+            per_process = [{tuple(key): value for key, value in snapshot.get('metrics', {}).get(metric.name, [])}
+                           for snapshot in snapshots.values()]
+            merged.append((metric, metric.merge(per_process)))
+        samples = []
+        counters = {}
+        for pid, snapshot in snapshots.items():
+            for name, metric_type, documentation, labels, value in snapshot.get('collected', []):
+                if metric_type == 'counter':
+                    key = (name, tuple(sorted(labels.items())))
+                    if key not in counters:
+                        counters[key] = [name, metric_type, documentation, labels, 0]
+                        samples.append(counters[key])
+                    counters[key][4] += value
+                else:
+                    samples.append((name, metric_type, documentation, {**labels, 'pid': pid}, value))
+        return self._render_lines(merged, samples)
+
+    def _render_lines(self, metrics: List[Tuple], samples: List) -> str:
+        lines = []
+        for metric, values in metrics:
+            lines.extend(metric.render(values))
+        # Samples of one family must be contiguous, whichever process or collector they came from
+        families = {}
+        for sample in samples:
+            families.setdefault(sample[0], []).append(sample)
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {family[0][2]}")
+            lines.append(f"# TYPE {name} {family[0][1]}")
+            for _, metric_type, documentation, labels, value in family:
+                labelnames = tuple(labels)
+                lines.append(f"{name}{_format_labels(labelnames, tuple(labels[n] for n in labelnames))} "
+                             f"{_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    'goldgpt_stage_duration_seconds', 'Latency of chat pipeline and upstream stages', ('stage',))
+STAGE_ERRORS = registry.counter(
+    'goldgpt_upstream_errors_total', 'Errors by upstream dependency', ('upstream',))
+HTTP_DURATION = registry.histogram(
+    'goldgpt_http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method', 'status'))
+OPENAI_TOKENS = registry.counter(
+    'goldgpt_openai_tokens_total', 'OpenAI tokens used by model and kind', ('model', 'kind'))
+ADMISSION_REJECTIONS = registry.counter(
+    'goldgpt_admission_rejections_total', 'Requests shed by admission control', ('pool', 'reason'))
+DEADLINE_EXCEEDED = registry.counter(
+    'goldgpt_deadline_exceeded_total', 'Upstream calls skipped because the request deadline ran out', ('stage',))
+HEDGED_COMPLETIONS = registry.counter(
+    'goldgpt_openai_hedged_completions_total', 'Hedged chat completions by model and outcome', ('model', 'outcome'))
+
+
+@contextmanager
+def timed(stage: str, upstream: str = None):
+    """Time a stage into goldgpt_stage_duration_seconds, counting exceptions against upstream"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if upstream:
+            STAGE_ERRORS.inc(upstream=upstream)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_error(upstream: str):
+    """Count an upstream error that was handled without raising"""
+    STAGE_ERRORS.inc(upstream=upstream)
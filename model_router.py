@@ -0,0 +1,385 @@
+"""Latency-aware model tiering for GoldGPT chat completions"""
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from deadline import Deadline, upstream_timeout
+from metrics import HEDGED_COMPLETIONS, OPENAI_TOKENS, timed
+from startup import lazy_import, memoized_property
+
+openai = lazy_import('openai')
+
+logger = logging.getLogger(__name__)
+
+
+# Model tiers, cheapest/fastest first. Costs are USD per 1K tokens and are only
+# used for reporting, so they can be tuned without touching the routing policy.
+DEFAULT_TIERS = {
+    "fast": {
+        "model": os.getenv("GOLDGPT_FAST_MODEL", "gpt-4o-mini"),
+        "max_tokens": 500,
+        "timeout": float(os.getenv("GOLDGPT_FAST_TIMEOUT", 10)),
+        "fallback": "balanced",
+        "cost_per_1k_input": 0.00015,
+        "cost_per_1k_output": 0.0006
+    },
+    "balanced": {
+        "model": os.getenv("GOLDGPT_BALANCED_MODEL", "gpt-4o"),
+        "max_tokens": 1200,
+        "timeout": float(os.getenv("GOLDGPT_BALANCED_TIMEOUT", 20)),
+        "fallback": "fast",
+        "cost_per_1k_input": 0.0025,
+        "cost_per_1k_output": 0.01
+    },
+    "standard": {
+        "model": os.getenv("GOLDGPT_STANDARD_MODEL", "gpt-4"),
+        "max_tokens": 2000,
+        "timeout": float(os.getenv("GOLDGPT_STANDARD_TIMEOUT", 45)),
+        "fallback": "balanced",
+        "cost_per_1k_input": 0.03,
+        "cost_per_1k_output": 0.06
+    }
+}
+
+# Intent -> (tier, max_tokens cap)
+INTENT_POLICY = {
+    "greeting": ("fast", 150),
+    "price_lookup": ("fast", 400),
+    "product_lookup": ("fast", 500),
+    "general": ("balanced", 1200),
+    "analysis": ("standard", 2000)
+}
+
+GREETING_PATTERN = re.compile(
+    r'^\s*(hi|hello|hey|good (morning|evening|afternoon)|thanks|thank you|bye|'
+    r'مرحبا|اهلا|أهلا|السلام عليكم|صباح الخير|مساء الخير|شكرا|مع السلامة)\b',
+    re.IGNORECASE
+)
+PRICE_KEYWORDS = ['price', 'rate', 'how much', 'cost', 'today', 'سعر', 'اسعار', 'أسعار', 'كم']
+PRODUCT_KEYWORDS = ['product', 'available', 'stock', 'buy', 'purchase', 'منتج', 'متوفر', 'شراء']
+ANALYSIS_KEYWORDS = [
+    'analysis', 'analyze', 'analyse', 'strategy', 'compare', 'comparison', 'forecast', 'predict',
+    'portfolio', 'explain', 'why', 'history', 'historical', 'should i', 'recommend', 'invest',
+    'تحليل', 'استراتيجية', 'مقارنة', 'توقع', 'استثمار', 'اشرح', 'لماذا', 'تاريخ', 'انصح'
+]
+
+
+# Arabic attaches conjunctions, prepositions, the article and possessive pronouns
+# to the word ("وبالسعر", "سعره"), so Arabic keywords may carry those affixes;
+# English keywords may only take a plural or past-tense ending
+ARABIC_LETTERS = re.compile('[\u0600-\u06ff]')
+ARABIC_PREFIX = '(?:[وف]?(?:[بكل]?ال|لل|[بكل]))?'
+ARABIC_SUFFIX = '(?:ها|هم|ه|كم|ك|نا|ي|ات|ة)?'
+ENGLISH_SUFFIX = '(?:s|es|d|ed)?'
+
+
+def keyword_pattern(keywords: List[str]) -> re.Pattern:
+    """Compile a keyword list into one alternation matching whole words only"""
+    alternatives = []
+    for keyword in keywords:
+        if ARABIC_LETTERS.search(keyword):
+            alternatives.append(f"{ARABIC_PREFIX}{re.escape(keyword)}{ARABIC_SUFFIX}")
+        else:
+            alternatives.append(f"{re.escape(keyword)}{ENGLISH_SUFFIX}")
+    return re.compile(r'(?<!\w)(?:' + '|'.join(alternatives) + r')(?!\w)')
+
+
+# Compiled once at import so preloaded gunicorn workers share them
+PRICE_PATTERN = keyword_pattern(PRICE_KEYWORDS)
+PRODUCT_PATTERN = keyword_pattern(PRODUCT_KEYWORDS)
+ANALYSIS_PATTERN = keyword_pattern(ANALYSIS_KEYWORDS)
+
+LATENCY_SAMPLE_SIZE = 500
+
+# Hedging: when a completion is still running after the tier's observed p95,
+# send the same request again and keep whichever answers first. Off by default
+# since every hedge is a second paid request.
+HEDGE_ENABLED = os.getenv("GOLDGPT_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("GOLDGPT_HEDGE_PERCENTILE", 95))
+HEDGE_MIN_SAMPLES = int(os.getenv("GOLDGPT_HEDGE_MIN_SAMPLES", 20))
+HEDGE_MIN_DELAY = float(os.getenv("GOLDGPT_HEDGE_MIN_DELAY", 0.5))
+HEDGE_MAX_RATIO = float(os.getenv("GOLDGPT_HEDGE_MAX_RATIO", 0.1))
+
+
+class EventLoopThread:
+    def __init__(self, name: str = "openai-hedging"):
+        """Private asyncio loop on a daemon thread, so sync callers can race cancellable requests"""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout: float):
+        """Run a coroutine on the loop and wait for it
+
+        Raises concurrent.futures.TimeoutError (not an openai error) when the
+        wait times out; the task is cancelled either way.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+
+class ModelRouter:
+    def __init__(self, tiers: Dict = None, hedge_enabled: bool = HEDGE_ENABLED):
+        """Initialize router with tier configuration and empty statistics"""
+        self.tiers = tiers or DEFAULT_TIERS
+        self.hedge_enabled = hedge_enabled
+        self._lock = threading.Lock()
+        self._stats = {name: self._empty_stats() for name in self.tiers}
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {
+            "requests": 0,
+            "successes": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "fallbacks_in": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "latency_total": 0.0,
+            "latency_count": 0,
+            "latencies": deque(maxlen=LATENCY_SAMPLE_SIZE),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cost_usd": 0.0
+        }
+
+    def classify(self, user_message: str) -> str:
+        """Classify a chat message into an intent used for tier selection"""
+        message_lower = user_message.lower().strip()
+        word_count = len(message_lower.split())
+
+        if ANALYSIS_PATTERN.search(message_lower) or word_count > 40:
+            return "analysis"
+        asks_price = PRICE_PATTERN.search(message_lower)
+        asks_product = PRODUCT_PATTERN.search(message_lower)
+        # "hi, what's the gold price?" is a price question that opens with a greeting
+        if GREETING_PATTERN.match(message_lower) and word_count <= 6 and not (asks_price or asks_product):
+            return "greeting"
+        if asks_price and word_count <= 15:
+            return "price_lookup"
+        if asks_product and word_count <= 15:
+            return "product_lookup"
+        return "general"
+
+    def route(self, user_message: str) -> Dict:
+        """Pick a tier, model and token cap for a chat message"""
+        intent = self.classify(user_message)
+        tier_name, max_tokens = INTENT_POLICY[intent]
+        tier = self.tiers[tier_name]
+        return {
+            "intent": intent,
+            "tier": tier_name,
+            "model": tier["model"],
+            "max_tokens": min(max_tokens, tier["max_tokens"]),
+            "timeout": tier["timeout"]
+        }
+
+    @memoized_property
+    def hedge_loop(self) -> EventLoopThread:
+        """Event loop for hedged completions (per worker: threads don't survive a fork)"""
+        return EventLoopThread()
+
+    def hedge_delay(self, tier_name: str) -> Optional[float]:
+        """Seconds to wait before hedging on this tier, or None while hedging isn't allowed"""
+        with self._lock:
+            stats = self._stats[tier_name]
+            samples = len(stats["latencies"])
+            over_budget = stats["hedges"] >= HEDGE_MAX_RATIO * stats["requests"]
+        if samples < HEDGE_MIN_SAMPLES or over_budget:
+            return None
+        return max(HEDGE_MIN_DELAY, self.latency_percentile(tier_name, HEDGE_PERCENTILE))
+
+    def complete(self, client, messages: List[Dict], decision: Dict, temperature: float = 0.5,
+                 deadline: Optional[Deadline] = None, hedge_client=None):
+        """Run a chat completion on the routed tier, falling back to another tier on timeout
+
+        Each attempt's timeout is the tier timeout cut down to what is left of
+        the deadline. With hedging enabled and an async client given, a slow
+        attempt is hedged after the tier's p95 latency and the loser cancelled.
+        """
+        attempts = [decision["tier"]]
+        fallback = self.tiers[decision["tier"]].get("fallback")
+        if fallback and fallback in self.tiers and fallback != decision["tier"]:
+            attempts.append(fallback)
+
+        last_error = None
+        for index, tier_name in enumerate(attempts):
+            tier = self.tiers[tier_name]
+            max_tokens = decision["max_tokens"] if index == 0 else min(decision["max_tokens"], tier["max_tokens"])
+            if index > 0:
+                self._record(tier_name, fallback_in=True)
+                logger.warning(f"Falling back from tier '{attempts[index - 1]}' to '{tier_name}'")
+
+            timeout = upstream_timeout(tier["timeout"], 'openai_completion', deadline)
+            request = {
+                "model": tier["model"],
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+            hedge_delay = self.hedge_delay(tier_name) if self.hedge_enabled and hedge_client is not None else None
+
+            start = time.perf_counter()
+            try:
+                with timed('openai_completion', upstream='openai'):
+                    if hedge_delay is not None and hedge_delay < timeout:
+                        response = self.hedge_loop.run(
+                            self._hedged_create(hedge_client, tier_name, request, timeout, hedge_delay),
+                            timeout + 1.0
+                        )
+                    else:
+                        response = client.with_options(timeout=timeout, max_retries=0).chat.completions.create(
+                            **request)
+            except (openai.APITimeoutError, concurrent.futures.TimeoutError) as e:
+                # The latter comes from the hedge loop giving up on its own. The elapsed time is
+                # only the cutoff, so it stays out of the latency samples behind p95 and the hedge delay
+                self._record(tier_name, outcome="timeouts")
+                logger.warning(f"Tier '{tier_name}' ({tier['model']}) timed out after {timeout:.1f}s")
+                last_error = e
+                continue
+            except Exception:
+                self._record(tier_name, latency=time.perf_counter() - start, outcome="errors")
+                raise
+
+            self._record(tier_name, latency=time.perf_counter() - start, outcome="successes",
+                         usage=getattr(response, "usage", None))
+            return response
+
+        raise last_error
+
+    async def _hedged_create(self, client, tier_name: str, request: Dict, timeout: float, hedge_delay: float):
+        """Send the request, send it again after hedge_delay, return the first success and cancel the other"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        primary = asyncio.ensure_future(
+            client.with_options(timeout=timeout, max_retries=0).chat.completions.create(**request))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        model = request["model"]
+        self._record(tier_name, hedged=True)
+        HEDGED_COMPLETIONS.inc(model=model, outcome='sent')
+        logger.info(f"Hedging tier '{tier_name}' ({model}) after {hedge_delay:.2f}s")
+        hedge = asyncio.ensure_future(
+            client.with_options(timeout=max(0.1, timeout - (loop.time() - started)), max_retries=0)
+            .chat.completions.create(**request))
+
+        pending = {primary, hedge}
+        winner, error = None, None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+        finally:
+            # Cancelling closes the loser's connection, so the upstream stops generating
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is None:
+            raise error
+        HEDGED_COMPLETIONS.inc(model=model, outcome='won' if winner is hedge else 'lost')
+        if winner is hedge:
+            self._record(tier_name, hedge_won=True)
+        # complete() records the winner's usage; the other attempt was paid for too
+        loser = primary if winner is hedge else hedge
+        self._record(tier_name, usage=self._attempt_usage(loser, winner.result()))
+        return winner.result()
+
+    @staticmethod
+    def _attempt_usage(attempt: asyncio.Future, winning_response):
+        """Usage of a losing hedge attempt: its own if it finished, else the winner's prompt tokens"""
+        if not attempt.cancelled() and attempt.exception() is None:
+            return getattr(attempt.result(), "usage", None)
+        # Cancelled or failed mid-generation: the prompt was sent (and billed), output unknown
+        usage = getattr(winning_response, "usage", None)
+        if usage is None:
+            return None
+        return SimpleNamespace(prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0, completion_tokens=0)
+
+    def _record(self, tier_name: str, latency: float = None, outcome: str = None,
+                usage=None, fallback_in: bool = False, hedged: bool = False, hedge_won: bool = False):
+        """Record latency, outcome, hedging and token cost for a tier"""
+        tier = self.tiers[tier_name]
+        with self._lock:
+            stats = self._stats[tier_name]
+            if fallback_in:
+                stats["fallbacks_in"] += 1
+            if hedged:
+                stats["hedges"] += 1
+            if hedge_won:
+                stats["hedge_wins"] += 1
+            if outcome:
+                stats["requests"] += 1
+                stats[outcome] += 1
+            if latency is not None:
+                stats["latency_total"] += latency
+                stats["latency_count"] += 1
+                stats["latencies"].append(latency)
+            if usage is not None:
+                prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+                completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+                stats["prompt_tokens"] += prompt_tokens
+                stats["completion_tokens"] += completion_tokens
+                stats["cost_usd"] += (prompt_tokens / 1000 * tier["cost_per_1k_input"] +
+                                      completion_tokens / 1000 * tier["cost_per_1k_output"])
+        if usage is not None:
+            OPENAI_TOKENS.inc(prompt_tokens, model=tier["model"], kind='prompt')
+            OPENAI_TOKENS.inc(completion_tokens, model=tier["model"], kind='completion')
+
+    def latency_percentile(self, tier_name: str, percentile: float) -> Optional[float]:
+        """Return the given latency percentile (seconds) for a tier, or None without samples"""
+        with self._lock:
+            samples = sorted(self._stats[tier_name]["latencies"])
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def stats(self) -> Dict:
+        """Get per-tier latency and cost statistics"""
+        result = {}
+        for tier_name, tier in self.tiers.items():
+            with self._lock:
+                stats = dict(self._stats[tier_name])
+                stats.pop("latencies")
+            requests_count = stats["requests"]
+            result[tier_name] = {
+                "model": tier["model"],
+                "requests": requests_count,
+                "successes": stats["successes"],
+                "timeouts": stats["timeouts"],
+                "errors": stats["errors"],
+                "fallbacks_in": stats["fallbacks_in"],
+                "hedges": stats["hedges"],
+                "hedge_wins": stats["hedge_wins"],
+                "avg_latency_ms": (round(stats["latency_total"] / stats["latency_count"] * 1000, 1)
+                                   if stats["latency_count"] else None),
+                "p50_latency_ms": self._ms(self.latency_percentile(tier_name, 50)),
+                "p95_latency_ms": self._ms(self.latency_percentile(tier_name, 95)),
+                "prompt_tokens": stats["prompt_tokens"],
+                "completion_tokens": stats["completion_tokens"],
+                "cost_usd": round(stats["cost_usd"], 6)
+            }
+        return result
+
+    @staticmethod
+    def _ms(seconds: Optional[float]) -> Optional[float]:
+        return round(seconds * 1000, 1) if seconds is not None else None
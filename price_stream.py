@@ -0,0 +1,182 @@
+"""Server-push price ticker: one upstream poll loop per process fanned out to SSE subscribers"""
+import os
+import uuid
+import queue
+import logging
+import threading
+from typing import Callable, Dict, Iterator, Optional
+
+from cache_backend import CacheBackend, MemoryCache
+from json_provider import RawJSON, dumps
+
+logger = logging.getLogger(__name__)
+
+
+# Fields that change on every poll and should not count as a quote change
+VOLATILE_FIELDS = ('timestamp',)
+
+
+def strip_volatile(value):
+    """Drop fields that change on every poll so quotes can be compared"""
+    if isinstance(value, dict):
+        return {k: strip_volatile(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    return value
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        """Bounded event queue for one connected client"""
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflows = 0
+        self.closed = False
+
+
+class PriceBroadcaster:
+    def __init__(self, fetch_snapshot: Callable[[], Dict], cache: CacheBackend = None, poll_seconds: float = None,
+                 heartbeat_seconds: float = None, queue_size: int = None, max_overflows: int = None):
+        """Initialize broadcaster around a function returning the full price snapshot"""
+        self.fetch_snapshot = fetch_snapshot
+        self.cache = cache or MemoryCache()
+        self.poll_seconds = poll_seconds if poll_seconds is not None else float(os.getenv("PRICE_STREAM_POLL_SECONDS", 10))
+        self.heartbeat_seconds = heartbeat_seconds if heartbeat_seconds is not None else float(os.getenv("PRICE_STREAM_HEARTBEAT_SECONDS", 15))
+        self.queue_size = queue_size or int(os.getenv("PRICE_STREAM_QUEUE_SIZE", 16))
+        self.max_overflows = max_overflows or int(os.getenv("PRICE_STREAM_MAX_OVERFLOWS", 5))
+
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._producer = None
+        self._stop = threading.Event()
+        self._snapshot = None
+        self._published = {}
+
+    def _fetch_versioned(self) -> Optional[Dict]:
+        snapshot = self.fetch_snapshot()
+        if snapshot is None:
+            return None
+        return {'version': uuid.uuid4().hex, 'quotes': snapshot}
+
+    def _current(self) -> Optional[Dict]:
+        """Latest {'version', 'quotes'} entry; only one caller (across workers with a shared cache) fetches per interval"""
+        entry = self.cache.get_or_compute("prices:snapshot:versioned", self._fetch_versioned, self.poll_seconds)
+        if entry is not None:
+            self._snapshot = entry['quotes']
+        return entry
+
+    def snapshot(self) -> Optional[Dict]:
+        """Get the latest snapshot"""
+        entry = self._current()
+        return entry['quotes'] if entry is not None else None
+
+    def snapshot_json(self) -> Optional[RawJSON]:
+        """Get the latest snapshot pre-serialized, so it is encoded once per snapshot instead of per request"""
+        entry = self._current()
+        if entry is None:
+            return None
+        # Keyed by the snapshot's version, so the body is replaced as soon as the snapshot is
+        return self.cache.get_or_compute(f"prices:snapshot:json:{entry['version']}",
+                                         lambda: RawJSON(dumps(entry['quotes'])), self.poll_seconds)
+
+    def subscribe(self) -> Subscriber:
+        """Register a client and make sure the producer loop is running"""
+        subscriber = Subscriber(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self._stop.clear()
+            if self._producer is None:
+                self._producer = threading.Thread(target=self._run, name="price-stream-producer", daemon=True)
+                self._producer.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Remove a client; the producer stops once nobody is listening"""
+        subscriber.closed = True
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._stop.set()
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _run(self):
+        """Producer loop: poll upstream once per interval and publish changed quotes"""
+        logger.info("Price stream producer started")
+        while True:
+            while not self._stop.is_set():
+                try:
+                    self._poll()
+                except Exception as e:
+                    logger.error(f"Error in price stream producer: {str(e)}")
+                self._stop.wait(self.poll_seconds)
+            with self._lock:
+                # A client may have subscribed while the loop was stopping
+                if self._subscribers:
+                    self._stop.clear()
+                    continue
+                self._producer = None
+                self._published = {}
+                break
+        logger.info("Price stream producer stopped")
+
+    def _poll(self):
+        """Fetch one snapshot and publish only the quotes that changed"""
+        snapshot = self.snapshot()
+        changes = {}
+        for key, value in (snapshot or {}).items():
+            comparable = strip_volatile(value)
+            if self._published.get(key) != comparable:
+                self._published[key] = comparable
+                changes[key] = value
+        if changes:
+            self.publish({'type': 'quotes', 'data': changes})
+
+    def publish(self, event: Dict):
+        """Fan an event out to every subscriber without blocking on slow clients"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                self._handle_overflow(subscriber)
+
+    def _handle_overflow(self, subscriber: Subscriber):
+        """Collapse a slow client's backlog into one snapshot, or drop the client"""
+        subscriber.overflows += 1
+        self._drain(subscriber)
+        if subscriber.overflows > self.max_overflows:
+            logger.warning("Disconnecting slow price stream subscriber")
+            self.unsubscribe(subscriber)
+            subscriber.queue.put_nowait(None)
+            return
+        subscriber.queue.put_nowait({'type': 'snapshot', 'data': self._snapshot or {}})
+
+    @staticmethod
+    def _drain(subscriber: Subscriber):
+        try:
+            while True:
+                subscriber.queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def stream(self) -> Iterator[str]:
+        """Server-sent events for one client: a full snapshot, then changed quotes and heartbeats"""
+        subscriber = self.subscribe()
+        try:
+            yield self.format_event({'type': 'snapshot', 'data': self.snapshot() or {}})
+            while not subscriber.closed:
+                try:
+                    event = subscriber.queue.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None:
+                    break
+                yield self.format_event(event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    @staticmethod
+    def format_event(event: Dict) -> str:
+        return f"event: {event['type']}\ndata: {dumps(event['data'])}\n\n"
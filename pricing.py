@@ -0,0 +1,289 @@
+"""Live KWD karat pricing engine with vectorized catalog repricing"""
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from deadline import detached
+from json_provider import RawJSON, dumps_bytes
+from startup import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+
+TROY_OUNCE_GRAMS = 31.1034768
+KARATS = (24, 22, 21, 18)
+
+UNIT_GRAMS = {
+    'kg': 1000.0,
+    'kilo': 1000.0,
+    'g': 1.0,
+    'gm': 1.0,
+    'gram': 1.0,
+    'grams': 1.0,
+    'oz': TROY_OUNCE_GRAMS,
+    'ounce': TROY_OUNCE_GRAMS,
+    'tola': 11.6638038
+}
+
+# "0.25 kg", "1 Kg", "10 gram", "31.10 GRAM", "PAMP10 Tola", "1/2 oz"
+WEIGHT_PATTERN = r'(?P<amount>\d+(?:\.\d+)?(?:/\d+)?)\s*(?P<unit>kg|kilo|grams?|gm|g|oz|ounce|tola)\b'
+# "Purity 999.9", "999 Purity", "22 Karat", "24K"
+FINENESS_PATTERN = r'\b(?P<fineness>999\.9|999|995|916|875|750)\b'
+KARAT_PATTERN = r'\b(?P<karat>24|22|21|18)\s*(?:k|kt|karat)\b'
+
+# Coins sold by name rather than weight, gross grams per coin: "1/2 Lera 22 Karat",
+# "8 Georgian coin 22 Karat" (Georgian coins are counted in nominal grams, 8 = a sovereign)
+COIN_GRAMS = {
+    'lera': 7.216,
+    'lira': 7.216,
+    'mukammas': 36.08,
+    'sovereign': 7.988,
+    'georgian': 7.988 / 8
+}
+COIN_PATTERN = r'(?:(?P<amount>\d+(?:/\d+)?)\s*)?(?P<coin>lera|lira|mukammas|sovereign|georgian)\b'
+
+# Unpriced product names listed in the startup warning
+UNPRICED_LOG_LIMIT = 25
+
+# Bullion with a weight but no stated purity is assumed to be fine gold
+DEFAULT_PURITY = 0.9999
+
+
+def parse_amount(amount: 'pd.Series') -> 'pd.Series':
+    """Parse "2", "0.25" or "1/2" amounts; NaN where there is none"""
+    fraction = amount.fillna('').str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+    numerator = pd.to_numeric(fraction[0], errors='coerce')
+    denominator = pd.to_numeric(fraction[1], errors='coerce').fillna(1.0)
+    return numerator / denominator
+
+
+def parse_catalog_metal_content(product_names: 'pd.Series') -> 'pd.DataFrame':
+    """Parse weight in grams and gold purity from catalog product names"""
+    names = product_names.fillna('').astype(str)
+
+    weight = names.str.extract(WEIGHT_PATTERN, flags=re.IGNORECASE)
+    weight_grams = parse_amount(weight['amount']) * weight['unit'].str.lower().map(UNIT_GRAMS)
+    coin = names.str.extract(COIN_PATTERN, flags=re.IGNORECASE)
+    coin_grams = parse_amount(coin['amount']).fillna(1.0) * coin['coin'].str.lower().map(COIN_GRAMS)
+    weight_grams = weight_grams.fillna(coin_grams)
+
+    fineness = pd.to_numeric(names.str.extract(FINENESS_PATTERN)['fineness'], errors='coerce') / 1000
+    karat = pd.to_numeric(names.str.extract(KARAT_PATTERN, flags=re.IGNORECASE)['karat'], errors='coerce') / 24
+    purity = fineness.fillna(karat)
+    purity = purity.where(purity.notna() | weight_grams.isna(), DEFAULT_PURITY)
+
+    return pd.DataFrame({
+        'weight_grams': weight_grams.astype(float),
+        'purity': purity.astype(float)
+    }, index=product_names.index)
+
+
+class KaratPricingEngine:
+    def __init__(self, catalog: 'pd.DataFrame', spot_provider: Callable[[], Optional[float]],
+                 fx_provider: Callable[[], Optional[float]], tick_seconds: float = None):
+        """Initialize engine from the product catalog and market data providers
+
+        spot_provider returns the gold spot price in USD/oz and fx_provider the
+        USD->KWD rate; either may return None when the upstream is unavailable.
+        """
+        self.spot_provider = spot_provider
+        self.fx_provider = fx_provider
+        self.tick_seconds = tick_seconds if tick_seconds is not None else float(os.getenv("PRICE_TICK_SECONDS", 60))
+        self.fallback_usd_kwd = float(os.getenv("USD_KWD_RATE", 0.3075))
+        # After a failed tick, retry after this many seconds, doubling up to tick_seconds
+        self.retry_seconds = float(os.getenv("PRICE_RETRY_SECONDS", 5))
+
+        self._refresh_lock = threading.Lock()
+        self._table = None
+        self._next_refresh = 0.0
+        self._failures = 0
+        self.load_catalog(catalog)
+
+    def load_catalog(self, catalog: 'pd.DataFrame'):
+        """Parse metal content and extract the static catalog columns once
+
+        The catalog stays columnar: each tick reprices it with array
+        arithmetic, and its JSON is assembled from fragments of the static
+        fields encoded here plus the tick's prices, without building a dict
+        per product on every tick.
+        """
+        if catalog is None or catalog.empty:
+            catalog = pd.DataFrame(columns=['Product Name', 'Model', 'Price', 'Quantity'])
+
+        content = parse_catalog_metal_content(catalog['Product Name'])
+        weights = content['weight_grams'].to_numpy(dtype=float)
+        purities = content['purity'].to_numpy(dtype=float)
+
+        # CSV prices are the per-piece premium (making charge) over metal value
+        self._premiums = pd.to_numeric(catalog['Price'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+        self._grams_fine = weights * purities
+        self._priced = ~np.isnan(weights)
+        self._static = pd.DataFrame({
+            'product_name': catalog['Product Name'].to_numpy(dtype=object),
+            'model': catalog['Model'].to_numpy(dtype=object),
+            'price': self._premiums,
+            'quantity': pd.to_numeric(catalog['Quantity'], errors='coerce').fillna(0).astype(int).to_numpy(),
+            'weight_grams': np.round(weights, 4),
+            'purity': np.round(purities, 4)
+        })
+        self._static_records = [
+            {'product_name': name, 'model': model, 'price': premium, 'quantity': quantity,
+             'weight_grams': weight, 'purity': purity}
+            for name, model, premium, quantity, weight, purity in zip(
+                self._static['product_name'].tolist(), self._static['model'].tolist(),
+                self._static['price'].tolist(), self._static['quantity'].tolist(),
+                _nullable(self._static['weight_grams'].to_numpy()), _nullable(self._static['purity'].to_numpy()))
+        ]
+        # The body is joined from five parts per product; the static record
+        # and the separators are encoded here, the two prices on each tick:
+        # '{"product_name":...,"metal_value_kwd":', metal, ',"live_price_kwd":', live, '},'
+        parts = [b''] * (5 * len(self._static_records))
+        parts[0::5] = [dumps_bytes(record)[:-1] + b',"metal_value_kwd":' for record in self._static_records]
+        parts[2::5] = [b',"live_price_kwd":'] * len(self._static_records)
+        parts[4::5] = [b'},'] * len(self._static_records)
+        if parts:
+            parts[-1] = b'}'
+        self._body_parts = parts
+        no_prices = np.full(len(self._static_records), np.nan)
+        self._base = self._priced_catalog(no_prices, no_prices)
+
+        logger.info(f"Pricing engine parsed metal content for {int(np.count_nonzero(self._priced))}"
+                    f"/{len(self._static)} catalog products")
+        unpriced = self._static['product_name'][~self._priced].tolist()
+        if unpriced:
+            shown = ', '.join(repr(name) for name in unpriced[:UNPRICED_LOG_LIMIT])
+            more = f" and {len(unpriced) - UNPRICED_LOG_LIMIT} more" if len(unpriced) > UNPRICED_LOG_LIMIT else ''
+            logger.warning(f"{len(unpriced)} catalog products have no weight in their name and are listed "
+                           f"without a live price: {shown}{more}")
+
+    def _priced_catalog(self, metal_values: 'np.ndarray', live_prices: 'np.ndarray') -> Dict:
+        """Prices for one tick, with the /api/products body serialized once"""
+        count = len(metal_values)
+        numbers = _json_numbers(np.concatenate([metal_values, live_prices]))
+        parts = self._body_parts.copy()
+        parts[1::5] = numbers[:count]
+        parts[3::5] = numbers[count:]
+        return {
+            'metal_value_kwd': metal_values,
+            'live_price_kwd': live_prices,
+            'products': None,
+            'json': RawJSON(b'{"products":[' + b''.join(parts) + b']}')
+        }
+
+    def on_tick(self, spot_usd_oz: float, usd_kwd: float) -> Dict:
+        """Reprice karat quotes and the whole catalog for a new market tick"""
+        fine_gram_kwd = spot_usd_oz / TROY_OUNCE_GRAMS * usd_kwd
+
+        karat_prices = {f"{karat}k_kwd": round(fine_gram_kwd * karat / 24, 3) for karat in KARATS}
+
+        metal_values = self._grams_fine * fine_gram_kwd
+        live_prices = np.round(metal_values + self._premiums, 3)
+        metal_values = np.round(metal_values, 3)
+
+        table = {
+            'kuwait': {
+                "success": True,
+                **karat_prices,
+                "currency": "KWD",
+                "spot_usd_oz": round(spot_usd_oz, 2),
+                "usd_kwd": round(usd_kwd, 5),
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            },
+            'catalog': self._priced_catalog(metal_values, live_prices)
+        }
+        self._table = table
+        self._failures = 0
+        self._next_refresh = time.monotonic() + self.tick_seconds
+        return table
+
+    def refresh(self) -> bool:
+        """Fetch spot and FX rates and reprice; keeps the previous table on failure"""
+        spot = self.spot_provider()
+        if not spot:
+            logger.warning("Pricing engine tick skipped: gold spot price unavailable")
+            return False
+        usd_kwd = self.fx_provider() or self.fallback_usd_kwd
+        self.on_tick(float(spot), float(usd_kwd))
+        return True
+
+    def table(self) -> Optional[Dict]:
+        """Get the precomputed quote table, repricing if the last tick is stale
+
+        Only one thread reprices at a time; concurrent readers keep serving the
+        previous table until the new one is swapped in. The refresh runs outside
+        the calling request's deadline, since every reader shares its result.
+        """
+        if time.monotonic() >= self._next_refresh:
+            blocking = self._table is None
+            if self._refresh_lock.acquire(blocking=blocking):
+                try:
+                    if time.monotonic() >= self._next_refresh:
+                        self._refresh_or_back_off()
+                finally:
+                    self._refresh_lock.release()
+        return self._table
+
+    def _refresh_or_back_off(self):
+        try:
+            with detached():
+                refreshed = self.refresh()
+        except Exception as e:
+            logger.error(f"Error repricing catalog: {str(e)}")
+            refreshed = False
+        if not refreshed:
+            self._failures += 1
+            backoff = min(self.tick_seconds, self.retry_seconds * 2 ** (self._failures - 1))
+            self._next_refresh = time.monotonic() + backoff
+
+    def kuwait_prices(self) -> Dict:
+        """Get per-gram karat prices in KWD"""
+        table = self.table()
+        if not table:
+            return {"success": False, "error": "Gold spot price unavailable"}
+        return table['kuwait']
+
+    def catalog(self) -> Dict:
+        """The current tick's priced catalog, or the unpriced one while spot prices are unavailable"""
+        table = self.table()
+        return table['catalog'] if table else self._base
+
+    def catalog_json(self) -> RawJSON:
+        """The /api/products body for the current tick"""
+        return self.catalog()['json']
+
+    def catalog_products(self, positions: List[int] = None) -> List[Dict]:
+        """Get priced catalog products, optionally only at the given row positions"""
+        catalog = self.catalog()
+        if positions is None:
+            # Built once per tick, on first use
+            if catalog['products'] is None:
+                catalog['products'] = self._records(catalog, range(len(self._static_records)))
+            return catalog['products']
+        if catalog['products'] is not None:
+            return [catalog['products'][i] for i in positions]
+        return self._records(catalog, positions)
+
+    def _records(self, catalog: Dict, positions) -> List[Dict]:
+        positions = list(positions)
+        metal_values = _nullable(catalog['metal_value_kwd'][positions])
+        live_prices = _nullable(catalog['live_price_kwd'][positions])
+        return [{**self._static_records[i], 'metal_value_kwd': metal_value, 'live_price_kwd': live_price}
+                for i, metal_value, live_price in zip(positions, metal_values, live_prices)]
+
+
+def _nullable(values: 'np.ndarray') -> list:
+    """Floats as a list with None where the value is NaN"""
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _json_numbers(values: 'np.ndarray') -> List[bytes]:
+    """Each float encoded as JSON, null for NaN, in one encoder call"""
+    encoded = dumps_bytes(_nullable(values))[1:-1]
+    return encoded.split(b',') if encoded else []
@@ -0,0 +1,143 @@
+"""Cold-start helpers: lazy module imports, memoized components and a per-phase startup report"""
+import os
+import sys
+import time
+import logging
+import importlib
+import threading
+import types
+from contextlib import contextmanager
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    def __init__(self):
+        """Record how long each boot phase and each deferred first-use initialization took"""
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._last_mark = self.started
+        self._phases = []
+        self.ready_seconds = None
+
+    def mark(self, phase: str):
+        """Close a boot phase that started at the previous mark"""
+        now = time.perf_counter()
+        with self._lock:
+            self._phases.append({'phase': phase, 'seconds': now - self._last_mark, 'deferred': False})
+            self._last_mark = now
+
+    def ready(self):
+        """Mark the end of module-level startup"""
+        self.ready_seconds = time.perf_counter() - self.started
+        boot = ', '.join(f"{p['phase']}={p['seconds'] * 1000:.1f}ms" for p in self.phases() if not p['deferred'])
+        logger.info(f"Startup finished in {self.ready_seconds * 1000:.1f}ms ({boot})")
+
+    @contextmanager
+    def phase(self, phase: str):
+        """Time work that was deferred until first use"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._phases.append({'phase': phase, 'seconds': elapsed, 'deferred': True})
+            logger.debug(f"Deferred startup phase '{phase}' took {elapsed * 1000:.1f}ms")
+
+    def phases(self) -> List[Dict]:
+        with self._lock:
+            return [dict(p) for p in self._phases]
+
+    def report(self) -> Dict:
+        """Boot and deferred phases in milliseconds"""
+        phases = self.phases()
+        return {
+            'pid': os.getpid(),
+            'ready_ms': round(self.ready_seconds * 1000, 1) if self.ready_seconds is not None else None,
+            'boot': [{'phase': p['phase'], 'ms': round(p['seconds'] * 1000, 1)} for p in phases if not p['deferred']],
+            'deferred': [{'phase': p['phase'], 'ms': round(p['seconds'] * 1000, 1)} for p in phases if p['deferred']]
+        }
+
+
+startup_report = StartupReport()
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name: str):
+        """Module proxy that imports the real module on first attribute access"""
+        super().__init__(name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = sys.modules.get(self.__name__)
+                    if module is None:
+                        with startup_report.phase(f"import {self.__name__}"):
+                            module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._load(), attr)
+        # Cache on the proxy so later lookups skip __getattr__ entirely
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+_lazy_modules = {}
+_lazy_modules_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Return the module if it is already imported, otherwise a shared proxy that imports it on first use"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _lazy_modules_lock:
+        if name not in _lazy_modules:
+            _lazy_modules[name] = LazyModule(name)
+        return _lazy_modules[name]
+
+
+def ensure_imported(*modules: types.ModuleType):
+    """Import lazily proxied modules now, e.g. in a preforking master"""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
+
+
+class memoized_property:
+    def __init__(self, func):
+        """Build an attribute once on first access, thread-safely, and time it in the startup report"""
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self._lock = threading.Lock()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.name in instance.__dict__:
+            return instance.__dict__[self.name]
+        with self._lock:
+            if self.name not in instance.__dict__:
+                with startup_report.phase(self.name):
+                    instance.__dict__[self.name] = self.func(instance)
+        return instance.__dict__[self.name]
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+    def __delete__(self, instance):
+        # Drop the cached value so the next access rebuilds it
+        instance.__dict__.pop(self.name, None)
@@ -0,0 +1,195 @@
+"""Static file serving for the React build with precompressed variants
+
+Compressible files get .br (if the brotli package is installed) and .gz
+siblings, written by `python static_assets.py [build_dir]` after
+`npm run build` or, failing that, when the app is preloaded. Requests are
+served with the best variant the client accepts, a strong ETag, and
+`Cache-Control: immutable` for the content-hashed files under static/;
+everything else (index.html above all) is revalidated on every use.
+Bodies go through send_file, so gunicorn streams them with sendfile().
+"""
+import os
+import re
+import sys
+import gzip
+import hashlib
+import logging
+import mimetypes
+import threading
+from typing import Dict, Optional
+
+from flask import Response, request, send_file
+from werkzeug.exceptions import NotFound
+
+from startup import memoized_property
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.html', '.json', '.map', '.txt', '.svg', '.ico', '.xml'}
+MIN_COMPRESS_BYTES = 1024
+
+# Preferred order when the client accepts several encodings equally
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_PREFIX = 'static/'
+# The content hash the build puts in static file names, e.g. main.40cd798c.js
+CONTENT_HASH = re.compile(r'\.[0-9a-f]{8,}\.')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}"""
+    accepted = {}
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header: str, available: Dict[str, Dict]) -> Optional[str]:
+    """Pick the best available content-coding the client accepts, or None for identity"""
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding, _ in ENCODINGS:
+        if coding not in available:
+            continue
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def file_etag(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()[:20]
+
+
+def precompress(root: str, min_bytes: int = MIN_COMPRESS_BYTES) -> int:
+    """Write missing or stale .gz/.br siblings for compressible files under root"""
+    written = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            if stat.st_size < min_bytes:
+                continue
+            data = None
+            for coding, suffix in ENCODINGS:
+                if coding == 'br' and brotli is None:
+                    continue
+                target = path + suffix
+                if os.path.exists(target) and os.stat(target).st_mtime >= stat.st_mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                encoded = brotli.compress(data, quality=11) if coding == 'br' else gzip.compress(data, 9, mtime=0)
+                if len(encoded) >= len(data):
+                    continue
+                try:
+                    tmp = f"{target}.{os.getpid()}.tmp"
+                    with open(tmp, 'wb') as f:
+                        f.write(encoded)
+                    os.replace(tmp, target)
+                    written += 1
+                except OSError as e:
+                    logger.warning(f"Could not write {target}: {str(e)}")
+                    return written
+    return written
+
+
+class StaticAssets:
+    def __init__(self, root: str):
+        """Serve files under root (the React build directory)"""
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+
+    @memoized_property
+    def index(self) -> Dict[str, Dict]:
+        """Relative path -> file metadata, encoded variants and ETag"""
+        index = {}
+        if not os.path.isdir(self.root):
+            return index
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(('.gz', '.br', '.tmp')):
+                    continue
+                path = os.path.join(directory, filename)
+                relpath = os.path.relpath(path, self.root).replace(os.sep, '/')
+                etag = file_etag(path)
+                variants = {}
+                for coding, suffix in ENCODINGS:
+                    variant = path + suffix
+                    if os.path.exists(variant) and os.stat(variant).st_mtime >= os.stat(path).st_mtime:
+                        variants[coding] = {'path': variant, 'etag': f"{etag}-{suffix[1:]}"}
+                index[relpath] = {
+                    'path': path,
+                    'etag': etag,
+                    'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    'immutable': relpath.startswith(IMMUTABLE_PREFIX) and CONTENT_HASH.search(filename) is not None,
+                    'variants': variants
+                }
+        logger.info(f"Indexed {len(index)} static files, "
+                    f"{sum(len(a['variants']) for a in index.values())} precompressed variants")
+        return index
+
+    def prepare(self):
+        """Precompress the build and (re)build the index, e.g. in the gunicorn master"""
+        with self._lock:
+            written = precompress(self.root)
+            if written:
+                logger.info(f"Precompressed {written} static variants")
+            del self.index
+            return self.index
+
+    def serve(self, filename: str) -> Response:
+        """Serve a build file, negotiating a precompressed variant; raises NotFound for unknown paths"""
+        # Only indexed paths are served, so "../" tricks never reach the filesystem
+        asset = self.index.get(filename.lstrip('/'))
+        if asset is None:
+            raise NotFound()
+
+        coding = choose_encoding(request.headers.get('Accept-Encoding', ''), asset['variants'])
+        variant = asset['variants'][coding] if coding else {'path': asset['path'], 'etag': asset['etag']}
+
+        response = send_file(
+            variant['path'],
+            mimetype=asset['mimetype'],
+            etag=variant['etag'],
+            conditional=True
+        )
+        if coding and response.status_code != 304:
+            response.headers['Content-Encoding'] = coding
+        if asset['variants']:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if asset['immutable'] else REVALIDATE_CACHE_CONTROL
+        return response
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    build_dir = sys.argv[1] if len(sys.argv) > 1 else 'build'
+    count = precompress(build_dir)
+    print(f"Precompressed {count} files in {build_dir} (brotli {'enabled' if brotli else 'not installed'})")
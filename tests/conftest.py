@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+# app.py builds its OpenAI client from the environment at import
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """The Flask app imported with its SQLite files and images under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GOLDGPT_CACHE_BACKEND', 'memory')
+    import app
+    monkeypatch.setattr(app.goldgpt, 'images_dir', str(tmp_path / 'generated_images'))
+    os.makedirs(app.goldgpt.images_dir, exist_ok=True)
+    monkeypatch.setattr(app.goldgpt, '_database_ready', False)
+    return app
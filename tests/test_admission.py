@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+from flask import Flask, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from admission import AdmissionController, ClientBuckets, TokenBucket, run_blocking, stream_concurrency
+
+
+@pytest.fixture
+def make_app(monkeypatch):
+    def make(hops=0, **env):
+        monkeypatch.setenv('ADMISSION_CHAT_RATE', '60')
+        monkeypatch.setenv('ADMISSION_CHAT_BURST', '2')
+        monkeypatch.setenv('ADMISSION_IP_MULTIPLIER', '2')
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        app = Flask(__name__)
+        admission = AdmissionController()
+
+        @app.route('/chat', methods=['POST'])
+        @admission.admit('llm')
+        def chat():
+            return jsonify({'ok': True})
+
+        if hops:
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops)
+        return app.test_client()
+    return make
+
+
+def post(client, session_id=None, forwarded=None, peer='10.0.0.1'):
+    headers = {'X-Forwarded-For': forwarded} if forwarded else {}
+    return client.post('/chat', json={'session_id': session_id} if session_id else {}, headers=headers,
+                       environ_base={'REMOTE_ADDR': peer}).status_code
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    bucket = TokenBucket(rate_per_second=1, burst=2)
+    assert bucket.try_acquire() == (True, 0.0)
+    assert bucket.try_acquire() == (True, 0.0)
+    admitted, retry_after = bucket.try_acquire()
+    assert not admitted and retry_after == pytest.approx(1.0)
+    now[0] += 1
+    assert bucket.try_acquire()[0]
+
+
+def test_client_buckets_evict_least_recent_clients():
+    buckets = ClientBuckets(rate_per_minute=0, burst=1, max_clients=2)
+    assert buckets.try_acquire('a')[0]
+    assert buckets.try_acquire('b')[0]
+    assert buckets.try_acquire('c')[0]
+    assert buckets.try_acquire('a')[0]  # evicted, so it starts with a full bucket again
+    assert not buckets.try_acquire('c')[0]
+
+
+def test_rotating_session_ids_do_not_bypass_the_ip_limit(make_app):
+    client = make_app()
+    statuses = [post(client, session_id=f"s{n}") for n in range(6)]
+    # The IP allowance is 2x a session's burst of 2
+    assert statuses == [200] * 4 + [429] * 2
+
+
+def test_session_bucket_narrows_the_ip_allowance(make_app):
+    client = make_app()
+    assert [post(client, session_id='same') for _ in range(3)] == [200, 200, 429]
+
+
+def test_spoofed_forwarded_for_is_ignored_without_trusted_proxies(make_app):
+    client = make_app()
+    statuses = [post(client, forwarded=f"203.0.113.{n}") for n in range(6)]
+    assert statuses.count(429) == 2
+
+
+def test_trusted_proxy_hop_keys_on_the_address_it_appended(make_app):
+    client = make_app(hops=1)
+    # The client prepends fake hops; the proxy appends the real address last
+    statuses = [post(client, forwarded=f"198.51.100.{n}, 203.0.113.7") for n in range(6)]
+    assert statuses.count(429) == 2
+    assert post(client, forwarded='203.0.113.8') == 200
+
+
+def test_threaded_workers_call_blocking_io_inline(monkeypatch):
+    monkeypatch.delenv('ADMISSION_STREAM_CONCURRENCY', raising=False)
+    assert stream_concurrency() == 16
+    assert run_blocking(lambda value, scale=1: value * scale, 2, scale=3) == 6
+
+
+GEVENT_CHECK = """
+from gevent import monkey
+monkey.patch_all()
+import threading
+import admission
+assert admission.green_threads() and admission.stream_concurrency() == 1000
+main = threading.get_ident()
+assert admission.run_blocking(threading.get_ident) != main
+try:
+    admission.run_blocking(int, 'not a number')
+except ValueError:
+    print('ok')
+"""
+
+
+def test_gevent_workers_take_more_streams_and_offload_blocking_io():
+    pytest.importorskip('gevent')
+    env = {k: v for k, v in os.environ.items() if k != 'ADMISSION_STREAM_CONCURRENCY'}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', GEVENT_CHECK], cwd=root, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.stdout.strip() == 'ok', result.stderr
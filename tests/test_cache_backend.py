@@ -0,0 +1,155 @@
+import gc
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache_backend
+from cache_backend import MemoryCache, SQLiteCache, decode_value, encode_value
+from deadline import Deadline, DeadlineExceeded
+from json_provider import RawJSON
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'cache.db')
+
+
+def test_values_round_trip_without_pickle():
+    index = pd.date_range('2024-01-01', periods=3, freq='h', tz='America/New_York', name='Date')
+    frame = pd.DataFrame({'Close': [1.5, np.nan, 3.0], 'Volume': [1, 2, 3]}, index=index)
+    decoded = decode_value(encode_value(frame))
+    pd.testing.assert_frame_equal(decoded, frame, check_freq=False)
+
+    assert decode_value(encode_value(RawJSON(b'{"a":1}'))).body == b'{"a":1}'
+    assert decode_value(encode_value({'price': 2400.5, 'items': [1, 2]})) == {'price': 2400.5, 'items': [1, 2]}
+
+
+def test_pickled_entries_are_not_loaded(cache_path):
+    import pickle
+    cache = SQLiteCache(cache_path)
+    cache._connection().execute('INSERT INTO cache_entries VALUES (?, ?, ?)',
+                                ('evil', pickle.dumps({'x': 1}), time.time() + 60))
+    cache._connection().commit()
+    assert cache.get('evil') is None
+
+
+def test_unserializable_values_are_not_cached(cache_path):
+    cache = SQLiteCache(cache_path)
+    cache.set('obj', object(), 60)
+    assert cache.get('obj') is None
+
+
+def test_lease_owner_is_per_process(cache_path, monkeypatch):
+    cache = SQLiteCache(cache_path)
+    master_owner = cache._owner
+    monkeypatch.setattr(cache_backend.os, 'getpid', lambda: -1)
+    assert cache._owner != master_owner
+
+
+def test_release_only_drops_own_lease(cache_path):
+    first, second = SQLiteCache(cache_path, lock_timeout=0.01), SQLiteCache(cache_path)
+    assert first._acquire_lease('k')
+    time.sleep(0.02)
+    assert second._acquire_lease('k')  # first's lease expired
+    first._release_lease('k')
+    assert not first._acquire_lease('k')  # second still holds it
+
+
+def test_close_drops_connections_and_reopens_on_demand(cache_path):
+    cache = SQLiteCache(cache_path)
+    cache.set('k', 1, 60)
+    other = []
+    thread = threading.Thread(target=lambda: other.append(cache._connection()))
+    thread.start()
+    thread.join()
+    conn = cache._connection()
+
+    cache.close()
+    with pytest.raises(Exception):
+        conn.execute('SELECT 1')
+    with pytest.raises(Exception):
+        other[0].execute('SELECT 1')
+    assert cache.get('k') == 1
+    assert cache._connection() is not conn
+
+
+def test_connections_from_another_process_are_not_closed(cache_path, monkeypatch):
+    cache = SQLiteCache(cache_path)
+    inherited = cache._connection()
+    monkeypatch.setattr(cache_backend.os, 'getpid', lambda: -1)
+    cache.close()
+    assert inherited.execute('SELECT 1').fetchone() == (1,)
+    assert cache._connections == []
+
+
+def test_get_or_compute_runs_once_across_processes(cache_path):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'value': 42}
+
+    caches = [SQLiteCache(cache_path) for _ in range(4)]
+    results = []
+    threads = [threading.Thread(target=lambda c=c: results.append(c.get_or_compute('k', compute, 60)))
+               for c in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [{'value': 42}] * 4
+
+
+@pytest.mark.parametrize('cache_factory', [MemoryCache, lambda: SQLiteCache(':memory:')])
+def test_key_locks_are_released(cache_factory):
+    cache = cache_factory()
+    for n in range(100):
+        cache.get_or_compute(f"key:{n}", lambda: n, 60)
+    gc.collect()
+    assert len(cache._key_locks) == 0
+
+
+def test_failed_computes_are_not_cached():
+    cache = MemoryCache()
+    assert cache.get_or_compute('k', lambda: None, 60) is None
+    assert cache.get_or_compute('k', lambda: 1, 60) == 1
+
+
+@pytest.mark.parametrize('cache_factory', [lambda path: MemoryCache(), SQLiteCache])
+def test_key_lock_wait_is_bounded_by_the_request_deadline(cache_factory, cache_path):
+    cache = cache_factory(cache_path)
+    computing, release = threading.Event(), threading.Event()
+
+    def slow():
+        computing.set()
+        release.wait(5)
+        return 1
+
+    worker = threading.Thread(target=lambda: cache.get_or_compute('k', slow, 60))
+    worker.start()
+    computing.wait(5)
+    start = time.monotonic()
+    try:
+        with Deadline(0.3).activate(), pytest.raises(DeadlineExceeded):
+            cache.get_or_compute('k', lambda: 2, 60)
+        assert time.monotonic() - start < 2
+    finally:
+        release.set()
+        worker.join()
+    assert cache.get('k') == 1
+
+
+def test_lease_wait_is_bounded_by_the_request_deadline(cache_path):
+    holder, waiter = SQLiteCache(cache_path), SQLiteCache(cache_path, lock_timeout=30)
+    assert holder._acquire_lease('k')
+    start = time.monotonic()
+    with Deadline(0.3).activate(), pytest.raises(DeadlineExceeded):
+        waiter.get_or_compute('k', lambda: 2, 60)
+    assert time.monotonic() - start < 2
+    # Without a deadline the lock_timeout still applies and the value is computed locally
+    assert SQLiteCache(cache_path, lock_timeout=0.1).get_or_compute('k', lambda: 3, 60) == 3
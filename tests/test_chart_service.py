@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache_backend import MemoryCache
+from chart_service import ChartService, lttb_indices, parse_indicators, snap_points
+
+
+def history(rows=2000):
+    index = pd.date_range('2020-01-01', periods=rows, freq='D')
+    close = 2000 + np.sin(np.arange(rows) / 10) * 50
+    return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close}, index=index)
+
+
+@pytest.fixture
+def service():
+    calls = []
+
+    def provider(period, interval):
+        calls.append((period, interval))
+        return history()
+    service = ChartService(provider, cache=MemoryCache())
+    service.provider_calls = calls
+    return service
+
+
+def test_parse_indicators_whitelists_windows():
+    assert parse_indicators('sma20, rsi ,SMA20') == (('rsi', 14), ('sma', 20))
+    with pytest.raises(ValueError):
+        parse_indicators('sma999')
+    with pytest.raises(ValueError):
+        parse_indicators('sma5,sma10,sma20,sma50,sma100,sma200,ema9')
+
+
+def test_points_are_bucketed():
+    assert snap_points(3) == 50
+    assert snap_points(501) == 1000
+    assert snap_points(5000) == 5000
+
+
+def test_lttb_keeps_endpoints_and_threshold():
+    y = np.random.default_rng(1).normal(size=1000)
+    keep = lttb_indices(np.arange(1000, dtype=float), y, 100)
+    assert len(keep) == 100 and keep[0] == 0 and keep[-1] == 999
+    assert (np.diff(keep) > 0).all()
+
+
+def test_cache_entries_are_bounded_by_buckets_and_windows(service):
+    for points in range(400, 500):
+        service.get_chart('1y', '1d', 'sma20,bb20', points)
+    keys = set(service.cache._entries)
+    assert keys == {'chart:history:1y:1d', 'chart:sample:1y:1d:500', 'chart:data:1y:1d:500',
+                    'chart:indicator:1y:1d:500:sma20', 'chart:indicator:1y:1d:500:bb20'}
+    assert service.provider_calls == [('1y', '1d')]
+
+
+def test_chart_combines_cached_parts(service):
+    chart = service.get_chart('1y', '1d', 'bb20,sma20', 300)
+    assert chart['points'] == 500
+    assert set(chart['indicators']) == {'sma20', 'bb20_upper', 'bb20_middle', 'bb20_lower'}
+    assert len(chart['indicators']['sma20']) == len(chart['y'])
+    assert 'indicators' not in service.get_chart('1y', '1d', '', 300)
@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+
+import pytest
+
+import chat_search
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'chats.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE chat_sessions (id TEXT PRIMARY KEY, title TEXT NOT NULL);
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO chat_sessions VALUES ('s1', 'Gold');
+    ''')
+    conn.executemany('INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)', [
+        ('s1', 'user', 'كم سعر الذهب اليوم؟'),
+        ('s1', 'assistant', 'سعرُ ذهبِ عيار ٢٤ مرتفع'),
+        ('s1', 'user', 'Palladium certificates please'),
+    ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def test_normalize_unifies_arabic_spellings():
+    assert chat_search.normalize('والذهب') == 'ذهب'
+    assert chat_search.normalize('سعرُ') == 'سعر'
+    assert chat_search.normalize('أسعار ٢٤') == 'اسعار 24'
+    assert chat_search.normalize('الله') == 'الله'
+
+
+def test_normalize_with_positions_maps_back_to_the_original():
+    text = 'بالذهبِ'
+    normalized, positions = chat_search.normalize_with_positions(text)
+    assert normalized == chat_search.normalize(text) == 'ذهب'
+    assert [text[i] for i in positions] == ['ذ', 'ه', 'ب']
+
+
+def test_new_index_is_searched_by_scanning_until_backfilled(conn):
+    assert chat_search.install_schema(conn) is False
+    result = chat_search.search(conn, 'الذهب')
+    assert result['indexing'] is True and result['order'] == 'recent'
+    assert [hit['message_id'] for hit in result['results']] == [2, 1]
+
+    assert chat_search.rebuild_index(conn) == 3
+    assert chat_search.install_schema(conn) is True
+    result = chat_search.search(conn, 'الذهب')
+    assert result['indexing'] is False and result['order'] == 'relevance'
+    assert sorted(hit['message_id'] for hit in result['results']) == [1, 2]
+    assert '<mark>' in result['results'][0]['snippet']
+
+
+def test_scan_and_index_agree_on_prefixes_and_filters(conn):
+    chat_search.install_schema(conn)
+    queries = [('certif', {}), ('palladium cert', {}), ('ذهب', {'role': 'assistant'}), ('silver', {})]
+    scanned = [[hit['message_id'] for hit in chat_search.search(conn, q, **kw)['results']] for q, kw in queries]
+    chat_search.rebuild_index(conn)
+    indexed = [sorted(hit['message_id'] for hit in chat_search.search(conn, q, **kw)['results'])
+               for q, kw in queries]
+    assert [sorted(ids) for ids in scanned] == indexed == [[3], [3], [2], []]
+
+
+def test_rebuild_is_skipped_once_current(conn):
+    chat_search.install_schema(conn)
+    assert chat_search.rebuild_index(conn) == 3
+    assert chat_search.rebuild_index(conn) is None
+    assert chat_search.rebuild_index(conn, force=True) == 3
+    assert not conn.in_transaction
+
+
+def test_rebuild_lock_errors_propagate(conn, db_path):
+    chat_search.install_schema(conn)
+    other = sqlite3.connect(db_path, timeout=0)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            chat_search.rebuild_index(other)
+    finally:
+        conn.rollback()
+    assert chat_search.index_version(other) is None
+    other.close()
+
+
+def test_concurrent_rebuilds_index_once(conn, db_path):
+    chat_search.install_schema(conn)
+    results = []
+
+    def rebuild():
+        worker_conn = sqlite3.connect(db_path, timeout=10)
+        results.append(chat_search.rebuild_index(worker_conn))
+        worker_conn.close()
+
+    threads = [threading.Thread(target=rebuild) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results, key=lambda count: count is None) == [3, None, None, None]
+
+
+def test_plain_connections_can_write_messages(conn, db_path):
+    chat_search.install_schema(conn)
+    chat_search.rebuild_index(conn)
+    plain = sqlite3.connect(db_path)
+    cursor = plain.execute("INSERT INTO messages (session_id, role, content) VALUES ('s1', 'user', 'والفضة')")
+    plain.execute("UPDATE messages SET content = 'Rhodium plating' WHERE id = 3")
+    plain.execute("DELETE FROM messages WHERE id = 1")
+    plain.commit()
+    assert chat_search.search(conn, 'فضة')['results'] == []
+    assert chat_search.search(conn, 'palladium')['results'] == []
+
+    chat_search.index_messages(conn, [(cursor.lastrowid, 'والفضة', 'user', 's1'),
+                                      (3, 'Rhodium plating', 'user', 's1')])
+    conn.commit()
+    assert [hit['message_id'] for hit in chat_search.search(conn, 'فضة')['results']] == [cursor.lastrowid]
+    assert [hit['message_id'] for hit in chat_search.search(conn, 'rhod')['results']] == [3]
+    assert [hit['message_id'] for hit in chat_search.search(conn, 'الذهب')['results']] == [2]
+    plain.close()
+
+
+def test_version_1_index_is_replaced(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.create_function('goldgpt_normalize', 1, chat_search.normalize)
+    conn.executescript('''
+        CREATE VIEW messages_search_content AS
+        SELECT id, goldgpt_normalize(content) AS body, role, session_id FROM messages;
+        CREATE VIRTUAL TABLE messages_fts USING fts5(
+            body, role, session_id, content='messages_search_content', content_rowid='id'
+        );
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, body, role, session_id)
+            VALUES (new.id, goldgpt_normalize(new.content), new.role, new.session_id);
+        END;
+        CREATE TABLE search_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        INSERT INTO search_meta VALUES ('index_version', '1');
+    ''')
+    conn.close()
+
+    conn = sqlite3.connect(db_path)
+    assert chat_search.install_schema(conn) is False
+    conn.execute("INSERT INTO messages (session_id, role, content) VALUES ('s1', 'user', 'hi')")
+    conn.commit()
+    assert chat_search.rebuild_index(conn) == 4
+    assert sorted(hit['message_id'] for hit in chat_search.search(conn, 'الذهب')['results']) == [1, 2]
+    conn.close()
+
+
+def test_database_is_not_marked_ready_when_the_schema_fails(app_module, monkeypatch):
+    install_schema = chat_search.install_schema
+    failures = [sqlite3.OperationalError('database is locked')]
+
+    def flaky(conn):
+        if failures:
+            raise failures.pop()
+        return install_schema(conn)
+    monkeypatch.setattr(chat_search, 'install_schema', flaky)
+    with pytest.raises(sqlite3.OperationalError):
+        app_module.goldgpt.connect_db()
+    assert app_module.goldgpt._database_ready is False
+
+    conn = app_module.goldgpt.connect_db()
+    conn.close()
+    assert app_module.goldgpt._database_ready is True
+    # Don't leave the backfill running once the test's working directory is gone
+    app_module.goldgpt.start_search_backfill().join()
+
+
+def test_app_backfills_off_the_request_path(app_module):
+    goldgpt = app_module.goldgpt
+    goldgpt.connect_db().close()
+    goldgpt.start_search_backfill().join()
+    goldgpt.save_chat_session('s1', [{'role': 'user', 'content': 'والذهب'}])
+    results = goldgpt.search_chat_history('الذهب')
+    assert results['indexing'] is False
+    assert [hit['session_id'] for hit in results['results']] == ['s1']
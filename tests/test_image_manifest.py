@@ -0,0 +1,161 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import image_manifest
+from fake_upstreams import make_png
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    image_manifest.install_schema(conn)
+    yield conn
+    conn.close()
+
+
+def record(conn, filename, prompt, created_at):
+    image_manifest.record_image(conn, filename, make_png(8, 4), prompt, f"Elegant {prompt}", created_at)
+
+
+def filenames(result):
+    return [image['filename'] for image in result['images']]
+
+
+def test_record_reads_dimensions_and_pages_newest_first(conn):
+    for n in range(5):
+        record(conn, f"img{n}.png", 'gold ring', f"2024-01-0{n + 1}T10:00:00")
+    first = image_manifest.list_images(conn, page=1, page_size=2)
+    assert filenames(first) == ['img4.png', 'img3.png'] and first['has_more']
+    assert first['images'][0]['width'] == 8 and first['images'][0]['height'] == 4
+    last = image_manifest.list_images(conn, page=3, page_size=2)
+    assert filenames(last) == ['img0.png'] and not last['has_more']
+
+
+def test_cursor_pages_cover_every_image_once(conn):
+    for n in range(5):
+        record(conn, f"img{n}.png", 'gold ring', '2024-01-01T10:00:00' if n < 3 else f"2024-01-0{n}T10:00:00")
+    seen, cursor = [], None
+    while True:
+        page = image_manifest.list_images_after(conn, limit=2, cursor=cursor)
+        assert len(page['images']) <= 2
+        seen.extend(filenames(page))
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == ['img4.png', 'img3.png', 'img2.png', 'img1.png', 'img0.png']
+    assert list(page['images'][0]) == ['filename', 'size', 'created', 'url']
+    with pytest.raises(ValueError):
+        image_manifest.list_images_after(conn, cursor='not-a-cursor')
+
+
+def test_query_matches_word_prefixes(conn):
+    record(conn, 'gold_necklace_1.png', 'gold necklace with pearls', '2024-01-01T10:00:00')
+    record(conn, 'ring_2.png', 'silver ring', '2024-01-02T10:00:00')
+    assert filenames(image_manifest.list_images(conn, query='neck')) == ['gold_necklace_1.png']
+    assert filenames(image_manifest.list_images(conn, query='elegant sil')) == ['ring_2.png']
+    assert filenames(image_manifest.list_images(conn, query='ring_2')) == ['ring_2.png']
+    # Prefix matching only: no match in the middle of a word
+    assert filenames(image_manifest.list_images(conn, query='ecklace')) == []
+
+
+def test_rerecording_an_image_replaces_its_search_entry(conn):
+    record(conn, 'a.png', 'gold bar', '2024-01-01T10:00:00')
+    record(conn, 'a.png', 'silver coin', '2024-01-01T10:00:00')
+    assert filenames(image_manifest.list_images(conn, query='bar')) == []
+    assert filenames(image_manifest.list_images(conn, query='coin')) == ['a.png']
+
+
+def test_time_bounds_are_converted_to_local_time(conn):
+    local = datetime(2024, 6, 1, 12, 0, 0)
+    record(conn, 'noon.png', 'gold', local.isoformat())
+    utc = local.astimezone(timezone.utc).replace(tzinfo=None)
+
+    since = image_manifest.parse_time_bound(utc.isoformat() + 'Z')
+    assert since == local.isoformat()
+    assert filenames(image_manifest.list_images(conn, since=since)) == ['noon.png']
+    until = image_manifest.parse_time_bound((utc - timedelta(seconds=1)).isoformat() + '+00:00')
+    assert filenames(image_manifest.list_images(conn, until=until)) == []
+    assert image_manifest.parse_time_bound('2024-06-01') == '2024-06-01T00:00:00'
+    with pytest.raises(ValueError):
+        image_manifest.parse_time_bound('yesterday')
+
+
+def test_reconcile_adds_external_files_and_drops_missing_ones(conn, tmp_path):
+    images_dir = tmp_path / 'images'
+    images_dir.mkdir()
+    record(conn, 'gone.png', 'gold', '2024-01-01T10:00:00')
+    (images_dir / 'copied.png').write_bytes(make_png(3, 2))
+    (images_dir / 'notes.txt').write_text('not an image')
+
+    changes = image_manifest.reconcile(conn, str(images_dir))
+    assert (changes['added'], changes['removed']) == (1, 1)
+    result = image_manifest.list_images(conn)
+    assert filenames(result) == ['copied.png']
+    assert result['images'][0]['source'] == 'external' and result['images'][0]['width'] == 3
+    assert filenames(image_manifest.list_images(conn, query='copied')) == ['copied.png']
+
+    assert image_manifest.reconcile(conn, str(images_dir))['skipped']
+    os.remove(images_dir / 'copied.png')
+    assert image_manifest.reconcile(conn, str(images_dir))['removed'] == 1
+
+
+def test_existing_manifest_gets_a_search_index(conn):
+    record(conn, 'old.png', 'gold bangle', '2024-01-01T10:00:00')
+    conn.executescript('''
+        DROP TRIGGER image_manifest_fts_insert;
+        DROP TRIGGER image_manifest_fts_delete;
+        DROP TRIGGER image_manifest_fts_update;
+        DROP TABLE image_manifest_fts;
+    ''')
+    image_manifest.install_schema(conn)
+    assert filenames(image_manifest.list_images(conn, query='bang')) == ['old.png']
+
+
+def test_search_survives_vacuum_after_deletes(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'chats.db'))
+    image_manifest.install_schema(conn)
+    for n in range(6):
+        record(conn, f"img{n}.png", f"gold item{n}", f"2024-01-0{n + 1}T10:00:00")
+    conn.execute("DELETE FROM image_manifest WHERE filename IN ('img0.png', 'img2.png')")
+    conn.commit()
+    conn.execute('VACUUM')
+    assert filenames(image_manifest.list_images(conn, query='item3')) == ['img3.png']
+    assert filenames(image_manifest.list_images(conn, query='gold')) == ['img5.png', 'img4.png', 'img3.png', 'img1.png']
+    conn.close()
+
+
+def test_manifest_keyed_by_filename_is_migrated(conn):
+    conn.executescript('''
+        DROP TABLE image_manifest;
+        DROP TABLE image_manifest_fts;
+        CREATE TABLE image_manifest (
+            filename TEXT PRIMARY KEY, prompt TEXT, enhanced_prompt TEXT, size_bytes INTEGER NOT NULL,
+            width INTEGER, height INTEGER, created_at TEXT NOT NULL, source TEXT NOT NULL DEFAULT 'generated'
+        );
+        INSERT INTO image_manifest (filename, prompt, size_bytes, created_at)
+        VALUES ('b.png', 'silver coin', 10, '2024-01-02T10:00:00'), ('a.png', 'gold bar', 10, '2024-01-01T10:00:00');
+    ''')
+    image_manifest.install_schema(conn)
+    ids = dict(conn.execute('SELECT filename, id FROM image_manifest'))
+    assert ids['a.png'] < ids['b.png']
+    assert filenames(image_manifest.list_images(conn, query='coin')) == ['b.png']
+
+
+def test_api_images_keeps_its_original_shape(app_module):
+    goldgpt = app_module.goldgpt
+    goldgpt.record_generated_image('a.png', make_png(), 'gold ring', 'Elegant gold ring')
+    client = app_module.app.test_client()
+
+    legacy = client.get('/api/images').get_json()
+    assert legacy['images'] == [{'filename': 'a.png', 'size': len(make_png()),
+                                 'created': legacy['images'][0]['created'], 'url': '/api/images/a.png'}]
+    assert legacy['next_cursor'] is None
+    assert client.get('/api/images?q=bar').get_json()['images'] == []
+    assert client.get('/api/images?cursor=%%%').status_code == 400
+
+    paged = client.get('/api/v2/images?q=ring&since=2000-01-01T00:00:00Z').get_json()
+    assert filenames(paged) == ['a.png'] and paged['page'] == 1
+    assert client.get('/api/v2/images?since=soon').status_code == 400
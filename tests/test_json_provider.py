@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from flask import Flask
+
+from json_provider import FastJSONProvider, RawJSON
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+def test_response_accepts_jsonify_arguments(app):
+    with app.app_context():
+        assert app.json.response({'a': np.int64(1)}).get_data() == b'{"a":1}'
+        assert app.json.response(1, 2).get_data() == b'[1,2]'
+        assert app.json.response(a=1).get_data() == b'{"a":1}'
+        assert app.json.response().get_data() == b'null'
+        with pytest.raises(TypeError):
+            app.json.response(1, a=2)
+
+
+def test_response_writes_raw_json_unchanged(app):
+    with app.app_context():
+        response = app.json.response(RawJSON(b'{"cached": true}'))
+        assert response.get_data() == b'{"cached": true}'
+        assert response.mimetype == 'application/json'
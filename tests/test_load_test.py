@@ -0,0 +1,34 @@
+import os
+
+import load_test
+
+
+def endpoint(p95_ms, error_rate=0.0):
+    return {'p95_ms': p95_ms, 'error_rate': error_rate}
+
+
+def test_compare_to_baseline_flags_p95_and_error_regressions():
+    baseline = {'endpoints': {'/api/prices': endpoint(10.0), '/api/chat': endpoint(100.0, 0.01)}}
+    current = {
+        '/api/prices': endpoint(13.0),
+        '/api/chat': endpoint(110.0, 0.05),
+        '/api/products': endpoint(999.0)
+    }
+    regressions = load_test.compare_to_baseline(current, baseline, 0.2, 0.01)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('/api/chat: error rate')
+    assert regressions[1].startswith('/api/prices: p95')
+
+
+def test_compare_to_baseline_within_thresholds():
+    baseline = {'endpoints': {'/api/prices': endpoint(10.0, 0.01)}}
+    assert load_test.compare_to_baseline({'/api/prices': endpoint(11.9, 0.015)}, baseline, 0.2, 0.01) == []
+
+
+def test_main_returns_non_zero_when_the_run_fails(monkeypatch):
+    def broken(workdir):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(load_test, 'start_app_server', broken)
+    # main() points the app at its fake upstreams through the environment
+    monkeypatch.setattr(os, 'environ', dict(os.environ))
+    assert load_test.main(['--scenario', 'prices', '--requests', '1', '--warmup', '0']) == 2
@@ -0,0 +1,67 @@
+import os
+import queue
+import signal
+import logging
+
+import pytest
+
+from log_config import AsyncQueueHandler, JsonFormatter, parse_sample_rates, redact
+
+
+def make_handler(path):
+    target = logging.FileHandler(path)
+    target.setFormatter(logging.Formatter('%(process)d %(message)s'))
+    return AsyncQueueHandler(queue.Queue(maxsize=100), target)
+
+
+def record(message):
+    return logging.LogRecord('test', logging.INFO, __file__, 1, message, (), None)
+
+
+def test_redact_masks_secrets_and_blobs():
+    value = redact({'api_key': 'x', 'text': 'key sk-abcdefgh12345678 ' + 'A' * 300}, 1000)
+    assert value['api_key'] == '<redacted>'
+    assert 'sk-abcdefgh***' in value['text']
+    assert '<base64 300 chars>' in value['text']
+
+
+def test_parse_sample_rates_clamps_and_skips_garbage():
+    assert parse_sample_rates('/api/prices=0.01, /api/chat=2, junk, /x=abc') == {'/api/prices': 0.01, '/api/chat': 1.0}
+
+
+def test_json_formatter_includes_extra_fields():
+    entry = record('hello')
+    entry.route = '/api/chat'
+    assert '"route": "/api/chat"' in JsonFormatter(100).format(entry)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_child_gets_its_own_queue_and_listener(tmp_path):
+    path = tmp_path / 'log.txt'
+    handler = make_handler(path)
+    handler.start_listener()
+    handler.handle(record('parent before'))
+
+    handler.before_fork()
+    parent_queue = handler.queue
+    # As if another thread were enqueueing at fork time: the child must not wedge on it
+    parent_queue.mutex.acquire()
+    pid = os.fork()
+    if pid == 0:
+        signal.alarm(5)  # a wedged child fails the test instead of hanging it
+        try:
+            handler.after_fork_in_child()
+            handler.handle(record('from child'))
+            handler.stop_listener()
+        finally:
+            os._exit(0)
+    parent_queue.mutex.release()
+    handler.after_fork_in_parent()
+    assert os.waitpid(pid, 0)[1] == 0
+    assert handler.queue is parent_queue
+    handler.handle(record('parent after'))
+    handler.stop_listener()
+
+    lines = path.read_text().splitlines()
+    assert f"{pid} from child" in lines
+    assert f"{os.getpid()} parent before" in lines and f"{os.getpid()} parent after" in lines
@@ -0,0 +1,100 @@
+import pytest
+
+from metrics import MetricsRegistry, timed
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, stage='db')
+    text = registry.render()
+    assert 'latency_seconds_bucket{stage="db",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{stage="db",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{stage="db",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{stage="db"} 4' in text
+
+
+def test_counter_escapes_label_values():
+    registry = MetricsRegistry()
+    counter = registry.counter('errors_total', 'Errors', ('upstream',))
+    counter.inc(upstream='a"b\nc')
+    counter.inc(2, upstream='a"b\nc')
+    assert 'errors_total{upstream="a\\"b\\nc"} 3' in registry.render()
+
+
+def test_collector_samples_share_one_header():
+    registry = MetricsRegistry()
+    registry.register_collector(lambda: [('pool_in_flight', 'gauge', 'In flight', {'pool': 'llm'}, 1),
+                                         ('pool_in_flight', 'gauge', 'In flight', {'pool': 'image'}, 0)])
+    text = registry.render()
+    assert text.count('# TYPE pool_in_flight gauge') == 1
+    assert 'pool_in_flight{pool="image"} 0' in text
+
+
+def test_timed_counts_upstream_errors():
+    from metrics import STAGE_DURATION, STAGE_ERRORS
+    before = STAGE_ERRORS._values.get(('test_upstream',), 0)
+    with pytest.raises(RuntimeError):
+        with timed('test_stage', upstream='test_upstream'):
+            raise RuntimeError('boom')
+    assert STAGE_ERRORS._values[('test_upstream',)] == before + 1
+    assert STAGE_DURATION._series[('test_stage',)][2] >= 1
+
+
+def test_metrics_endpoint_exposes_request_latency(app_module):
+    client = app_module.app.test_client()
+    client.get('/api/health')
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert 'goldgpt_http_request_duration_seconds_count{route="/api/health",method="GET",status="200"}' \
+        in response.get_data(as_text=True)
+
+
+
+def worker_registry(directory):
+    registry = MetricsRegistry(multiprocess_dir=str(directory))
+    counter = registry.counter('requests_total', 'Requests', ('route',))
+    histogram = registry.histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1.0))
+    return registry, counter, histogram
+
+
+def test_scrape_sums_every_worker_snapshot(tmp_path):
+    first, first_counter, first_histogram = worker_registry(tmp_path)
+    second, second_counter, second_histogram = worker_registry(tmp_path)
+    first_counter.inc(2, route='/a')
+    first_histogram.observe(0.05, stage='db')
+    first.register_collector(lambda: [('in_flight', 'gauge', 'In flight', {'pool': 'llm'}, 1),
+                                      ('hits_total', 'counter', 'Hits', {}, 3)])
+    second_counter.inc(3, route='/a')
+    second_histogram.observe(0.5, stage='db')
+    second.register_collector(lambda: [('in_flight', 'gauge', 'In flight', {'pool': 'llm'}, 4),
+                                       ('hits_total', 'counter', 'Hits', {}, 7)])
+    first.write_snapshot(pid=101)
+    second.write_snapshot(pid=102)
+
+    # The worker answering the scrape has counted nothing itself
+    scraper, _, _ = worker_registry(tmp_path)
+    text = scraper.render()
+    assert 'requests_total{route="/a"} 5' in text
+    assert 'latency_seconds_bucket{stage="db",le="0.1"} 1' in text
+    assert 'latency_seconds_count{stage="db"} 2' in text
+    assert 'hits_total 10' in text
+    assert text.count('# TYPE in_flight gauge') == 1
+    assert 'in_flight{pool="llm",pid="101"} 1' in text and 'in_flight{pool="llm",pid="102"} 4' in text
+
+
+def test_exited_worker_keeps_counting_without_its_gauges(tmp_path):
+    worker, counter, _ = worker_registry(tmp_path)
+    worker.register_collector(lambda: [('in_flight', 'gauge', 'In flight', {}, 1)])
+    counter.inc(route='/a')
+    worker.write_snapshot(pid=101)
+    worker.mark_process_dead(101)
+
+    scraper, _, _ = worker_registry(tmp_path)
+    text = scraper.render()
+    assert 'requests_total{route="/a"} 1' in text
+    assert 'in_flight' not in text
+
+    scraper.clear_multiprocess_dir()
+    assert 'requests_total{route="/a"}' not in scraper.render()
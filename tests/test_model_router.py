@@ -0,0 +1,125 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from model_router import ModelRouter, keyword_pattern
+
+
+@pytest.fixture
+def router():
+    return ModelRouter(hedge_enabled=False)
+
+
+@pytest.mark.parametrize('message, intent', [
+    ('كم سعر الذهب اليوم', 'price_lookup'),
+    ('بكم الخاتم', 'price_lookup'),
+    ('وبالسعر الحالي', 'price_lookup'),
+    ('gold prices', 'price_lookup'),
+    ('ما هي الكمية', 'general'),
+    ('anywhere to meet?', 'general'),
+    ('why is gold up', 'analysis'),
+    ('تحليل السوق', 'analysis'),
+    ('hello', 'greeting'),
+    ("hi, what's the gold price today?", 'price_lookup'),
+    ('hello, is this ring available?', 'product_lookup'),
+    ('مرحبا كم سعر الذهب', 'price_lookup'),
+])
+def test_classify_matches_whole_words(router, message, intent):
+    assert router.classify(message) == intent
+
+
+def test_keyword_pattern_respects_word_boundaries():
+    pattern = keyword_pattern(['draw', 'صورة'])
+    assert pattern.search('draw a ring')
+    assert pattern.search('أريد الصورة')
+    assert not pattern.search('the drawer')
+    assert not pattern.search('تصويرة')
+
+
+class FakeCompletions:
+    def __init__(self, responses):
+        """Hands out (delay seconds, response) pairs, one per create() call"""
+        self.responses = list(responses)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        return self.responses.pop(0)
+
+    def create(self, **request):
+        delay, response = self._next()
+        time.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **request):
+        delay, response = self._next()
+        await asyncio.sleep(delay)
+        return response
+
+
+class FakeClient:
+    def __init__(self, completions):
+        self.chat = SimpleNamespace(completions=completions)
+
+    def with_options(self, **options):
+        return self
+
+
+def reply(prompt_tokens, completion_tokens):
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+
+def tiers(timeout):
+    tier = {"max_tokens": 100, "timeout": timeout, "cost_per_1k_input": 1.0, "cost_per_1k_output": 1.0}
+    return {"primary": dict(tier, model="primary-model", fallback="backup"),
+            "backup": dict(tier, model="backup-model")}
+
+
+DECISION = {"tier": "primary", "max_tokens": 100}
+
+
+def test_hedge_loop_timeout_falls_back_to_the_next_tier(monkeypatch):
+    router = ModelRouter(tiers(0.2), hedge_enabled=True)
+    monkeypatch.setattr(router, 'hedge_delay', lambda tier_name: 0.05 if tier_name == 'primary' else None)
+    # Both hedged attempts hang past the tier timeout, so the loop's own wait gives up
+    hedge_client = FakeClient(FakeAsyncCompletions([(30, None), (30, None)]))
+    fallback = reply(10, 5)
+    client = FakeClient(FakeCompletions([(0, fallback)]))
+
+    assert router.complete(client, [], DECISION, hedge_client=hedge_client) is fallback
+    stats = router.stats()
+    assert stats['primary']['timeouts'] == 1
+    assert stats['backup']['successes'] == 1
+
+
+def test_timeouts_stay_out_of_the_latency_samples():
+    router = ModelRouter(tiers(0.2), hedge_enabled=False)
+    timeout = openai.APITimeoutError(request=None)
+    client = FakeClient(FakeCompletions([(0.2, timeout), (0, reply(10, 5))]))
+
+    router.complete(client, [], DECISION)
+    stats = router.stats()
+    assert stats['primary']['timeouts'] == 1
+    assert stats['primary']['p95_latency_ms'] is None and stats['primary']['avg_latency_ms'] is None
+    assert router.latency_percentile('primary', 95) is None
+    assert stats['backup']['avg_latency_ms'] is not None
+
+
+def test_hedged_loser_usage_is_recorded(monkeypatch):
+    router = ModelRouter(tiers(5), hedge_enabled=True)
+    monkeypatch.setattr(router, 'hedge_delay', lambda tier_name: 0.05)
+    hedge_client = FakeClient(FakeAsyncCompletions([(1.0, reply(100, 50)), (0, reply(100, 20))]))
+
+    router.complete(FakeClient(FakeCompletions([])), [], DECISION, hedge_client=hedge_client)
+    stats = router.stats()['primary']
+    # The winning hedge's usage plus the cancelled primary's prompt
+    assert stats['prompt_tokens'] == 200
+    assert stats['completion_tokens'] == 20
+    assert stats['hedge_wins'] == 1
@@ -0,0 +1,67 @@
+from admission import ConcurrencyPool
+from price_stream import PriceBroadcaster, Subscriber
+
+
+def attach(broadcaster, queue_size=16):
+    """Register a subscriber without starting the producer thread"""
+    subscriber = Subscriber(queue_size)
+    broadcaster._subscribers.add(subscriber)
+    return subscriber
+
+
+def test_poll_publishes_only_changed_quotes():
+    quotes = {'gold': {'price': 1, 'timestamp': 'a'}, 'silver': {'price': 2, 'timestamp': 'a'}}
+    broadcaster = PriceBroadcaster(lambda: quotes, poll_seconds=0)
+    subscriber = attach(broadcaster)
+
+    broadcaster._poll()
+    assert set(subscriber.queue.get_nowait()['data']) == {'gold', 'silver'}
+
+    quotes = {'gold': {'price': 1, 'timestamp': 'b'}, 'silver': {'price': 3, 'timestamp': 'b'}}
+    broadcaster._poll()
+    assert set(subscriber.queue.get_nowait()['data']) == {'silver'}
+
+
+def test_slow_subscriber_is_collapsed_then_dropped():
+    broadcaster = PriceBroadcaster(lambda: {}, queue_size=1, max_overflows=1)
+    subscriber = attach(broadcaster, queue_size=1)
+
+    broadcaster.publish({'type': 'quotes', 'data': {'n': 1}})
+    broadcaster.publish({'type': 'quotes', 'data': {'n': 2}})
+    assert subscriber.queue.get_nowait()['type'] == 'snapshot'
+
+    broadcaster.publish({'type': 'quotes', 'data': {'n': 3}})
+    broadcaster.publish({'type': 'quotes', 'data': {'n': 4}})
+    assert subscriber.closed
+    assert broadcaster.subscriber_count() == 0
+
+
+def test_stream_connections_are_capped(app_module, monkeypatch):
+    pool = ConcurrencyPool('stream', 1, 0)
+    monkeypatch.setitem(app_module.admission.pools, 'stream', pool)
+    client = app_module.app.test_client()
+
+    first = client.get('/api/prices/stream')
+    assert first.status_code == 200
+    rejected = client.get('/api/prices/stream')
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After']
+
+    first.close()
+    assert pool.in_flight == 0
+    second = client.get('/api/prices/stream')
+    assert second.status_code == 200
+    second.close()
+
+
+def test_snapshot_json_follows_the_snapshot_version():
+    quotes = {'gold': {'price': 1}}
+    broadcaster = PriceBroadcaster(lambda: dict(quotes), poll_seconds=60)
+    assert broadcaster.snapshot_json().body == b'{"gold":{"price":1}}'
+
+    quotes = {'gold': {'price': 2}}
+    assert broadcaster.snapshot_json().body == b'{"gold":{"price":1}}'
+    # The snapshot expiring takes its serialized body with it
+    broadcaster.cache.delete("prices:snapshot:versioned")
+    assert broadcaster.snapshot_json().body == b'{"gold":{"price":2}}'
+    assert broadcaster.snapshot() == {'gold': {'price': 2}}
@@ -0,0 +1,102 @@
+import json
+
+import pandas as pd
+import pytest
+
+import pricing
+from deadline import Deadline, active_deadline
+from pricing import KaratPricingEngine, parse_catalog_metal_content
+
+
+def catalog(*names):
+    return pd.DataFrame({'Product Name': list(names), 'Model': list(names),
+                         'Price': [1.0] * len(names), 'Quantity': [1] * len(names)})
+
+
+@pytest.mark.parametrize('name, grams, purity', [
+    ('10 gram BTC Purity 999.9', 10.0, 0.9999),
+    ('0.25 kg Minted Purity 999.9', 250.0, 0.9999),
+    ('PAMP10 Tola Purity 999', 116.638, 0.999),
+    ('1/2 oz Coin', 15.5517, 0.9999),
+    ('1/2 Lera 22 Karat', 3.608, 22 / 24),
+    ('8 Georgian coin 22 Karat', 7.988, 22 / 24),
+])
+def test_parse_weight_and_purity(name, grams, purity):
+    content = parse_catalog_metal_content(pd.Series([name])).iloc[0]
+    assert content['weight_grams'] == pytest.approx(grams, rel=1e-3)
+    assert content['purity'] == pytest.approx(purity, rel=1e-4)
+
+
+def test_unweighted_jewellery_is_not_priced():
+    content = parse_catalog_metal_content(pd.Series(['Bangle 2/18'])).iloc[0]
+    assert pd.isna(content['weight_grams'])
+
+
+def test_tick_prices_catalog_and_karats():
+    engine = KaratPricingEngine(catalog('10 gram Purity 999.9', 'Bangle 1'), lambda: 3110.34768, lambda: 0.3)
+    table = engine.table()
+    assert table['kuwait']['24k_kwd'] == pytest.approx(30.0, abs=1e-3)
+    bar, bangle = engine.catalog_products()
+    assert bar['live_price_kwd'] == pytest.approx(10 * 0.9999 * 30.0 + 1.0, abs=1e-3)
+    assert bangle['live_price_kwd'] is None
+
+
+
+def test_catalog_body_is_serialized_once_per_tick():
+    engine = KaratPricingEngine(catalog('10 gram Purity 999.9', 'Bangle 1', 'قلادة 5 غرام'),
+                                lambda: 3110.34768, lambda: 0.3)
+    body = engine.catalog_json()
+    assert engine.catalog_json() is body
+    assert json.loads(body.body) == {'products': engine.catalog_products()}
+    assert engine.catalog_products([1]) == [engine.catalog_products()[1]]
+
+    engine.on_tick(3110.34768, 0.6)
+    assert engine.catalog_json() is not body
+    assert json.loads(engine.catalog_json().body)['products'][0]['metal_value_kwd'] == pytest.approx(10 * 0.9999 * 60.0, abs=1e-3)
+
+
+def test_catalog_without_spot_prices_is_listed_unpriced():
+    engine = KaratPricingEngine(catalog('10 gram Purity 999.9'), lambda: None, lambda: None)
+    bar, = json.loads(engine.catalog_json().body)['products']
+    assert bar['weight_grams'] == 10.0 and bar['live_price_kwd'] is None
+    assert KaratPricingEngine(None, lambda: None, lambda: None).catalog_json().body == b'{"products":[]}'
+
+
+def test_failed_refresh_retries_with_backoff(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pricing.time, 'monotonic', lambda: now[0])
+    spot = [None]
+    calls = []
+
+    def spot_provider():
+        calls.append(now[0])
+        return spot[0]
+
+    engine = KaratPricingEngine(catalog('10 gram'), spot_provider, lambda: 0.3, tick_seconds=60)
+    engine.retry_seconds = 5
+    assert engine.table() is None
+    assert engine.table() is None
+    assert len(calls) == 1
+
+    now[0] += 5
+    engine.table()
+    assert len(calls) == 2
+    now[0] += 5
+    engine.table()
+    assert len(calls) == 2  # second failure backs off 10s
+
+    spot[0] = 2400.0
+    now[0] += 5
+    assert engine.table() is not None
+    now[0] += 30
+    engine.table()
+    assert len(calls) == 3  # next tick only after tick_seconds
+
+
+def test_refresh_runs_outside_request_deadline():
+    seen = []
+    engine = KaratPricingEngine(catalog('10 gram'), lambda: seen.append(active_deadline()) or 2400.0,
+                                lambda: 0.3)
+    with Deadline(0.05).activate():
+        engine.table()
+    assert seen == [None]
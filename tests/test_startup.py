@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+
+import pytest
+
+import startup
+from startup import LazyModule, StartupReport, ensure_imported, lazy_import, memoized_property
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def fresh_module(tmp_path, monkeypatch):
+    """Name of an importable module that nothing has imported yet"""
+    (tmp_path / 'lazy_target.py').write_text('LOADED = True\n\ndef answer():\n    return 42\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield 'lazy_target'
+    sys.modules.pop('lazy_target', None)
+    startup._lazy_modules.pop('lazy_target', None)
+
+
+def test_lazy_module_imports_on_first_attribute_access(fresh_module):
+    module = lazy_import(fresh_module)
+    assert isinstance(module, LazyModule)
+    assert fresh_module not in sys.modules
+    assert lazy_import(fresh_module) is module
+
+    assert module.answer() == 42
+    assert fresh_module in sys.modules
+    assert 'answer' in module.__dict__
+
+
+def test_lazy_import_returns_modules_already_imported():
+    assert lazy_import('json') is sys.modules['json']
+
+
+def test_ensure_imported_loads_proxies(fresh_module):
+    module = lazy_import(fresh_module)
+    ensure_imported(module, sys.modules['json'])
+    assert fresh_module in sys.modules
+
+
+class Component:
+    builds = 0
+
+    @memoized_property
+    def engine(self):
+        """Slow to build"""
+        type(self).builds += 1
+        time.sleep(0.05)
+        return object()
+
+
+def test_memoized_property_builds_once_under_concurrent_access():
+    Component.builds = 0
+    component = Component()
+    results = []
+    barrier = threading.Barrier(8)
+
+    def read():
+        barrier.wait()
+        results.append(component.engine)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert Component.builds == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_memoized_property_rebuilds_after_del():
+    Component.builds = 0
+    component = Component()
+    first = component.engine
+    assert component.engine is first
+    del component.engine
+    assert component.engine is not first
+    assert Component.builds == 2
+
+
+def test_memoized_property_is_timed_in_the_startup_report():
+    before = len([p for p in startup.startup_report.phases() if p['phase'] == 'engine'])
+    Component().engine
+    phases = [p for p in startup.startup_report.phases() if p['phase'] == 'engine']
+    assert len(phases) == before + 1 and phases[-1]['deferred']
+
+
+def test_startup_report_records_boot_and_deferred_phases():
+    report = StartupReport()
+    report.mark('imports')
+    with report.phase('import pandas'):
+        pass
+    report.mark('routes')
+    report.ready()
+
+    summary = report.report()
+    assert [p['phase'] for p in summary['boot']] == ['imports', 'routes']
+    assert [p['phase'] for p in summary['deferred']] == ['import pandas']
+    assert summary['ready_ms'] is not None and summary['pid'] == os.getpid()
+
+
+IMPORT_CHECK = """
+import sys
+import app
+print(sorted(name for name in ('pandas', 'yfinance', 'openai') if name in sys.modules))
+"""
+
+
+def test_importing_app_defers_heavy_dependencies(tmp_path):
+    env = dict(os.environ, OPENAI_API_KEY='test-key', GOLDGPT_CACHE_BACKEND='memory', PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-c', IMPORT_CHECK], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == '[]'
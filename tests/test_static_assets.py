@@ -0,0 +1,108 @@
+import pytest
+from flask import Flask
+
+import static_assets
+from static_assets import StaticAssets, choose_encoding
+
+SCRIPT = b'function render() { return "gold"; }\n' * 200
+PAGE = b'<!doctype html><html><body><div id="root"></div></body></html>\n' * 50
+
+
+@pytest.fixture
+def client(tmp_path):
+    build = tmp_path / 'build'
+    (build / 'static' / 'js').mkdir(parents=True)
+    (build / 'static' / 'js' / 'main.40cd798c.js').write_bytes(SCRIPT)
+    (build / 'static' / 'js' / 'unhashed.js').write_bytes(SCRIPT)
+    (build / 'index.html').write_bytes(PAGE)
+    (build / 'robots.txt').write_bytes(b'User-agent: *\n')
+
+    assets = StaticAssets(str(build))
+    assets.prepare()
+    app = Flask(__name__, static_folder=str(build), static_url_path='/')
+
+    @app.route('/')
+    def index():
+        return assets.serve('index.html')
+
+    @app.endpoint('static')
+    def serve_static(filename):
+        return assets.serve(filename)
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize('header, coding', [
+    ('gzip, deflate, br', 'br'),
+    ('gzip;q=1.0, br;q=0.5', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('*', 'br'),
+    ('*;q=0', None),
+    ('identity', None),
+    ('', None),
+])
+def test_choose_encoding_honours_preferences_and_q_zero(header, coding):
+    assert choose_encoding(header, {'br': {}, 'gzip': {}}) == coding
+
+
+def test_brotli_is_preferred_and_decodes_to_the_original(client):
+    if static_assets.brotli is None:
+        pytest.skip('brotli is not installed')
+    response = client.get('/static/js/main.40cd798c.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert static_assets.brotli.decompress(response.data) == SCRIPT
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_gzip_and_identity_fallbacks(client):
+    gzipped = client.get('/static/js/main.40cd798c.js', headers={'Accept-Encoding': 'br;q=0, gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in gzipped.headers['Vary']
+
+    plain = client.get('/static/js/main.40cd798c.js', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == SCRIPT
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    assert plain.headers['ETag'] != gzipped.headers['ETag']
+
+
+def test_small_files_are_not_compressed_and_do_not_vary(client):
+    response = client.get('/robots.txt', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Vary' not in response.headers
+
+
+def test_if_none_match_returns_304(client):
+    headers = {'Accept-Encoding': 'gzip'}
+    first = client.get('/static/js/main.40cd798c.js', headers=headers)
+    again = client.get('/static/js/main.40cd798c.js', headers={**headers, 'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+    # The ETag names the gzip variant, so it does not validate the uncompressed body
+    plain = client.get('/static/js/main.40cd798c.js', headers={'If-None-Match': first.headers['ETag']})
+    assert plain.status_code == 200
+
+
+def test_only_hashed_static_files_are_immutable(client):
+    assert 'immutable' in client.get('/static/js/main.40cd798c.js').headers['Cache-Control']
+    assert client.get('/static/js/unhashed.js').headers['Cache-Control'] == 'no-cache'
+    assert client.get('/robots.txt').headers['Cache-Control'] == 'no-cache'
+
+
+def test_index_html_is_revalidated(client):
+    for path in ('/', '/index.html'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert 'immutable' not in response.headers['Cache-Control']
+
+
+def test_unknown_and_traversal_paths_are_not_found(client):
+    assert client.get('/static/js/missing.js').status_code == 404
+    assert client.get('/../secret.txt').status_code == 404
+
+
+def test_app_serves_the_spa_shell_without_long_term_caching(app_module):
+    response = app_module.app.test_client().get('/')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'